@@ -0,0 +1,59 @@
+#ifndef ENTROPY_CACHE_H
+#define ENTROPY_CACHE_H
+
+#include <list>
+#include <map>
+#include <vector>
+#include <cstddef>
+
+/** Bounded cache of expected entropy evaluations, with least-recently-used eviction.
+    An evaluation is identified by the robot pose, snapped to a grid, and by the id of the prior
+    weights in the WeightStore. It holds the expected entropy and the id of the posterior weights,
+    so the cache must be cleared whenever the weight store is, and remapped when it is compacted.
+*/
+class EntropyCache
+{
+public:
+    struct Key
+    {
+        double x, y, yaw;                   ///< Snapped pose
+        int prior_id;                       ///< Id of the prior weights
+        bool operator<(const Key& other) const;
+    };
+
+    EntropyCache(size_t capacity = 0, double resolution = 0.0, double yaw_resolution = 0.0);
+
+    void configure(size_t capacity, double resolution, double yaw_resolution);
+    void clear();
+    Key makeKey(double x, double y, double yaw, int prior_id) const;
+    bool find(const Key& key, double& entropy, int& posterior_id);
+    void insert(const Key& key, double entropy, int posterior_id);
+    void getWeightIds(std::vector<int>& ids) const;
+    void remapWeightIds(const std::vector<int>& new_ids);
+    void resetStats();
+    size_t size() const;
+    size_t capacity() const;
+    double resolution() const;
+    double yawResolution() const;
+    unsigned long hits() const;
+    unsigned long misses() const;
+
+private:
+    struct Entry
+    {
+        Key key_;
+        double entropy_;
+        int posterior_id_;
+    };
+    typedef std::list<Entry> EntryList;
+
+    EntryList entries_;                             ///< Entries, most recently used first
+    std::map<Key, EntryList::iterator> index_;      ///< Position of every key in entries_
+    size_t capacity_;                               ///< Maximum number of entries, 0 disables the cache
+    double resolution_;                             ///< Grid size for the positions, 0 to use them as they are
+    int yaw_bins_;                                  ///< Number of yaw bins over the full turn, 0 to use the yaws as they are
+    unsigned long hits_;
+    unsigned long misses_;
+};
+
+#endif
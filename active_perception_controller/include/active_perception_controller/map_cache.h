@@ -0,0 +1,90 @@
+#ifndef MAP_CACHE_H
+#define MAP_CACHE_H
+
+#include <nav_msgs/OccupancyGrid.h>
+#include <boost/interprocess/mapped_region.hpp>
+#include <boost/shared_ptr.hpp>
+#include <cmath>
+#include <stdint.h>
+#include <string>
+#include <vector>
+#include <utility>
+
+/** Location and naming of the files of the map cache, shared with map_cache.py.
+    Every preprocessed array of a map is stored as a binary file, named after the CRC32 of the
+    map data and the size of the map, so that nodes that load the same map can share it. A file
+    holds the number of elements of the array, as a little-endian uint64, followed by the raw
+    elements.
+*/
+class MapCache
+{
+public:
+    static std::string defaultDir();
+    static std::string key(const nav_msgs::OccupancyGrid& map);
+    static std::string filename(const std::string& cache_dir,
+                                const nav_msgs::OccupancyGrid& map,
+                                const std::string& name);
+    static bool save(const std::string& filename, const void* data, uint64_t count, size_t item_size);
+    static bool map(const std::string& filename,
+                    size_t item_size,
+                    boost::shared_ptr<boost::interprocess::mapped_region>& region,
+                    uint64_t& count);
+};
+
+/** Free cells of a map, as (column, row) pairs. The cell indices are memory-mapped from the map
+    cache when another node has already computed them. Otherwise they are computed here, and saved
+    to the cache for the next nodes.
+*/
+class FreeCells
+{
+public:
+    FreeCells();
+
+    void load(const nav_msgs::OccupancyGrid& map, const std::string& cache_dir = MapCache::defaultDir());
+    size_t size() const;
+    std::pair<int,int> operator[](size_t i) const;
+
+private:
+    const int32_t* data() const;
+
+    boost::shared_ptr<boost::interprocess::mapped_region> region_;  ///< Mapped cache file, if any
+    std::vector<int32_t> cells_;                                    ///< Cell indices, if not mapped
+    size_t size_;                                                   ///< Number of free cells
+    int width_;                                                     ///< Width of the map
+};
+
+/** Free space of a map as a bit-packed mask, one bit per cell, for fast lookups of positions
+    from several threads. Positions outside the map are not free.
+*/
+class FreeMask
+{
+public:
+    FreeMask();
+
+    void load(const nav_msgs::OccupancyGrid& map);
+    bool empty() const;
+
+    /** Whether a position is in a free cell of the map
+      \param x Position
+      \param y Position
+      */
+    inline bool isFree(double x, double y) const
+    {
+        double col = floor((x - origin_x_)/resolution_);
+        double row = floor((y - origin_y_)/resolution_);
+        if(col < 0 || row < 0 || col >= width_ || row >= height_)
+            return false;
+        size_t idx = (size_t)row*width_ + (size_t)col;
+        return (bits_[idx >> 6] >> (idx & 63)) & 1;
+    }
+
+private:
+    std::vector<uint64_t> bits_;            ///< One bit per cell, set if free
+    int width_;                             ///< Width of the map
+    int height_;                            ///< Height of the map
+    double origin_x_;                       ///< Origin of the map
+    double origin_y_;                       ///< Origin of the map
+    double resolution_;                     ///< Resolution of the map
+};
+
+#endif
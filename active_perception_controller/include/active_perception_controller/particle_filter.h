@@ -3,6 +3,7 @@
 
 #include <ros/ros.h>
 #include <nav_msgs/OccupancyGrid.h>
+#include <active_perception_controller/map_cache.h>
 #include <gsl/gsl_rng.h>
 #include <vector>
 
@@ -30,23 +31,34 @@ public:
     ParticleFilter(const nav_msgs::OccupancyGrid *map);
     ~ParticleFilter();
 
-    int getNumParticles();
+    virtual int getNumParticles();
     void setNumParticles();
-    Particle* getParticle(int particle_id);
+    virtual Particle* getParticle(int particle_id);
     virtual void initUniform() = 0;
     virtual void predict(double timeStep) = 0;
     virtual void update(SensorData &obs_data){};
     virtual void resample() = 0;
+    virtual double effectiveSampleSize();
+    bool resampleIfNeeded();
+    void setResampleThreshold(double threshold);
+    unsigned long getNumResampleChecks();
+    unsigned long getNumResamples();
     virtual double entropyParticles(){};
     virtual double entropyGMM(){};
     vector<int> calcResampledSet();
+    vector<int> calcResampledSet(const vector<double>& weights);
+    void calcResampledSet(const vector<double>& weights, vector<int>& resampled_set);
     void setMap(const nav_msgs::OccupancyGrid *map);
 
 protected:
     vector<Particle*> particles_;           ///< particle set.
     const nav_msgs::OccupancyGrid *map_;
-    vector<pair<int,int> > free_space_ind_; ///< Map indices with free space
+    FreeCells free_space_ind_;              ///< Map indices with free space, shared through the map cache
+    FreeMask free_mask_;                    ///< Free space of the map, as a bitmask
     gsl_rng *ran_generator_;                ///< Random number generator
+    double resample_threshold_;             ///< Resample when the effective sample size is below this fraction of the particles
+    unsigned long num_resample_checks_;     ///< Calls to resampleIfNeeded
+    unsigned long num_resamples_;           ///< Calls to resampleIfNeeded that resampled
 };
 
 #endif
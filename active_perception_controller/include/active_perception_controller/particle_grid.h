@@ -0,0 +1,35 @@
+#ifndef PARTICLE_GRID_H
+#define PARTICLE_GRID_H
+
+#include <cstddef>
+#include <vector>
+
+/** Bucket index of a set of particle positions over a regular grid, to find the particles within
+    a disc without checking all of them. It is built from a copy of the positions, sorted by cell,
+    so it must be rebuilt whenever the particles move.
+*/
+class ParticleGrid
+{
+public:
+    ParticleGrid();
+
+    void build(const std::vector<double>& xs, const std::vector<double>& ys, double cell_size);
+    void clear();
+    bool empty() const;
+    void query(double cx, double cy, double radius, std::vector<size_t>& result) const;
+
+private:
+    double min_x_;                          ///< Lower corner of the grid
+    double min_y_;                          ///< Lower corner of the grid
+    double cell_size_;                      ///< Size of the cells
+    int cols_;                              ///< Number of columns
+    int rows_;                              ///< Number of rows
+    std::vector<size_t> cell_start_;        ///< First entry of every cell, and one past the last
+    std::vector<size_t> indices_;           ///< Particle indices, sorted by cell
+    std::vector<double> xs_;                ///< Particle positions, sorted by cell
+    std::vector<double> ys_;                ///< Particle positions, sorted by cell
+    std::vector<size_t> cell_of_;           ///< Cell of every particle, scratch space of build
+    std::vector<size_t> next_;              ///< Next free entry of every cell, scratch space of build
+};
+
+#endif
@@ -5,6 +5,8 @@
 #include <sensor_msgs/PointCloud.h>
 #include <active_perception_controller/particle_filter.h>
 #include <active_perception_controller/rfid_sensor_model.h>
+#include <active_perception_controller/worker_pool.h>
+#include <active_perception_controller/particle_grid.h>
 
 #include <gsl/gsl_randist.h>
 #include <vector>
@@ -25,7 +27,12 @@ public:
 };
 
 /**
-  Class to implement a particle filter that estimate a person position
+  Class to implement a particle filter that estimate a person position.
+  The particles are stored as contiguous arrays of positions and weights, instead of
+  the particle objects of ParticleFilter.
+  The number of particles can be adapted on every resampling step with KLD-sampling
+  (Fox, "Adapting the Sample Size in Particle Filters Through KLD-Sampling"), see setKLDSampling.
+  Predict and update can run on several threads, see setNumThreads.
   */
 class PersonParticleFilter : public ParticleFilter
 {
@@ -34,20 +41,38 @@ public:
     PersonParticleFilter(int n_particles, nav_msgs::OccupancyGrid const* map, double sigma_pose, double rfid_map_res, string rfid_prob_map);
     ~PersonParticleFilter();
 
+    int getNumParticles();
+    Particle* getParticle(int particle_id);
+    const vector<double>& getX() const { return x_; }
+    const vector<double>& getY() const { return y_; }
+    const vector<double>& getWeights() const { return weights_; }
+
     void initUniform();
     void predict(double timeStep);
     void update(SensorData &obs_data);
     static void update(RfidSensorModel &rfid_model,
-                       vector<Particle*> &particles,
+                       const vector<double> &xs,
+                       const vector<double> &ys,
                        SensorData &obs,
                        const vector<double>& prev_weights,
                        vector<double>& updated_weights,
-                       const vector<size_t>& use_particle_idx);
+                       const vector<size_t>& use_particle_idx,
+                       double *scale = NULL);
+    static void update(const vector<double>& obs_probs,
+                       const vector<double>& prev_weights,
+                       vector<double>& updated_weights,
+                       const vector<size_t>& use_particle_idx,
+                       double *scale = NULL);
     void resample();
+    double effectiveSampleSize();
+    void setKLDSampling(int min_particles, int max_particles, double bin_size, double kld_err, double kld_z);
+    void setNumThreads(int num_threads);
+    int getNumThreads();
     void setSensorModel(RfidSensorModel *model);
     double entropyParticles();
     static double entropyParticles(RfidSensorModel &rfid_model,
-                                   vector<Particle*> &particles,
+                                   const vector<double> &xs,
+                                   const vector<double> &ys,
                                    SensorData &new_obs,
                                    const vector<double>& prev_weights,
                                    const vector<double>& current_weights);
@@ -58,6 +83,41 @@ public:
     void initFromParticles(const sensor_msgs::PointCloud &particle_set);
 
 protected:
+    void resize(size_t num_particles);
+    void resampleKLD();
+    void predictParticles(size_t begin, size_t end, double timeStep, gsl_rng *rng);
+    double weighParticles(size_t begin, size_t end, RfidSensorData *rfid_obs);
+    void normalizeParticles(size_t begin, size_t end, double total_weight);
+    void blockRange(size_t block, size_t &begin, size_t &end);
+    void predictBlock(size_t block, double timeStep);
+    void weighBlock(size_t block, RfidSensorData *rfid_obs);
+    void normalizeBlock(size_t block, double total_weight);
+    static int kldNumParticles(int num_bins, double kld_err, double kld_z);
+
+    vector<double> x_;                  ///< Particle positions
+    vector<double> y_;                  ///< Particle positions
+    vector<double> weights_;            ///< Particle weights
+    PersonParticle particle_;           ///< Copy of the particle returned by getParticle
+    vector<int> resampled_set_;         ///< Resampling buffer, reused across steps
+    vector<double> resampled_x_;        ///< Resampling buffer, reused across steps
+    vector<double> resampled_y_;        ///< Resampling buffer, reused across steps
+    vector<double> cumulative_;         ///< Cumulative weights for KLD-sampling, reused across steps
+    int kld_min_particles_;             ///< Minimum number of particles with KLD-sampling
+    int kld_max_particles_;             ///< Maximum number of particles with KLD-sampling. 0 if disabled
+    double kld_bin_size_;               ///< Size of the histogram bins for KLD-sampling, in meters
+    double kld_err_;                    ///< Maximum KL divergence for KLD-sampling
+    double kld_z_;                      ///< Upper standard normal quantile for KLD-sampling
+    int kld_bins_width_;                ///< Number of histogram columns over the map
+    int kld_bins_height_;               ///< Number of histogram rows over the map
+    vector<unsigned char> kld_bins_;    ///< Histogram bins that hold a particle
+    vector<int> kld_occupied_;          ///< Indices of the bins that hold a particle
+    WorkerPool pool_;                   ///< Threads for predict and update
+    vector<gsl_rng*> block_rngs_;       ///< Random number generator of every block of particles
+    vector<double> block_weights_;      ///< Sum of the weights of every block of particles
+    ParticleGrid grid_;                 ///< Bucket index of the particles, for the update
+    bool grid_valid_;                   ///< False when the particles moved since the index was built
+    vector<size_t> in_range_;           ///< Particles within the sensor range in the last update
+    vector<double> in_range_probs_;     ///< Observation probabilities of the particles in in_range_
     double sigma_pose_;                 ///< Starndard deviation for person movement
     RfidSensorModel *rfid_model_;       ///< Probability model for RFID observations
     bool local_sensor_;                 ///< True if the sensor model is created locally
@@ -11,6 +11,7 @@
 #include <opencv2/highgui/highgui.hpp>
 #include <geometry_msgs/PoseWithCovariance.h>
 #include <string>
+#include <vector>
 
 #include <active_perception_controller/sensor_model.h>
 
@@ -26,6 +27,10 @@ public:
 
 /** RFID sensor model. The model is loaded from an images that gives the probability of positive observation for each point.
   The image represents the field of view of the RFID sensor, which is assumed to be at the center.
+  The image can also be precomputed rotated to a number of yaw bins (see setYawBins), so that the probabilities
+  for planar sensor poses are looked up without transforming every position to the sensor frame.
+  A pyramid of max-pooled maps gives cheap upper bounds of the detection probability over whole areas
+  (see detectionBounds), to discard poses that cannot detect the person before evaluating them.
   */
 class RfidSensorModel: public SensorModel
 {
@@ -33,10 +38,52 @@ public:
     RfidSensorModel(const std::string& prob_image_path, double resolution);
 
     double applySensorModel(SensorData &obs_data, const Particle *particle);
+    double applySensorModel(SensorData &obs_data, double x, double y);
+    void applySensorModel(SensorData &obs_data,
+                          const std::vector<double>& xs,
+                          const std::vector<double>& ys,
+                          const std::vector<size_t>& idx,
+                          std::vector<double>& probs);
+    void applySensorModel(SensorData &obs_data,
+                          const double* xs,
+                          const double* ys,
+                          const size_t* idx,
+                          size_t num,
+                          double* probs);
+    void detectionBounds(SensorData &obs_data,
+                         const double* xs,
+                         const double* ys,
+                         size_t num,
+                         double radius,
+                         double* bounds);
+    int detectionKernel(double yaw, double resolution, std::vector<float>& kernel);
     double getMaximumSensorRange();
+    void setYawBins(int num_bins);
+    int getYawBins();
 private:
+    /** Transformation from the global frame to the frame of the sensor, in the plane */
+    struct SensorFrame
+    {
+        double xx, xy, x0;      ///< local x = xx*x + xy*y + x0
+        double yx, yy, y0;      ///< local y = yx*x + yy*y + y0
+    };
+
+    SensorFrame sensorFrame(const RfidSensorData &obs_data) const;
+    double detectionProbability(const SensorFrame &frame, double x, double y) const;
+    double localProbability(double local_x, double local_y) const;
+    void buildPyramid();
+    double maxProbability(int col_min, int col_max, int row_min, int row_max) const;
+
     double map_resolution_;     ///< Resolution of map in meter/pixel
     cv::Mat prob_map_;           ///< Map of observation probability
+    double max_range_;          ///< Maximum range of the sensor, from the size of the map
+    std::vector<float> prob_lut_;   ///< Probabilities of the map, already scaled to [0,1]
+    int yaw_bins_;                  ///< Number of rotated maps, 0 if there are none
+    int rotated_size_;              ///< Width and height of the rotated maps, in pixels
+    std::vector<float> rotated_luts_;   ///< Probabilities of the map rotated to every yaw bin, in global axes
+    std::vector<std::vector<float> > pyramid_;  ///< Max-pooled maps, level l holds the maximum of 2^l x 2^l pixels
+    std::vector<int> pyramid_cols_;             ///< Number of columns of every level
+    std::vector<int> pyramid_rows_;             ///< Number of rows of every level
 
 };
 
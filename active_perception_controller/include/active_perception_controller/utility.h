@@ -7,39 +7,132 @@
 #include <sensor_msgs/PointCloud.h>
 #include <geometry_msgs/PoseWithCovariance.h>
 #include <active_perception_controller/rfid_sensor_model.h>
+#include <active_perception_controller/weight_store.h>
+#include <active_perception_controller/worker_pool.h>
+#include <active_perception_controller/entropy_cache.h>
+#include <active_perception_controller/particle_grid.h>
 
 /** This library implements functions to compute utilities based on information gain.
+    The expected entropy evaluations release the GIL and run on a pool of worker threads,
+    so a Utility object must not be used from several Python threads at the same time.
+    The batch evaluations can screen the poses first with a coarse bound (see setScreening),
+    and only evaluate in full the poses that may detect the person.
 */
 class Utility
 {
 public:
-    Utility(){};
+    Utility() : prior_id_(-1), screening_bin_size_(0.0), screening_min_detection_(0.0), num_screened_(0)
+    { weights_.addDense(std::vector<double>()); };
 
     Utility(std::string prob_image_path,
             float resolution, double sigma_pose);
 
     void setPersonParticles(const std::string& serialized_particles);
+    void setParticles(boost::python::object xs,
+                      boost::python::object ys,
+                      boost::python::object weights);
     double computeExpEntropy(float px,
                            float py,
                            float yaw,
                            std::vector<double>& prev_weights,
                            std::vector<double>& updated_weights);
+    boost::python::tuple computeExpEntropyBatch(boost::python::object xs,
+                                                boost::python::object ys,
+                                                boost::python::object yaws,
+                                                boost::python::object parent_weight_ids);
+    int addWeights(boost::python::object weights);
+    boost::python::object compactWeights(boost::python::object live_weight_ids);
+    boost::python::object getWeights(int weight_id);
+    int getNumWeights();
+    int getNumStoredWeightValues();
     double getMaximumSensorRange();
+    void setNumThreads(int num_threads);
+    int getNumThreads();
+    void setEntropyCache(int capacity, double resolution, double yaw_resolution);
+    boost::python::dict getEntropyCacheStats();
+    void setSensorYawBins(int num_bins);
+    int getSensorYawBins();
+    void setScreening(double bin_size, double min_detection);
+    unsigned long getNumScreened();
+    boost::python::object getSensorKernel(double yaw, double resolution);
 private:
-    std::vector<Particle*> person_particles_;
+    /** A pose of a batch, with its results */
+    struct BatchPose
+    {
+        float x, y, yaw;
+        const std::vector<double>* prior;
+        double entropy;
+        double scale;
+        std::vector<size_t> updated_idx;
+        std::vector<double> updated_weights;
+    };
+
+    void resizeParticles(size_t num_particles);
+    void buildParticleGrid();
+    void buildParticleBins();
+    void binWeights(const std::vector<double>& weights, std::vector<double>& bin_weights) const;
+    double detectionBound(float px, float py, float yaw, const std::vector<double>& bin_weights);
+    void resetWeights(const std::vector<double>& weights);
+    const std::vector<double>& getPrior(int weight_id);
+    double expEntropy(float px,
+                      float py,
+                      float yaw,
+                      const std::vector<double>& prev_weights,
+                      std::vector<double>& updated_weights,
+                      std::vector<size_t>& updated_idx,
+                      double& scale);
+    void evaluatePose(size_t task, size_t worker, std::vector<BatchPose>* poses);
+
+    std::vector<double> particles_x_;                   ///< Person particle positions
+    std::vector<double> particles_y_;                   ///< Person particle positions
+    ParticleGrid grid_;                                 ///< Bucket index of the particles
     boost::shared_ptr<RfidSensorModel> sensor_model_;
     double sigma_pose_;
+    WeightStore weights_;                               ///< Stored weight vectors. Id 0 holds the current particle weights
+    std::vector<double> prior_;                         ///< Last weight vector retrieved from the store
+    int prior_id_;                                      ///< Id of prior_, -1 if none
+    WorkerPool pool_;                                   ///< Threads for the batch evaluations
+    EntropyCache cache_;                                ///< Results of the batch evaluations
+    double screening_bin_size_;                         ///< Requested size of the particle bins for screening
+    double screening_min_detection_;                    ///< Poses with a lower bound of the detection probability keep their prior. 0 if disabled
+    unsigned long num_screened_;                        ///< Number of poses discarded by the screening
+    double bins_min_x_;                                 ///< Lower corner of the particle bins
+    double bins_min_y_;                                 ///< Lower corner of the particle bins
+    double bins_size_;                                  ///< Size of the particle bins, may be larger than requested
+    int bins_cols_;                                     ///< Number of columns of particle bins
+    int bins_rows_;                                     ///< Number of rows of particle bins
+    std::vector<size_t> bin_of_;                        ///< Bin of every particle, empty if there are no bins
+    std::vector<double> bound_xs_;                      ///< Centers of the bins in range, scratch space of detectionBound
+    std::vector<double> bound_ys_;                      ///< Centers of the bins in range, scratch space of detectionBound
+    std::vector<double> bound_weights_;                 ///< Weights of the bins in range, scratch space of detectionBound
+    std::vector<double> bound_probs_;                   ///< Detection bounds of the bins in range, scratch space of detectionBound
 };
 
 using namespace boost::python;
 
 BOOST_PYTHON_MODULE(ap_utility)
 {
-    class_<Utility>("Utility")
+    class_<Utility, boost::noncopyable>("Utility")
         .def(init<std::string, float, double>())
         .def("setPersonParticles", &Utility::setPersonParticles)
+        .def("setParticles", &Utility::setParticles)
         .def("computeExpEntropy", &Utility::computeExpEntropy)
-        .def("getMaximumSensorRange", &Utility::getMaximumSensorRange);
+        .def("computeExpEntropyBatch", &Utility::computeExpEntropyBatch)
+        .def("addWeights", &Utility::addWeights)
+        .def("compactWeights", &Utility::compactWeights)
+        .def("getWeights", &Utility::getWeights)
+        .def("getNumWeights", &Utility::getNumWeights)
+        .def("getNumStoredWeightValues", &Utility::getNumStoredWeightValues)
+        .def("getMaximumSensorRange", &Utility::getMaximumSensorRange)
+        .def("setNumThreads", &Utility::setNumThreads)
+        .def("getNumThreads", &Utility::getNumThreads)
+        .def("setEntropyCache", &Utility::setEntropyCache)
+        .def("getEntropyCacheStats", &Utility::getEntropyCacheStats)
+        .def("setSensorYawBins", &Utility::setSensorYawBins)
+        .def("getSensorYawBins", &Utility::getSensorYawBins)
+        .def("setScreening", &Utility::setScreening)
+        .def("getNumScreened", &Utility::getNumScreened)
+        .def("getSensorKernel", &Utility::getSensorKernel);
 
     class_<std::vector<double> >("VectorOfDoubles")
             .def(vector_indexing_suite<std::vector<double> >() )
@@ -0,0 +1,50 @@
+#ifndef WEIGHT_STORE_H
+#define WEIGHT_STORE_H
+
+#include <vector>
+#include <cstddef>
+
+/** Storage for particle weight vectors, as used by the nodes of the planner tree.
+    A weight set is either stored densely or as a delta with respect to a parent set:
+    w[i] = scale*parent[i], except for the particles listed in the delta, whose weights are given explicitly.
+    Chains of deltas are limited in depth, so that retrieving a weight set is bounded.
+    The sets that are no longer used can be dropped with compact, which renumbers the rest.
+*/
+class WeightStore
+{
+public:
+    WeightStore(int max_depth = 16);
+
+    void clear();
+    int addDense(const std::vector<double>& weights);
+    int addDelta(int parent_id,
+                 double scale,
+                 const std::vector<size_t>& indices,
+                 const std::vector<double>& values);
+    void getWeights(int weight_id, std::vector<double>& weights) const;
+    void compact(const std::vector<int>& keep_ids, std::vector<int>& new_ids);
+    bool isValid(int weight_id) const;
+    int size() const;
+    size_t getNumParticles() const;
+    size_t getNumStoredValues() const;
+
+private:
+    struct WeightSet
+    {
+        int parent_;                        ///< Parent set, -1 for dense sets
+        int depth_;                         ///< Number of deltas down to the dense set
+        double scale_;                      ///< Scale applied to the parent weights
+        std::vector<unsigned int> indices_; ///< Particles with explicit weights
+        std::vector<double> values_;        ///< Explicit weights (all the weights for dense sets)
+
+        void swap(WeightSet& other);
+    };
+
+    std::vector<WeightSet> sets_;
+    size_t num_particles_;                  ///< Length of the weight vectors
+    size_t num_values_;                     ///< Total number of stored weights
+    int max_depth_;                         ///< Maximum length of a chain of deltas
+    mutable std::vector<char> assigned_;    ///< Scratch flags for getWeights
+};
+
+#endif
@@ -0,0 +1,45 @@
+#ifndef WORKER_POOL_H
+#define WORKER_POOL_H
+
+#include <boost/thread.hpp>
+#include <boost/function.hpp>
+#include <boost/shared_ptr.hpp>
+#include <cstddef>
+#include <vector>
+
+/** Pool of worker threads that run the tasks of a job in parallel.
+    The thread calling run() also works on the job, so a pool of size 1 has no extra threads and
+    runs everything in the calling thread. Jobs are run one at a time.
+*/
+class WorkerPool
+{
+public:
+    typedef boost::function<void (size_t task, size_t worker)> Job;
+
+    WorkerPool(size_t num_workers = 1);
+    ~WorkerPool();
+
+    void resize(size_t num_workers);
+    size_t size() const;
+    void run(size_t num_tasks, const Job& job);
+    static size_t hardwareConcurrency();
+
+private:
+    void workerLoop(size_t worker);
+    void work(size_t worker);
+    void stop();
+
+    std::vector<boost::shared_ptr<boost::thread> > threads_;
+    boost::mutex mutex_;
+    boost::condition_variable job_ready_;
+    boost::condition_variable job_done_;
+    Job job_;                               ///< Job being run
+    size_t num_tasks_;                      ///< Number of tasks of the job
+    size_t next_task_;                      ///< Next task to be taken by a worker
+    size_t pending_tasks_;                  ///< Tasks not finished yet
+    unsigned long generation_;              ///< Incremented for every job
+    size_t num_workers_;                    ///< Number of workers, including the calling thread
+    bool stop_;
+};
+
+#endif
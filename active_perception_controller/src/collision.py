@@ -0,0 +1,88 @@
+"""
+Batched collision checking for the motion planners.
+
+Segments are tested against a clearance mask of the navigation map: a cell is
+free if its distance to the closest obstacle is at least the robot radius. All
+the segments of a batch are sampled at sub-cell steps and looked up in the mask
+with a single fancy-indexing operation.
+"""
+
+from math import ceil
+
+import numpy as np
+
+
+class SegmentChecker(object):
+    """
+    Tests (origin, destination) segments, in map frame coordinates, against the
+    clearance of the navigation map.
+    """
+    def __init__(self, info, distmap, min_clearance, step=0.5, free=None):
+        """
+        info is the MapMetaData of the navigation map. distmap is the distance
+        transform of its free space, flipped upside down, in pixels, as computed
+        by the planners. min_clearance is the robot radius, in pixels. step is
+        the sampling step along the segments, in pixels. free is the clearance
+        mask for min_clearance, flipped as distmap, if it is already available.
+        """
+        if free is None:
+            free = distmap >= min_clearance
+        self._free = free
+        self.min_clearance = min_clearance
+        self._xo = info.origin.position.x
+        self._yo = info.origin.position.y
+        self._res = info.resolution
+        self._height = info.height*info.resolution
+        self._step = step
+
+    def to_index(self, points):
+        """
+        Converts map frame points to (column, row) coordinates of the flipped
+        map, without rounding.
+        """
+        P = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        col = (P[:,0] - self._xo)/self._res
+        row = (self._height + self._yo - P[:,1])/self._res
+        return (col, row)
+
+    def segments_safe(self, org, dst):
+        """
+        Returns a boolean mask, True for the segments that are collision free.
+        org and dst are lists (or arrays) of points of the same length, or a
+        single point, which is then shared by all the segments.
+        """
+        (c0, r0) = self.to_index(org)
+        (c1, r1) = self.to_index(dst)
+        (c0, c1) = np.broadcast_arrays(c0, c1)
+        (r0, r1) = np.broadcast_arrays(r0, r1)
+        if len(c0) == 0:
+            return np.zeros(0, dtype=bool)
+
+        dc = c1 - c0
+        dr = r1 - r0
+        length = np.max(np.hypot(dc, dr))
+        t = np.linspace(0.0, 1.0, int(ceil(length/self._step)) + 1)
+        cols = np.floor(c0[:,None] + dc[:,None]*t).astype(int)
+        rows = np.floor(r0[:,None] + dr[:,None]*t).astype(int)
+
+        inside = ((cols >= 0) & (cols < self._free.shape[1]) &
+                  (rows >= 0) & (rows < self._free.shape[0]))
+        free = np.zeros(cols.shape, dtype=bool)
+        free[inside] = self._free[rows[inside], cols[inside]]
+        return np.all(free, axis=1)
+
+    def points_safe(self, points):
+        """
+        Returns a boolean mask, True for the points that are collision free.
+        """
+        (col, row) = self.to_index(points)
+        col = np.floor(col).astype(int)
+        row = np.floor(row).astype(int)
+        inside = ((col >= 0) & (col < self._free.shape[1]) &
+                  (row >= 0) & (row < self._free.shape[0]))
+        free = np.zeros(col.shape, dtype=bool)
+        free[inside] = self._free[row[inside], col[inside]]
+        return free
+
+    def segment_safe(self, org, dst):
+        return bool(self.segments_safe(org, dst)[0])
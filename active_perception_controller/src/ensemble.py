@@ -0,0 +1,122 @@
+"""
+Ensemble of independent RRT* instances, run in a pool of worker processes.
+
+The workers are forked from the planner, so they share its map, distance
+transform and clearance mask copy-on-write, without copying them. The particle
+set changes between plans, so it is passed through shared memory arrays. Every
+worker has its own utility function, and grows a tree with its own seed.
+"""
+
+import logging
+import multiprocessing
+import multiprocessing.sharedctypes
+
+import numpy as np
+
+_worker = None # state of the planner in a worker process
+
+
+class _WorkerState(object):
+    def __init__(self, planner, utility_args, shared):
+        self.planner = planner
+        self.shared = shared
+        self.belief_seq = -1
+        # Every worker has its own utility function, built from scratch, so that nothing of the
+        # one inherited from the parent is used
+        from active_perception_controller import ap_utility
+        planner.utility_function = ap_utility.Utility(*utility_args)
+        planner.utility_function.setNumThreads(1)
+        planner.utility_function.setEntropyCache(*planner._entropy_cache)
+        planner.utility_function.setSensorYawBins(planner._sensor_yaw_bins)
+        planner.utility_function.setScreening(*planner._screening)
+        planner._anytime = False
+        planner._ensemble = None
+        planner._tree = None
+
+
+def _init_worker(planner, utility_args, shared):
+    global _worker
+    # The worker inherits the ROS connections of the parent, and must not write to them
+    rosout = logging.getLogger('rosout')
+    rosout.handlers = [logging.NullHandler()]
+    rosout.propagate = False
+    _worker = _WorkerState(planner, utility_args, shared)
+
+
+def _grow_tree(args):
+    (seed, belief_seq, probot) = args
+    planner = _worker.planner
+    if belief_seq != _worker.belief_seq:
+        (x, y, weights) = _worker.shared.particles()
+        planner.set_particles(x, y, weights, planner.prepare_particles(x, y, weights))
+        _worker.belief_seq = belief_seq
+
+    np.random.seed(seed)
+    planner.reset_samplers()
+    planner._robot_pose.pose.position.x = probot[0]
+    planner._robot_pose.pose.position.y = probot[1]
+    tree = planner.new_tree()
+    planner.grow_tree(tree, planner._sample_fn, planner._planning_time)
+    return tree
+
+
+class _SharedParticles(object):
+    """
+    Particle set in shared memory, written by the planner and read by the workers.
+    """
+    def __init__(self, max_particles):
+        self._x = multiprocessing.sharedctypes.RawArray('d', max_particles)
+        self._y = multiprocessing.sharedctypes.RawArray('d', max_particles)
+        self._w = multiprocessing.sharedctypes.RawArray('d', max_particles)
+        self._n = multiprocessing.sharedctypes.RawValue('l', 0)
+        self.max_particles = max_particles
+
+    def set(self, x, y, weights):
+        n = len(x)
+        np.frombuffer(self._x, count=n)[:] = x
+        np.frombuffer(self._y, count=n)[:] = y
+        np.frombuffer(self._w, count=n)[:] = weights
+        self._n.value = n
+
+    def particles(self):
+        n = self._n.value
+        return (np.frombuffer(self._x, count=n).copy(),
+                np.frombuffer(self._y, count=n).copy(),
+                np.frombuffer(self._w, count=n).copy())
+
+
+class EnsemblePool(object):
+    """
+    Pool of worker processes that grow independent RRT* trees for a planner.
+    The workers are forked from the planner, so the pool must be created once
+    the state they use is initialized, and before the planner starts threads:
+    the threads of its utility function and of its ROS connections.
+    """
+    def __init__(self, planner, num_instances, max_particles, utility_args):
+        self._shared = _SharedParticles(max_particles)
+        self._belief_seq = 0
+        self._num_instances = num_instances
+        self.ready = False
+        self._pool = multiprocessing.Pool(num_instances, _init_worker,
+                                          (planner, utility_args, self._shared))
+
+    def set_particles(self, x, y, weights):
+        """
+        Publishes a new particle set to the workers. If the set does not fit in
+        the shared memory, the pool is not ready until the next set that fits.
+        """
+        self.ready = len(x) <= self._shared.max_particles
+        if self.ready:
+            self._shared.set(x, y, weights)
+            self._belief_seq += 1
+
+    def grow_trees(self, probot):
+        """
+        Grows one tree per instance from probot, each one with a different seed,
+        and returns them. Blocks until all of them are done.
+        """
+        seeds = np.random.randint(0, 2**31 - 1, self._num_instances)
+        return self._pool.map(_grow_tree, [(seed, self._belief_seq, probot) for seed in seeds], 1)
+
+    def close(self):
+        self._pool.terminate()
@@ -0,0 +1,221 @@
+#include <active_perception_controller/entropy_cache.h>
+#include <cmath>
+#include <algorithm>
+
+/** Lexicographic order of the keys */
+bool EntropyCache::Key::operator<(const Key& other) const
+{
+    if(prior_id != other.prior_id)
+        return prior_id < other.prior_id;
+    if(x != other.x)
+        return x < other.x;
+    if(y != other.y)
+        return y < other.y;
+    return yaw < other.yaw;
+}
+
+/** Number of yaw bins of a given width over the full turn, rounded so that they tile it exactly
+  \param yaw_resolution Width of the bins, in radians. 0 for no bins
+  */
+static int yawBins(double yaw_resolution)
+{
+    if(yaw_resolution <= 0)
+        return 0;
+    return std::max(1, (int)floor(2*M_PI/yaw_resolution + 0.5));
+}
+
+/** Constructor
+  \param capacity Maximum number of entries, 0 disables the cache
+  \param resolution Grid size for the positions, in meters. 0 to use them as they are
+  \param yaw_resolution Grid size for the yaws, in radians. 0 to use them as they are
+  */
+EntropyCache::EntropyCache(size_t capacity, double resolution, double yaw_resolution) :
+capacity_(capacity),
+resolution_(resolution > 0 ? resolution : 0.0),
+yaw_bins_(yawBins(yaw_resolution)),
+hits_(0),
+misses_(0)
+{
+}
+
+/** Change the capacity and the resolutions. The cache is cleared, since the keys depend on the resolutions
+  \param capacity Maximum number of entries, 0 disables the cache
+  \param resolution Grid size for the positions, in meters. 0 to use them as they are
+  \param yaw_resolution Grid size for the yaws, in radians, rounded so that the bins tile the full turn.
+  0 to use them as they are
+  */
+void EntropyCache::configure(size_t capacity, double resolution, double yaw_resolution)
+{
+    capacity_ = capacity;
+    resolution_ = resolution > 0 ? resolution : 0.0;
+    yaw_bins_ = yawBins(yaw_resolution);
+    clear();
+}
+
+/** Remove all the entries. The statistics are kept */
+void EntropyCache::clear()
+{
+    entries_.clear();
+    index_.clear();
+}
+
+/** Build the key of an evaluation. All the poses within the same grid cell share their key.
+  The yaw is wrapped to [-pi, pi), and its bins are centered on multiples of their width. The bins
+  wrap around the full turn, so with an even number of bins the headings on both sides of +-pi
+  share their bin
+  \param x Robot pose
+  \param y Robot pose
+  \param yaw Robot yaw
+  \param prior_id Id of the prior weights
+  */
+EntropyCache::Key EntropyCache::makeKey(double x, double y, double yaw, int prior_id) const
+{
+    Key key;
+    if(resolution_ > 0)
+    {
+        key.x = floor(x/resolution_);
+        key.y = floor(y/resolution_);
+    }
+    else
+    {
+        key.x = x;
+        key.y = y;
+    }
+    yaw -= 2*M_PI*floor((yaw + M_PI)/(2*M_PI));
+    if(yaw_bins_ > 0)
+    {
+        int bin = (int)floor(yaw*yaw_bins_/(2*M_PI) + 0.5) % yaw_bins_;
+        key.yaw = bin < 0 ? bin + yaw_bins_ : bin;
+    }
+    else
+        key.yaw = yaw;
+    key.prior_id = prior_id;
+    return key;
+}
+
+/** Look up an evaluation, and mark it as the most recently used
+  \param key Key of the evaluation
+  \param entropy Cached expected entropy
+  \param posterior_id Cached id of the posterior weights
+  \return Whether the key was found
+  */
+bool EntropyCache::find(const Key& key, double& entropy, int& posterior_id)
+{
+    if(capacity_ == 0)
+        return false;
+
+    std::map<Key, EntryList::iterator>::iterator it = index_.find(key);
+    if(it == index_.end())
+    {
+        misses_++;
+        return false;
+    }
+    entries_.splice(entries_.begin(), entries_, it->second);
+    entropy = it->second->entropy_;
+    posterior_id = it->second->posterior_id_;
+    hits_++;
+    return true;
+}
+
+/** Add an evaluation, evicting the least recently used one if the cache is full
+  \param key Key of the evaluation
+  \param entropy Expected entropy
+  \param posterior_id Id of the posterior weights
+  */
+void EntropyCache::insert(const Key& key, double entropy, int posterior_id)
+{
+    if(capacity_ == 0 || index_.find(key) != index_.end())
+        return;
+
+    if(entries_.size() >= capacity_)
+    {
+        index_.erase(entries_.back().key_);
+        entries_.pop_back();
+    }
+    Entry entry;
+    entry.key_ = key;
+    entry.entropy_ = entropy;
+    entry.posterior_id_ = posterior_id;
+    entries_.push_front(entry);
+    index_[key] = entries_.begin();
+}
+
+/** Ids of all the weights referenced by the entries, as priors or posteriors
+  \param ids Output, the ids are appended
+  */
+void EntropyCache::getWeightIds(std::vector<int>& ids) const
+{
+    for(EntryList::const_iterator it = entries_.begin(); it != entries_.end(); ++it)
+    {
+        ids.push_back(it->key_.prior_id);
+        ids.push_back(it->posterior_id_);
+    }
+}
+
+/** Renumber the weights of the entries after compacting the weight store. The entries
+  whose weights were dropped are removed. The order of use is kept
+  \param new_ids New id of every previous weight id, -1 for the dropped ones
+  */
+void EntropyCache::remapWeightIds(const std::vector<int>& new_ids)
+{
+    index_.clear();
+    EntryList::iterator it = entries_.begin();
+    while(it != entries_.end())
+    {
+        int prior_id = it->key_.prior_id, posterior_id = it->posterior_id_;
+        bool valid = prior_id >= 0 && prior_id < (int)new_ids.size() && new_ids[prior_id] >= 0 &&
+                     posterior_id >= 0 && posterior_id < (int)new_ids.size() && new_ids[posterior_id] >= 0;
+        if(!valid)
+        {
+            it = entries_.erase(it);
+            continue;
+        }
+        it->key_.prior_id = new_ids[prior_id];
+        it->posterior_id_ = new_ids[posterior_id];
+        index_[it->key_] = it;
+        ++it;
+    }
+}
+
+/** Reset the hit and miss counters */
+void EntropyCache::resetStats()
+{
+    hits_ = 0;
+    misses_ = 0;
+}
+
+/** Number of entries */
+size_t EntropyCache::size() const
+{
+    return entries_.size();
+}
+
+/** Maximum number of entries */
+size_t EntropyCache::capacity() const
+{
+    return capacity_;
+}
+
+/** Grid size for the positions */
+double EntropyCache::resolution() const
+{
+    return resolution_;
+}
+
+/** Grid size for the yaws, as rounded to tile the full turn. 0 if the yaws are used as they are */
+double EntropyCache::yawResolution() const
+{
+    return yaw_bins_ > 0 ? 2*M_PI/yaw_bins_ : 0.0;
+}
+
+/** Number of lookups that found their key */
+unsigned long EntropyCache::hits() const
+{
+    return hits_;
+}
+
+/** Number of lookups that did not find their key */
+unsigned long EntropyCache::misses() const
+{
+    return misses_;
+}
@@ -0,0 +1,179 @@
+"""
+Whole-map heatmap of the expected detection of the person, for a fixed sensor yaw.
+
+The particle belief is binned to a coarse grid over the navigation map. The
+probability of detecting the person from every cell is the correlation of that
+grid with the RFID sensor kernel (see Utility.getSensorKernel), and the expected
+information gain of a measurement is the mutual information between the person
+cell and the detection:
+
+    I(r) = h(sum_c B(c) K(c - r)) - sum_c B(c) h(K(c - r))
+
+where h is the binary entropy. Both sums are correlations with a fixed kernel,
+so the whole map is computed with a few FFTs per particle cloud. The expected
+entropy after the measurement is the entropy of the binned belief minus I.
+"""
+
+import numpy as np
+from nav_msgs.msg import OccupancyGrid
+
+from sampling import PointSampler
+
+
+def _binary_entropy(p):
+    p = np.clip(p, 0.0, 1.0)
+    h = np.zeros(p.shape)
+    inside = (p > 0) & (p < 1)
+    q = p[inside]
+    h[inside] = -q*np.log(q) - (1 - q)*np.log(1 - q)
+    return h
+
+
+def _fft_size(n):
+    """
+    Smallest size not below n with no prime factor other than 2, 3 and 5.
+    """
+    while True:
+        m = n
+        for f in (2, 3, 5):
+            while m % f == 0:
+                m //= f
+        if m == 1:
+            return n
+        n += 1
+
+
+class HeatmapFilter(object):
+    """
+    Computes the heatmaps of a map, for a fixed sensor kernel. The spectra of the
+    kernel are computed once, so every heatmap costs one forward and two inverse FFTs.
+    """
+    def __init__(self, info, kernel, resolution, free_cells):
+        """
+        info is the MapMetaData of the navigation map, kernel is the sensor kernel
+        at the given resolution, with an odd size, and free_cells are indices
+        into the map data of the cells where the robot can be.
+        """
+        self.info = info
+        self.resolution = resolution
+        self._xo = info.origin.position.x
+        self._yo = info.origin.position.y
+        self.width = int(np.ceil(info.width*info.resolution/resolution))
+        self.height = int(np.ceil(info.height*info.resolution/resolution))
+
+        # A heatmap cell is free if it holds the center of a free map cell
+        cells = np.asarray(free_cells, dtype=np.int64)
+        col = np.floor((cells % info.width + 0.5)*info.resolution/resolution).astype(np.int64)
+        row = np.floor((cells // info.width + 0.5)*info.resolution/resolution).astype(np.int64)
+        self.free = np.zeros((self.height, self.width), dtype=bool)
+        self.free[np.minimum(row, self.height - 1), np.minimum(col, self.width - 1)] = True
+
+        # Correlating with the kernel is convolving with the flipped kernel
+        kernel = np.asarray(kernel, dtype=np.float64)
+        self._half = kernel.shape[0]//2
+        self._shape = (_fft_size(self.height + kernel.shape[0] - 1),
+                       _fft_size(self.width + kernel.shape[1] - 1))
+        flipped = kernel[::-1, ::-1]
+        self._kernel_fft = np.fft.rfft2(flipped, self._shape)
+        self._entropy_fft = np.fft.rfft2(_binary_entropy(flipped), self._shape)
+
+    def heatmap(self, x, y, weights):
+        """
+        Heatmap of a particle set. The particles out of the map are ignored.
+        """
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        weights = np.asarray(weights, dtype=np.float64)
+        col = np.floor((x - self._xo)/self.resolution).astype(np.int64)
+        row = np.floor((y - self._yo)/self.resolution).astype(np.int64)
+        inside = (col >= 0) & (col < self.width) & (row >= 0) & (row < self.height)
+        belief = np.bincount(row[inside]*self.width + col[inside], weights=weights[inside],
+                             minlength=self.width*self.height).reshape(self.height, self.width)
+        total = np.sum(belief)
+        if not total > 0:
+            zeros = np.zeros(belief.shape)
+            return DetectionHeatmap(self, zeros, zeros, zeros, 0.0)
+        belief /= total
+
+        spectrum = np.fft.rfft2(belief, self._shape)
+        h = self._half
+        window = (slice(h, h + self.height), slice(h, h + self.width))
+        detection = np.clip(np.fft.irfft2(spectrum*self._kernel_fft, self._shape)[window], 0.0, 1.0)
+        cond_entropy = np.fft.irfft2(spectrum*self._entropy_fft, self._shape)[window]
+        gain = np.maximum(_binary_entropy(detection) - cond_entropy, 0.0)
+
+        occupied = belief[belief > 0]
+        belief_entropy = -np.sum(occupied*np.log(occupied))
+        return DetectionHeatmap(self, belief, detection, gain, belief_entropy)
+
+
+class DetectionHeatmap(object):
+    """
+    Heatmap of one particle set. Every array is indexed by heatmap cell, with
+    the first row at the map origin:
+    belief is the binned particle weights, detection the probability of
+    detecting the person from the cell, gain the expected information gain of
+    a measurement from the cell, and expected_entropy the expected entropy of
+    the binned belief after that measurement.
+    """
+    def __init__(self, heatmap_filter, belief, detection, gain, belief_entropy):
+        self._filter = heatmap_filter
+        self.belief = belief
+        self.detection = detection
+        self.gain = gain
+        self.belief_entropy = belief_entropy
+        self.expected_entropy = belief_entropy - gain
+
+    def _centers(self, cells):
+        f = self._filter
+        return np.column_stack(((cells % f.width + 0.5)*f.resolution + f._xo,
+                                (cells // f.width + 0.5)*f.resolution + f._yo))
+
+    def _candidates(self):
+        """
+        Free cells with some information gain, as flat indices.
+        """
+        return np.flatnonzero(self._filter.free & (self.gain > 0))
+
+    def sampler(self):
+        """
+        Sampler of the centers of the free cells, in proportion to their
+        information gain. None if no cell is informative.
+        """
+        cells = self._candidates()
+        if len(cells) == 0:
+            return None
+        return PointSampler(self._centers(cells), self.gain.ravel()[cells])
+
+    def best_points(self, n, spacing=0.0):
+        """
+        Centers of the n free cells with the highest information gain, in
+        decreasing order of gain, skipping the cells closer than spacing to a
+        better one that was already chosen.
+        """
+        cells = self._candidates()
+        gain = self.gain.ravel()[cells]
+        points = self._centers(cells[np.argsort(-gain, kind='mergesort')])
+        if spacing <= 0:
+            return points[:n]
+        best = []
+        for p in points:
+            if len(best) >= n:
+                break
+            if all(np.hypot(p[0] - q[0], p[1] - q[1]) >= spacing for q in best):
+                best.append(p)
+        return np.array(best).reshape(-1, 2)
+
+    def to_msg(self, frame_id='/map'):
+        """
+        OccupancyGrid with the detection probability of every cell, in percent.
+        """
+        f = self._filter
+        msg = OccupancyGrid()
+        msg.header.frame_id = frame_id
+        msg.info.resolution = f.resolution
+        msg.info.width = f.width
+        msg.info.height = f.height
+        msg.info.origin = f.info.origin
+        msg.data = np.round(100*self.detection).astype(np.int8).ravel().tolist()
+        return msg
@@ -0,0 +1,229 @@
+#include <active_perception_controller/map_cache.h>
+#include <ros/ros.h>
+#include <boost/crc.hpp>
+#include <boost/filesystem.hpp>
+#include <boost/interprocess/file_mapping.hpp>
+#include <cstdio>
+#include <cstdlib>
+#include <cstring>
+#include <fstream>
+#include <sstream>
+#include <unistd.h>
+
+/** Directory of the cache, under ROS_HOME. Must match default_cache_dir in map_cache.py */
+std::string MapCache::defaultDir()
+{
+    const char* ros_home = getenv("ROS_HOME");
+    std::string dir;
+    if(ros_home != NULL)
+        dir = ros_home;
+    else
+    {
+        const char* home = getenv("HOME");
+        dir = std::string(home != NULL ? home : ".") + "/.ros";
+    }
+    return dir + "/active_perception_controller/maps";
+}
+
+/** CRC32 of the map data, and size of the map. Must match map_key in map_cache.py
+  \param map Map
+  */
+std::string MapCache::key(const nav_msgs::OccupancyGrid& map)
+{
+    boost::crc_32_type crc;
+    if(!map.data.empty())
+        crc.process_bytes(&map.data[0], map.data.size());
+    char key[64];
+    snprintf(key, sizeof(key), "%08x_%ux%u", (unsigned int) crc.checksum(), map.info.width, map.info.height);
+    return key;
+}
+
+/** Name of the file of an array of the cache
+  \param cache_dir Directory of the cache
+  \param map Map
+  \param name Name of the array
+  */
+std::string MapCache::filename(const std::string& cache_dir,
+                               const nav_msgs::OccupancyGrid& map,
+                               const std::string& name)
+{
+    return cache_dir + "/map_" + key(map) + "_" + name + ".bin";
+}
+
+/** Save an array to the cache. It is written to a temporary file first, so that a partially
+  written file is never mapped by another node.
+  \param filename Name of the file
+  \param data Array
+  \param count Number of elements of the array
+  \param item_size Size of an element, in bytes
+  \return Whether the file could be written
+  */
+bool MapCache::save(const std::string& filename, const void* data, uint64_t count, size_t item_size)
+{
+    try
+    {
+        boost::filesystem::create_directories(boost::filesystem::path(filename).parent_path());
+    }
+    catch(const boost::filesystem::filesystem_error& e)
+    {
+        ROS_WARN("MapCache: %s", e.what());
+        return false;
+    }
+
+    std::ostringstream tmp;
+    tmp << filename << "." << getpid() << ".tmp";
+    std::ofstream file(tmp.str().c_str(), std::ios::binary);
+    file.write((const char*) &count, sizeof(count));
+    if(count > 0)
+        file.write((const char*) data, count*item_size);
+    file.close();
+    if(!file || rename(tmp.str().c_str(), filename.c_str()) != 0)
+    {
+        ROS_WARN("MapCache: Could not save %s", filename.c_str());
+        remove(tmp.str().c_str());
+        return false;
+    }
+    return true;
+}
+
+/** Map an array of the cache, read-only. Empty arrays are not mapped, since an empty mapping is
+  not allowed: region is reset and count is 0.
+  \param filename Name of the file
+  \param item_size Size of an element, in bytes
+  \param region Mapped file. The elements start after the count
+  \param count Number of elements of the array
+  \return Whether the file holds a whole array
+  */
+bool MapCache::map(const std::string& filename,
+                   size_t item_size,
+                   boost::shared_ptr<boost::interprocess::mapped_region>& region,
+                   uint64_t& count)
+{
+    using namespace boost::interprocess;
+
+    region.reset();
+    count = 0;
+    try
+    {
+        file_mapping file(filename.c_str(), read_only);
+        region.reset(new mapped_region(file, read_only));
+    }
+    catch(const interprocess_exception&)
+    {
+        // Not in the cache yet
+        region.reset();
+        return false;
+    }
+    if(region->get_size() < sizeof(count))
+    {
+        region.reset();
+        return false;
+    }
+    memcpy(&count, region->get_address(), sizeof(count));
+    if(region->get_size() != sizeof(count) + count*item_size)
+    {
+        region.reset();
+        count = 0;
+        return false;
+    }
+    if(count == 0)
+        region.reset();
+    return true;
+}
+
+/** Constructor. There are no free cells until a map is loaded */
+FreeCells::FreeCells() :
+size_(0),
+width_(1)
+{
+}
+
+/** Load the free cells of a map from the cache, or compute them
+  \param map Map
+  \param cache_dir Directory of the cache
+  */
+void FreeCells::load(const nav_msgs::OccupancyGrid& map, const std::string& cache_dir)
+{
+    width_ = map.info.width;
+    cells_.clear();
+
+    std::string filename = MapCache::filename(cache_dir, map, "free");
+    uint64_t count;
+    if(MapCache::map(filename, sizeof(int32_t), region_, count))
+    {
+        size_ = count;
+        return;
+    }
+
+    for(size_t k = 0; k < map.data.size(); k++)
+    {
+        if(map.data[k] == 0)
+            cells_.push_back(k);
+    }
+    size_ = cells_.size();
+    MapCache::save(filename, size_ > 0 ? &cells_[0] : NULL, size_, sizeof(int32_t));
+}
+
+/** Number of free cells */
+size_t FreeCells::size() const
+{
+    return size_;
+}
+
+/** Get a free cell
+  \param i Index of the free cell
+  \return (column, row) of the cell in the map
+  */
+std::pair<int,int> FreeCells::operator[](size_t i) const
+{
+    int32_t idx = data()[i];
+    return std::make_pair(idx % width_, idx / width_);
+}
+
+/** Cell indices, either mapped or computed */
+const int32_t* FreeCells::data() const
+{
+    if(region_)
+        return (const int32_t*) ((const char*) region_->get_address() + sizeof(uint64_t));
+    return &cells_[0];
+}
+
+/** Constructor. The mask is empty until a map is loaded */
+FreeMask::FreeMask() :
+width_(0),
+height_(0),
+origin_x_(0.0),
+origin_y_(0.0),
+resolution_(1.0)
+{
+}
+
+/** Build the mask of a map
+  \param map Map
+  */
+void FreeMask::load(const nav_msgs::OccupancyGrid& map)
+{
+    width_ = map.info.width;
+    height_ = map.info.height;
+    origin_x_ = map.info.origin.position.x;
+    origin_y_ = map.info.origin.position.y;
+    resolution_ = map.info.resolution;
+
+    size_t num_cells = (size_t)width_*height_;
+    if(map.data.size() < num_cells)
+        num_cells = map.data.size();
+    bits_.assign((num_cells + 63)/64, 0);
+    for(size_t k = 0; k < num_cells; k++)
+    {
+        if(map.data[k] == 0)
+            bits_[k >> 6] |= (uint64_t)1 << (k & 63);
+    }
+    if(num_cells < (size_t)width_*height_)
+        height_ = num_cells/(width_ > 0 ? width_ : 1);
+}
+
+/** Whether no map has been loaded */
+bool FreeMask::empty() const
+{
+    return bits_.empty();
+}
@@ -0,0 +1,119 @@
+"""
+Cache of the preprocessed data of the static map, shared by all the nodes.
+
+Every artifact (free cells, distance transform, clearance masks) is computed by
+the first node that needs it and saved as a binary file, named after the
+CRC32 and the size of the map. The other nodes, Python or C++ (see map_cache.h),
+memory-map the file instead of computing it again. A file holds the number of
+elements of the array, as a little-endian uint64, followed by the raw elements.
+The arrays are in the order of the map data: row-major, with the first row at
+the map origin.
+"""
+
+import os
+import zlib
+
+import numpy as np
+import scipy as sp
+import scipy.ndimage
+import rospy
+
+_COUNT = np.dtype('<u8') # header of the files: number of elements of the array
+
+
+def default_cache_dir(kind='maps'):
+    """
+    Directory of the cached data of a kind, under ROS_HOME. The directory of the
+    map artifacts must match MapCache::defaultDir.
+    """
+    ros_home = os.environ.get('ROS_HOME', os.path.join(os.path.expanduser('~'), '.ros'))
+    return os.path.join(ros_home, 'active_perception_controller', kind)
+
+
+def map_key(navmap):
+    """
+    CRC32 of the map data, and size of the map. Must match MapCache::key.
+    """
+    data = np.asarray(navmap.data, dtype=np.int8).tostring()
+    return '%08x_%dx%d' % (zlib.crc32(data) & 0xffffffff, navmap.info.width, navmap.info.height)
+
+
+class MapArtifacts(object):
+    """
+    Preprocessed data of a map, loaded from the cache or computed on first use.
+    The returned arrays are read-only.
+    """
+    def __init__(self, navmap, cache_dir=None):
+        self._navmap = navmap
+        self._shape = (navmap.info.height, navmap.info.width)
+        self._dir = cache_dir if cache_dir is not None else default_cache_dir()
+        self.key = map_key(navmap)
+
+    def free_cells(self):
+        """
+        Indices of the free cells in the map data, as int32.
+        """
+        return self._load_or_build('free', np.int32, None,
+                                   lambda: np.flatnonzero(self._mapdata() == 0).astype(np.int32))
+
+    def distance(self):
+        """
+        Distance from every cell to the closest non-free cell, in pixels, as float32.
+        """
+        return self._load_or_build('dist', np.float32, self._shape,
+                                   lambda: sp.ndimage.distance_transform_edt(self._mapdata() == 0).astype(np.float32))
+
+    def clearance(self, min_clearance):
+        """
+        Mask of the cells at min_clearance pixels or more from any non-free cell, as uint8.
+        """
+        return self._load_or_build('clear%.3f' % min_clearance, np.uint8, self._shape,
+                                   lambda: (self.distance() >= min_clearance).astype(np.uint8))
+
+    def _mapdata(self):
+        return np.asarray(self._navmap.data, dtype=np.int8).reshape(self._shape)
+
+    def _load_or_build(self, name, dtype, shape, build):
+        filename = os.path.join(self._dir, 'map_%s_%s.bin' % (self.key, name))
+        if os.path.exists(filename):
+            try:
+                return _map_array(filename, dtype, shape)
+            except (IOError, ValueError) as e:
+                rospy.logwarn("Could not map %s (%s). Computing it again.", filename, e)
+
+        data = np.ascontiguousarray(build(), dtype=dtype)
+        try:
+            if not os.path.isdir(self._dir):
+                os.makedirs(self._dir)
+            tmp = '%s.%d.tmp' % (filename, os.getpid())
+            with open(tmp, 'wb') as f:
+                np.array([data.size], dtype=_COUNT).tofile(f)
+                data.tofile(f)
+            os.rename(tmp, filename) # so that a partially written file is never mapped
+        except (IOError, OSError) as e:
+            rospy.logwarn("Could not save %s (%s). The map data will not be shared.", filename, e)
+            return data
+        return _map_array(filename, dtype, shape)
+
+
+def _map_array(filename, dtype, shape):
+    """
+    Maps an array of the cache, read-only. shape is None for a 1-D array of any
+    length. Raises ValueError if the file does not hold an array of that shape.
+    Empty arrays are not mapped, since an empty mapping is not allowed.
+    """
+    count = np.fromfile(filename, dtype=_COUNT, count=1)
+    if len(count) != 1:
+        raise ValueError("no header")
+    count = int(count[0])
+    if os.path.getsize(filename) != _COUNT.itemsize + count*np.dtype(dtype).itemsize:
+        raise ValueError("the file size does not match the header")
+    if shape is None:
+        shape = (count,)
+    elif count != int(np.prod(shape)):
+        raise ValueError("%d elements instead of %d" % (count, int(np.prod(shape))))
+    if count == 0:
+        data = np.zeros(shape, dtype=dtype)
+        data.flags.writeable = False
+        return data
+    return np.memmap(filename, dtype=dtype, mode='r', offset=_COUNT.itemsize, shape=shape)
@@ -0,0 +1,58 @@
+"""
+Vectorised conversion of person particle clouds (sensor_msgs/PointCloud with
+a 'weights' channel) into NumPy arrays, without creating a Point32 object per
+particle.
+"""
+
+import struct
+
+import numpy as np
+
+
+def _read_uint32(buff, offset):
+    return (struct.unpack_from('<I', buff, offset)[0], offset + 4)
+
+
+def cloud_from_buffer(buff):
+    """
+    Parses a serialized sensor_msgs/PointCloud, e.g. the _buff of a message
+    received through rospy.AnyMsg. Returns the x, y and weights arrays, as
+    contiguous float64 arrays. The float32 values of the buffer are converted
+    once here, so that the utility function, the particle field and the
+    samplers can all use the arrays without copying them again.
+    """
+    offset = 12 # seq, stamp.secs, stamp.nsecs
+    (frame_len, offset) = _read_uint32(buff, offset)
+    offset += frame_len
+
+    (num_points, offset) = _read_uint32(buff, offset)
+    points = np.frombuffer(buff, dtype='<f4', count=3*num_points, offset=offset).reshape(num_points, 3)
+    offset += 12*num_points
+
+    weights = None
+    (num_channels, offset) = _read_uint32(buff, offset)
+    for c in xrange(num_channels):
+        (name_len, offset) = _read_uint32(buff, offset)
+        name = buff[offset:offset+name_len]
+        offset += name_len
+        (num_values, offset) = _read_uint32(buff, offset)
+        if name == 'weights':
+            weights = np.frombuffer(buff, dtype='<f4', count=num_values, offset=offset)
+        offset += 4*num_values
+
+    if weights is None or len(weights) != num_points:
+        raise ValueError("Particle cloud must have a 'weights' channel with one value per point")
+    return (points[:,0].astype(np.float64), points[:,1].astype(np.float64), weights.astype(np.float64))
+
+
+def cloud_from_msg(msg):
+    """
+    Same as cloud_from_buffer, for a deserialized sensor_msgs/PointCloud.
+    """
+    num_points = len(msg.points)
+    x = np.fromiter((p.x for p in msg.points), dtype=np.float64, count=num_points)
+    y = np.fromiter((p.y for p in msg.points), dtype=np.float64, count=num_points)
+    channel = [c for c in msg.channels if c.name == 'weights']
+    if len(channel) == 0 or len(channel[0].values) != num_points:
+        raise ValueError("Particle cloud must have a 'weights' channel with one value per point")
+    return (x, y, np.asarray(channel[0].values, dtype=np.float64))
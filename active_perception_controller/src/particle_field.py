@@ -0,0 +1,104 @@
+"""
+Nearest-particle distances used by the cost terms of the motion planners.
+
+The distance from a point to the particle cloud is exact, from a kd-tree over
+the particles. Comparing it with the maximum sensor range tells whether any
+particle can be seen from there. The kd-tree is only built when the planner
+first needs it, so receiving a particle cloud stays cheap.
+
+The belief bins of a particle cloud tell which parts of the map have changed
+since a previous cloud, so that the planners only rescore the vertices nearby.
+"""
+
+from math import sqrt
+
+import numpy as np
+import scipy as sp
+import scipy.spatial
+
+
+class ParticleDistanceField(object):
+    """
+    Distance from any point to the nearest person particle.
+    """
+    def __init__(self, x, y):
+        """
+        x and y are the particle coordinates, in the map frame.
+        """
+        self._particles = np.column_stack((np.asarray(x, dtype=np.float64),
+                                           np.asarray(y, dtype=np.float64)))
+        self._kdtree = None
+
+    def _index(self):
+        if self._kdtree is None:
+            self._kdtree = sp.spatial.cKDTree(self._particles)
+        return self._kdtree
+
+    def distance(self, p):
+        """
+        Distance from p to the nearest particle. Inf if there are no particles.
+        """
+        if len(self._particles) == 0:
+            return float('Inf')
+        return self._index().query(p)[0]
+
+    def distances(self, points):
+        """
+        Distances from each of the points to the nearest particle, in one query.
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        if len(self._particles) == 0:
+            return np.repeat(float('Inf'), len(points))
+        return self._index().query(points)[0]
+
+
+class BeliefBins(object):
+    """
+    Share of the belief in every square cell of cell_size meters that holds a
+    particle. Comparing the bins of two particle sets tells where the belief has
+    changed between them, even if every particle was resampled.
+    """
+    _OFFSET = 2**30 # cell coordinates are packed into a single int64 key
+
+    def __init__(self, x, y, weights, cell_size):
+        self.cell_size = float(cell_size)
+        col = np.floor(np.asarray(x, dtype=np.float64)/self.cell_size).astype(np.int64)
+        row = np.floor(np.asarray(y, dtype=np.float64)/self.cell_size).astype(np.int64)
+        weights = np.asarray(weights, dtype=np.float64)
+        (self.keys, inverse) = np.unique((col + self._OFFSET)*(2*self._OFFSET) + (row + self._OFFSET),
+                                         return_inverse=True)
+        self.mass = np.bincount(inverse, weights=weights, minlength=len(self.keys))
+        total = np.sum(self.mass)
+        if total > 0:
+            self.mass /= total
+
+    def _centers(self, keys):
+        col = keys // (2*self._OFFSET) - self._OFFSET
+        row = keys % (2*self._OFFSET) - self._OFFSET
+        return np.column_stack(((col + 0.5)*self.cell_size, (row + 0.5)*self.cell_size))
+
+    def changed_cells(self, reference, tolerance):
+        """
+        Centers of the cells whose share of the belief differs by more than
+        tolerance between this particle set and reference.
+        """
+        keys = np.union1d(self.keys, reference.keys)
+        mass = np.zeros(len(keys))
+        mass[np.searchsorted(keys, self.keys)] += self.mass
+        mass[np.searchsorted(keys, reference.keys)] -= reference.mass
+        return self._centers(keys[np.abs(mass) > tolerance])
+
+    def changed_near(self, reference, points, radius, tolerance):
+        """
+        Whether each of the points is within radius of a cell whose share of the
+        belief differs by more than tolerance from reference, that is, whether a
+        sensor of range radius could see the change from there.
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        changed = self.changed_cells(reference, tolerance)
+        if len(changed) == 0:
+            return np.zeros(len(points), dtype=bool)
+        # Any point of a cell is within half its diagonal of the center
+        (dist, idx) = sp.spatial.cKDTree(changed).query(points,
+                                                        distance_upper_bound=radius + self.cell_size*sqrt(0.5))
+        return np.isfinite(dist)
@@ -8,6 +8,9 @@ ParticleFilter
 {
     map_ = NULL;
     ran_generator_ = gsl_rng_alloc(gsl_rng_taus);
+    resample_threshold_ = 1.0;
+    num_resample_checks_ = 0;
+    num_resamples_ = 0;
 }
 
 ParticleFilter::
@@ -16,18 +19,14 @@ ParticleFilter
 {
     map_ = map;
 
-    // Compute free space in map
-    free_space_ind_.resize(0);
-    for(int i = 0; i < map_->info.width; i++)
-    {
-        for(int j = 0; j < map_->info.height; j++)
-        {
-            if(map_->data[j*map_->info.width + i] == 0)
-                free_space_ind_.push_back(std::make_pair(i,j));
-        }
-    }
+    // Free space in map, computed once for all the nodes
+    free_space_ind_.load(*map_);
+    free_mask_.load(*map_);
 
     ran_generator_ = gsl_rng_alloc(gsl_rng_taus);
+    resample_threshold_ = 1.0;
+    num_resample_checks_ = 0;
+    num_resamples_ = 0;
 }
 
 /** Destructor
@@ -66,37 +65,113 @@ Particle* ParticleFilter::getParticle(int particle_id)
   \return resampled_set Vector with the particles index to resample
 */
 vector<int> ParticleFilter::calcResampledSet()
+{
+    vector<double> weights(particles_.size());
+    for(int i = 0; i < particles_.size(); i++)
+        weights[i] = particles_[i]->weight_;
+    return calcResampledSet(weights);
+}
+
+/** Version of calcResampledSet for filters that keep the weights in an array
+  \param weights Particle weights, not necessarily normalized
+  \return resampled_set Vector with the particles index to resample
+*/
+vector<int> ParticleFilter::calcResampledSet(const vector<double>& weights)
 {
     vector<int> resampled_set;
+    calcResampledSet(weights, resampled_set);
+    return resampled_set;
+}
+
+/** Version of calcResampledSet that writes into a reusable buffer, so that it does not
+  allocate once the buffer has grown to the number of particles
+  \param weights Particle weights, not necessarily normalized
+  \param resampled_set Output, vector with the particles index to resample
+*/
+void ParticleFilter::calcResampledSet(const vector<double>& weights, vector<int>& resampled_set)
+{
     double c, u, r;
-    int num_samples = particles_.size();
+    int num_samples = weights.size();
+
+    resampled_set.resize(num_samples);
 
     double total_weight=0.0;
     for (int i=0; i<num_samples;i++)
-	total_weight=total_weight+particles_[i]->weight_;
+	total_weight=total_weight+weights[i];
    
 
     if(num_samples > 0)
     {
         r = gsl_rng_uniform(ran_generator_)*(total_weight/num_samples);
 
-        int m, i;
-
-        i = 0;
-        c = particles_[0]->weight_;
+        int i = 0;
+        c = weights[0];
         for (int m = 0; m < num_samples; m++)
         {
           u = r + (m) * (total_weight / num_samples);
-          while (u > c)
+          while (u > c && i < num_samples - 1) // the bound only matters for rounding errors
           {
             i = i + 1;
-            c = c + particles_[i]->weight_;
+            c = c + weights[i];
           }
-          resampled_set.push_back(i);
+          resampled_set[m] = i;
         }
     }
+}
 
-    return resampled_set;
+/** Effective sample size of the particle set, 1/sum(w^2) with normalized weights
+  */
+double ParticleFilter::effectiveSampleSize()
+{
+    double total_weight = 0.0;
+    double sq_weight = 0.0;
+    int num_particles = getNumParticles();
+    for(int i = 0; i < num_particles; i++)
+    {
+        double w = getParticle(i)->weight_;
+        total_weight += w;
+        sq_weight += w*w;
+    }
+    if(sq_weight <= 0)
+        return 0.0;
+    return total_weight*total_weight/sq_weight;
+}
+
+/** Resample only if the effective sample size is below the threshold. Resampling too often
+  loses particle diversity, e.g. while there are only negative observations
+  \return Whether the particles were resampled
+  */
+bool ParticleFilter::resampleIfNeeded()
+{
+    num_resample_checks_++;
+    if(resample_threshold_ < 1.0 && effectiveSampleSize() >= resample_threshold_*getNumParticles())
+        return false;
+
+    resample();
+    num_resamples_++;
+    return true;
+}
+
+/** Set the threshold of resampleIfNeeded
+  \param threshold Fraction of the number of particles. 1 or more resamples always, 0 never
+  */
+void ParticleFilter::setResampleThreshold(double threshold)
+{
+    resample_threshold_ = threshold;
+}
+
+/** Number of calls to resampleIfNeeded
+  */
+unsigned long ParticleFilter::getNumResampleChecks()
+{
+    return num_resample_checks_;
+}
+
+/** Number of calls to resampleIfNeeded that resampled
+  */
+unsigned long ParticleFilter::getNumResamples()
+{
+    return num_resamples_;
 }
 
 /** Set an occupancy map for the filter
@@ -105,4 +180,6 @@ vector<int> ParticleFilter::calcResampledSet()
 void ParticleFilter::setMap(const nav_msgs::OccupancyGrid *map)
 {
     map_ = map;
+    if(map_ != NULL)
+        free_mask_.load(*map_);
 }
@@ -0,0 +1,128 @@
+#include <active_perception_controller/particle_grid.h>
+#include <algorithm>
+#include <cmath>
+
+/** Maximum number of cells per particle. The cells are made larger if needed */
+static const size_t MAX_CELLS_PER_PARTICLE = 4;
+
+/** Constructor. The grid is empty until it is built */
+ParticleGrid::ParticleGrid() :
+min_x_(0.0),
+min_y_(0.0),
+cell_size_(1.0),
+cols_(0),
+rows_(0)
+{
+}
+
+/** Build the index. The buffers are reused, so rebuilding for a set of the same size does not allocate
+  \param xs Particle positions, which must be finite
+  \param ys Particle positions, which must be finite
+  \param cell_size Size of the cells. The sensor range is a good choice, so that a query only visits a few cells
+  */
+void ParticleGrid::build(const std::vector<double>& xs, const std::vector<double>& ys, double cell_size)
+{
+    size_t num_particles = xs.size();
+    if(num_particles == 0 || cell_size <= 0)
+    {
+        clear();
+        return;
+    }
+
+    double max_x = xs[0], max_y = ys[0];
+    min_x_ = xs[0];
+    min_y_ = ys[0];
+    for(size_t i = 1; i < num_particles; i++)
+    {
+        min_x_ = std::min(min_x_, xs[i]);
+        max_x = std::max(max_x, xs[i]);
+        min_y_ = std::min(min_y_, ys[i]);
+        max_y = std::max(max_y, ys[i]);
+    }
+
+    // Few large cells when the particles are spread over a large area
+    cell_size_ = cell_size;
+    size_t max_cells = MAX_CELLS_PER_PARTICLE*num_particles;
+    while(((max_x - min_x_)/cell_size_ + 1)*((max_y - min_y_)/cell_size_ + 1) > max_cells)
+        cell_size_ *= 2;
+    cols_ = (int)floor((max_x - min_x_)/cell_size_) + 1;
+    rows_ = (int)floor((max_y - min_y_)/cell_size_) + 1;
+
+    // Counting sort of the particles by cell. It is stable, so the indices in a cell are sorted
+    cell_of_.resize(num_particles);
+    cell_start_.assign((size_t)cols_*rows_ + 1, 0);
+    for(size_t i = 0; i < num_particles; i++)
+    {
+        int col = std::min((int)((xs[i] - min_x_)/cell_size_), cols_ - 1);
+        int row = std::min((int)((ys[i] - min_y_)/cell_size_), rows_ - 1);
+        cell_of_[i] = (size_t)row*cols_ + col;
+        cell_start_[cell_of_[i] + 1]++;
+    }
+    for(size_t c = 1; c < cell_start_.size(); c++)
+        cell_start_[c] += cell_start_[c - 1];
+
+    next_.assign(cell_start_.begin(), cell_start_.end() - 1);
+    indices_.resize(num_particles);
+    xs_.resize(num_particles);
+    ys_.resize(num_particles);
+    for(size_t i = 0; i < num_particles; i++)
+    {
+        size_t pos = next_[cell_of_[i]]++;
+        indices_[pos] = i;
+        xs_[pos] = xs[i];
+        ys_[pos] = ys[i];
+    }
+}
+
+/** Remove all the particles */
+void ParticleGrid::clear()
+{
+    cols_ = 0;
+    rows_ = 0;
+    cell_start_.clear();
+    indices_.clear();
+    xs_.clear();
+    ys_.clear();
+}
+
+/** Whether the grid has no particles */
+bool ParticleGrid::empty() const
+{
+    return indices_.empty();
+}
+
+/** Find the particles within a disc. The distance test is the same as hypot(x - cx, y - cy) <= radius
+  over all the particles, and the result is sorted, so it can replace that loop exactly
+  \param cx Center of the disc
+  \param cy Center of the disc
+  \param radius Radius of the disc
+  \param result Output, indices of the particles in the disc
+  */
+void ParticleGrid::query(double cx, double cy, double radius, std::vector<size_t>& result) const
+{
+    result.clear();
+    if(empty())
+        return;
+
+    // Cells that overlap the bounding box of the disc, with a margin for rounding errors. The bounds
+    // are clamped as doubles, so that far away discs do not overflow the integer conversion
+    double box = radius*(1.0 + 1e-9) + 1e-9;
+    double col_min = std::max(floor((cx - box - min_x_)/cell_size_), 0.0);
+    double col_max = std::min(floor((cx + box - min_x_)/cell_size_), cols_ - 1.0);
+    double row_min = std::max(floor((cy - box - min_y_)/cell_size_), 0.0);
+    double row_max = std::min(floor((cy + box - min_y_)/cell_size_), rows_ - 1.0);
+    if(!(col_min <= col_max && row_min <= row_max))
+        return;
+
+    for(int row = (int)row_min; row <= (int)row_max; row++)
+    {
+        size_t first = cell_start_[(size_t)row*cols_ + (int)col_min];
+        size_t last = cell_start_[(size_t)row*cols_ + (int)col_max + 1];
+        for(size_t k = first; k < last; k++)
+        {
+            if(hypot(xs_[k] - cx, ys_[k] - cy) <= radius)
+                result.push_back(indices_[k]);
+        }
+    }
+    std::sort(result.begin(), result.end());
+}
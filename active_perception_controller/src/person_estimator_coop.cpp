@@ -67,12 +67,26 @@ PersonEstimator::PersonEstimator()
     ros::NodeHandle private_nh("~");
     double sigma_person;
     double rfid_map_res;
+    int min_particles, max_particles;
+    double kld_bin_size, kld_err, kld_z;
+    double resample_threshold;
+    int num_threads;
     string rfid_prob_map;
 
     // Read parameters
     private_nh.param("step_duration", step_duration_, 0.2);
     private_nh.param("num_particles", num_particles_, 5000);
     private_nh.param("sigma_person", sigma_person, 0.05);
+    // KLD-sampling. The filter starts with num_particles, max_particles 0 keeps that number fixed
+    private_nh.param("min_particles", min_particles, 500);
+    private_nh.param("max_particles", max_particles, 0);
+    private_nh.param("kld_bin_size", kld_bin_size, 0.5);
+    private_nh.param("kld_err", kld_err, 0.01);
+    private_nh.param("kld_z", kld_z, 2.33);
+    // Resample when the effective sample size drops below this fraction of the particles, 1 to always resample
+    private_nh.param("resample_threshold", resample_threshold, 0.5);
+    // Threads for predict and update, 0 for one per core
+    private_nh.param("num_threads", num_threads, 1);
     private_nh.param("global_frame_id", global_frame_id_, string("map"));
     private_nh.param("num_robots", num_robots_, 1);
 
@@ -114,6 +128,9 @@ PersonEstimator::PersonEstimator()
     requestMap();
 
     person_pf_ = new PersonParticleFilter(num_particles_, &map_, sigma_person, rfid_map_res, rfid_prob_map);
+    person_pf_->setKLDSampling(min_particles, max_particles, kld_bin_size, kld_err, kld_z);
+    person_pf_->setResampleThreshold(resample_threshold);
+    person_pf_->setNumThreads(num_threads);
 
     first_rob_pose_ = false;
     filter_running_ = false;
@@ -168,7 +185,11 @@ void PersonEstimator::runIteration()
         	person_pf_->update(rfid_obs);
 	}
 
-        person_pf_->resample();
+        if(person_pf_->resampleIfNeeded())
+        {
+            ROS_DEBUG("PersonEstimator:: Resampled %lu times in %lu steps",
+                      person_pf_->getNumResamples(), person_pf_->getNumResampleChecks());
+        }
 
         publish_data = true;
     }
@@ -1,6 +1,7 @@
 #define _USE_MATH_DEFINES
 #include <cmath>
 #include <cstdlib>
+#include <algorithm>
 
 #include <active_perception_controller/person_particle_filter.h>
 #include <active_perception_controller/sensor_model.h>
@@ -30,15 +31,13 @@ PersonParticle::PersonParticle(const PersonParticle &person_particle)
   */
 PersonParticleFilter::PersonParticleFilter(int n_particles):ParticleFilter()
 {
-    for(int i = 0; i < n_particles; i++)
-    {
-        particles_.push_back(new PersonParticle());
-    }
+    resize(n_particles);
     local_sensor_ = false;
     external_sensor_ = false;
     prev_step_info_ = false;
     prev_weights_.resize(n_particles,0.0);
     last_obs_ = new RfidSensorData();
+    kld_max_particles_ = 0;
 }
 
 /** Constructor
@@ -50,10 +49,7 @@ PersonParticleFilter::PersonParticleFilter(int n_particles):ParticleFilter()
   */
 PersonParticleFilter::PersonParticleFilter(int n_particles, nav_msgs::OccupancyGrid const* map, double sigma_pose, double rfid_map_res, string rfid_prob_map):ParticleFilter(map)
 {
-    for(int i = 0; i < n_particles; i++)
-    {
-        particles_.push_back(new PersonParticle());
-    }
+    resize(n_particles);
 
     sigma_pose_ = sigma_pose;
 
@@ -63,23 +59,60 @@ PersonParticleFilter::PersonParticleFilter(int n_particles, nav_msgs::OccupancyG
     prev_step_info_ = false;
     prev_weights_.resize(n_particles,0.0);
     last_obs_ = new RfidSensorData();
+    kld_max_particles_ = 0;
 }
 
 /** Destructor
   */
 PersonParticleFilter::~PersonParticleFilter()
 {
-    for(int i = 0; i < particles_.size(); i++)
-    {
-        delete ((PersonParticle *)(particles_[i]));
-    }
-
     if(local_sensor_)
         delete rfid_model_;
 
+    for(int b = 0; b < block_rngs_.size(); b++)
+        gsl_rng_free(block_rngs_[b]);
+
     delete last_obs_;
 }
 
+/** Resize the particle set. New particles are at the origin, with weight 0
+  \param num_particles Number of particles
+  */
+void PersonParticleFilter::resize(size_t num_particles)
+{
+    x_.resize(num_particles, 0.0);
+    y_.resize(num_particles, 0.0);
+    weights_.resize(num_particles, 0.0);
+    grid_valid_ = false;
+    prev_weights_.reserve(num_particles);
+    resampled_set_.reserve(num_particles);
+    resampled_x_.reserve(num_particles);
+    resampled_y_.reserve(num_particles);
+}
+
+/** Get number of particles
+  */
+int PersonParticleFilter::getNumParticles()
+{
+    return weights_.size();
+}
+
+/** Get a copy of a particle. It is only valid until the next call
+  \param particle_id Identifier of the particle
+  */
+Particle* PersonParticleFilter::getParticle(int particle_id)
+{
+    if(particle_id < 0 || particle_id >= weights_.size())
+    {
+        ROS_ERROR_STREAM("Particle index out of range!");
+        return 0;
+    }
+    particle_.pose_[0] = x_[particle_id];
+    particle_.pose_[1] = y_[particle_id];
+    particle_.weight_ = weights_[particle_id];
+    return &particle_;
+}
+
 /** Draw particles from a uniform distribution
   */
 void PersonParticleFilter::initUniform()
@@ -87,19 +120,18 @@ void PersonParticleFilter::initUniform()
     if(map_ != NULL)
     {
         // Draw only particles from free space
-        int num_particles = particles_.size();
+        int num_particles = weights_.size();
+        grid_valid_ = false;
 
         for(int i = 0; i < num_particles; i++)
         {
             unsigned int rand_index = gsl_rng_uniform(ran_generator_)* free_space_ind_.size();
             std::pair<int,int> free_point = free_space_ind_[rand_index];
 
-            PersonParticle * part_ptr = (PersonParticle *)(particles_[i]);
-
-            part_ptr->pose_[0] = map_->info.origin.position.x + map_->info.resolution * free_point.first;
-           // part_ptr->pose_[1] = - (map_->info.origin.position.y + map_->info.resolution * (map_->info.height - free_point.second));
-	    part_ptr->pose_[1] =  (map_->info.origin.position.y + map_->info.resolution * (free_point.second));
-            part_ptr->weight_ = 1.0/num_particles;
+            x_[i] = map_->info.origin.position.x + map_->info.resolution * free_point.first;
+           // y_[i] = - (map_->info.origin.position.y + map_->info.resolution * (map_->info.height - free_point.second));
+	    y_[i] =  (map_->info.origin.position.y + map_->info.resolution * (free_point.second));
+            weights_[i] = 1.0/num_particles;
         }
     }
     else
@@ -113,34 +145,41 @@ void PersonParticleFilter::initUniform()
   */
 void PersonParticleFilter::predict(double timeStep)
 {
-    int num_particles = particles_.size();
+#ifdef FILTER_ON_PREDICTION
+    if(map_ == NULL)
+        ROS_WARN("Prediction cannot be filtered out without a map");
+#endif
 
-    for(int i = 0; i < num_particles; i++)
-    {
-        PersonParticle * part_ptr = (PersonParticle *)(particles_[i]);
+    grid_valid_ = false;
+    if(pool_.size() > 1)
+        pool_.run(block_rngs_.size(), boost::bind(&PersonParticleFilter::predictBlock, this, _1, timeStep));
+    else
+        predictParticles(0, weights_.size(), timeStep, ran_generator_);
+}
 
-        double dx = gsl_ran_gaussian(ran_generator_, sigma_pose_);
-        double dy = gsl_ran_gaussian(ran_generator_, sigma_pose_);
+/** Predict a range of particles
+  \param begin First particle
+  \param end One past the last particle
+  \param timestep Prediction step duration in seconds
+  \param rng Random number generator, only used by this range
+  */
+void PersonParticleFilter::predictParticles(size_t begin, size_t end, double timeStep, gsl_rng *rng)
+{
+    for(size_t i = begin; i < end; i++)
+    {
+        double dx = gsl_ran_gaussian(rng, sigma_pose_);
+        double dy = gsl_ran_gaussian(rng, sigma_pose_);
 #ifdef FILTER_ON_PREDICTION
-        if(map_ != NULL)
+        // Particles do not move into occupied cells, or out of the map
+        if(!free_mask_.empty() && !free_mask_.isFree(x_[i] + dx, y_[i] + dy))
         {
-            size_t map_x = floor((part_ptr->pose_[0] + dx - map_->info.origin.position.x)/map_->info.resolution);
-          //  size_t map_y = floor((part_ptr->pose_[1] + dy + map_->info.origin.position.y)/map_->info.resolution + map_->info.height);
-            size_t map_y = floor((part_ptr->pose_[1] + dy - map_->info.origin.position.y)/map_->info.resolution);
-            if(map_->data[map_y*map_->info.width + map_x] != 0) //occupied cell
-            {
-                dx = 0;
-                dy = 0;
-            }
-        }
-        else
-        {
-            ROS_WARN("Prediction cannot be filtered out without a map");
+            dx = 0;
+            dy = 0;
         }
 #endif
 
-        part_ptr->pose_[0] += dx;
-        part_ptr->pose_[1] += dy;
+        x_[i] += dx;
+        y_[i] += dy;
     }
 }
 
@@ -156,38 +195,44 @@ void PersonParticleFilter::update(SensorData &obs_data)
         // Update weights. We assume all observations are from RFID sensor
         RfidSensorData *rfid_obs = (RfidSensorData *)&obs_data;
 
-        for(int i = 0; i < particles_.size(); i++)
+        int num_particles = weights_.size();
+        double max_range = rfid_model_->getMaximumSensorRange();
+
+        // Particles within the sensor range, from the bucket index. It is built once per prediction
+        if(!grid_valid_)
         {
-            // Save previous information
-            prev_weights_[i] = particles_[i]->weight_;
-            PersonParticle * part_ptr = (PersonParticle *)(particles_[i]);
+            grid_.build(x_, y_, max_range);
+            grid_valid_ = true;
+        }
+        grid_.query(rfid_obs->pose_.pose.position.x, rfid_obs->pose_.pose.position.y, max_range, in_range_);
+        in_range_probs_.resize(in_range_.size());
 
-            if(hypot(part_ptr->pose_[0] - rfid_obs->pose_.pose.position.x, part_ptr->pose_[1] - rfid_obs->pose_.pose.position.y) <= rfid_model_->getMaximumSensorRange()) {
-                particles_[i]->weight_ = particles_[i]->weight_ * rfid_model_->applySensorModel(obs_data, particles_[i]);
-            }
-            else
-            {
-                if(rfid_obs->rfid_)
-                    particles_[i]->weight_ = 0.0;
-            }
+        // Save previous information
+        prev_weights_ = weights_;
 
-            total_weight += particles_[i]->weight_;
+        if(pool_.size() > 1)
+        {
+            pool_.run(block_rngs_.size(), boost::bind(&PersonParticleFilter::weighBlock, this, _1, rfid_obs));
+            for(int b = 0; b < block_weights_.size(); b++)
+                total_weight += block_weights_[b];
         }
+        else
+            total_weight = weighParticles(0, num_particles, rfid_obs);
 
         if(total_weight > 0)
         {
-        // Normalize weights
-            for(int i = 0; i < particles_.size(); i++)
-            {
-               particles_[i]->weight_ = particles_[i]->weight_/total_weight;
-            }
+            // Normalize weights
+            if(pool_.size() > 1)
+                pool_.run(block_rngs_.size(), boost::bind(&PersonParticleFilter::normalizeBlock, this, _1, total_weight));
+            else
+                normalizeParticles(0, num_particles, total_weight);
         }
         else
         {
-            for(int i = 0; i < particles_.size(); i++)
+            ROS_WARN("PersonParticleFilter:: All particles have 0 weight. Re-normalizing.");
+            for(int i = 0; i < num_particles; i++)
             {
-                ROS_WARN("PersonParticleFilter:: All particles have 0 weight. Re-normalizing.");
-                particles_[i]->weight_ = 1.0/particles_.size();
+                weights_[i] = 1.0/num_particles;
             }
         }
         RfidSensorData *curr_obs = (RfidSensorData *)&obs_data;
@@ -200,20 +245,158 @@ void PersonParticleFilter::update(SensorData &obs_data)
         ROS_ERROR("Filter has no sensor model to update");
 }
 
+/** Apply an observation to the weights of a range of particles, without normalizing them.
+  The particles within the sensor range must be in in_range_
+  \param begin First particle
+  \param end One past the last particle
+  \param rfid_obs Observation
+  \return Sum of the weights of the range
+  */
+double PersonParticleFilter::weighParticles(size_t begin, size_t end, RfidSensorData *rfid_obs)
+{
+    double total_weight = 0.0;
+
+    // Observation probabilities of the particles in range, in one batch
+    size_t first = lower_bound(in_range_.begin(), in_range_.end(), begin) - in_range_.begin();
+    size_t last = lower_bound(in_range_.begin(), in_range_.end(), end) - in_range_.begin();
+    if(last > first)
+        rfid_model_->applySensorModel(*rfid_obs, &x_[0], &y_[0], &in_range_[first], last - first, &in_range_probs_[first]);
+
+    size_t next_in_range = first;
+    for(size_t i = begin; i < end; i++)
+    {
+        if(next_in_range < last && in_range_[next_in_range] == i) {
+            weights_[i] = weights_[i] * in_range_probs_[next_in_range];
+            next_in_range++;
+        }
+        else
+        {
+            if(rfid_obs->rfid_)
+                weights_[i] = 0.0;
+        }
+
+        total_weight += weights_[i];
+    }
+    return total_weight;
+}
+
+/** Normalize the weights of a range of particles
+  \param begin First particle
+  \param end One past the last particle
+  \param total_weight Sum of all the weights
+  */
+void PersonParticleFilter::normalizeParticles(size_t begin, size_t end, double total_weight)
+{
+    for(size_t i = begin; i < end; i++)
+    {
+        weights_[i] = weights_[i]/total_weight;
+    }
+}
+
+/** Set the number of threads for predict and update. Every thread works on its own block of
+  particles, with its own random number generator, so the result only depends on the number
+  of threads and the seed of the filter
+  \param num_threads Number of threads, 0 for one per core
+  */
+void PersonParticleFilter::setNumThreads(int num_threads)
+{
+    pool_.resize(num_threads > 0 ? num_threads : 0);
+
+    for(int b = 0; b < block_rngs_.size(); b++)
+        gsl_rng_free(block_rngs_[b]);
+    block_rngs_.clear();
+    block_weights_.clear();
+    if(pool_.size() <= 1)
+        return;
+
+    for(int b = 0; b < pool_.size(); b++)
+    {
+        gsl_rng *rng = gsl_rng_alloc(gsl_rng_taus);
+        gsl_rng_set(rng, (unsigned long)(gsl_rng_uniform(ran_generator_)*4294967295.0) + 1);
+        block_rngs_.push_back(rng);
+    }
+    block_weights_.resize(block_rngs_.size(), 0.0);
+}
+
+/** Number of threads for predict and update */
+int PersonParticleFilter::getNumThreads()
+{
+    return pool_.size();
+}
+
+/** Particles of a block for the parallel kernels
+  \param block Index of the block
+  \param begin First particle
+  \param end One past the last particle
+  */
+void PersonParticleFilter::blockRange(size_t block, size_t &begin, size_t &end)
+{
+    size_t num_particles = weights_.size();
+    size_t num_blocks = block_rngs_.size();
+    begin = num_particles*block/num_blocks;
+    end = num_particles*(block + 1)/num_blocks;
+}
+
+/** Task of the parallel predict */
+void PersonParticleFilter::predictBlock(size_t block, double timeStep)
+{
+    size_t begin, end;
+    blockRange(block, begin, end);
+    predictParticles(begin, end, timeStep, block_rngs_[block]);
+}
+
+/** Task of the parallel update */
+void PersonParticleFilter::weighBlock(size_t block, RfidSensorData *rfid_obs)
+{
+    size_t begin, end;
+    blockRange(block, begin, end);
+    block_weights_[block] = weighParticles(begin, end, rfid_obs);
+}
+
+/** Task of the parallel normalization */
+void PersonParticleFilter::normalizeBlock(size_t block, double total_weight)
+{
+    size_t begin, end;
+    blockRange(block, begin, end);
+    normalizeParticles(begin, end, total_weight);
+}
+
 /** \brief Static version of the update function
 \param rfid_model Sensor model
-\param particles Positions of current particles
+\param xs Positions of current particles
+\param ys Positions of current particles
 \param obs_data Observation to update
 \param prev_weights Particle weights before updating
 \param updated_weights Particle weights after updating
 \param use_particle_idx Particles used for updating
+\param scale If given, the factor applied to the weights of the particles not used for updating (0 if re-normalized)
 */
 void PersonParticleFilter::update(RfidSensorModel &rfid_model,
-                                  vector<Particle*> &particles,
+                                  const vector<double> &xs,
+                                  const vector<double> &ys,
                                   SensorData &obs_data,
                                   const vector<double>& prev_weights,
                                   vector<double>& updated_weights,
-                                  const vector<size_t>& use_particle_idx)
+                                  const vector<size_t>& use_particle_idx,
+                                  double *scale)
+{
+    vector<double> obs_probs;
+    rfid_model.applySensorModel(obs_data, xs, ys, use_particle_idx, obs_probs);
+    update(obs_probs, prev_weights, updated_weights, use_particle_idx, scale);
+}
+
+/** \brief Static version of the update function, with the observation probabilities already computed
+\param obs_probs Probability of the observation for every particle in use_particle_idx
+\param prev_weights Particle weights before updating
+\param updated_weights Particle weights after updating
+\param use_particle_idx Particles used for updating
+\param scale If given, the factor applied to the weights of the particles not used for updating (0 if re-normalized)
+*/
+void PersonParticleFilter::update(const vector<double>& obs_probs,
+                                  const vector<double>& prev_weights,
+                                  vector<double>& updated_weights,
+                                  const vector<size_t>& use_particle_idx,
+                                  double *scale)
 {
     double total_weight = 1.0; //we assume that the previous weights are already normalized
 
@@ -221,7 +404,7 @@ void PersonParticleFilter::update(RfidSensorModel &rfid_model,
     for(int i = 0; i < use_particle_idx.size(); i++)
     {
         size_t idx = use_particle_idx[i];
-        updated_weights[idx] = prev_weights[idx]*rfid_model.applySensorModel(obs_data, particles[idx]);
+        updated_weights[idx] = prev_weights[idx]*obs_probs[i];
         total_weight -= prev_weights[idx];
         total_weight += updated_weights[idx];
     }
@@ -233,14 +416,18 @@ void PersonParticleFilter::update(RfidSensorModel &rfid_model,
         {
             updated_weights[i] = updated_weights[i]/total_weight;
         }
+        if(scale != NULL)
+            *scale = 1.0/total_weight;
     }
     else
     {
-        for(int i = 0; i < particles.size(); i++)
+        ROS_WARN("PersonParticleFilter:: All particles have 0 weight. Re-normalizing.");
+        for(int i = 0; i < updated_weights.size(); i++)
         {
-            ROS_WARN("PersonParticleFilter:: All particles have 0 weight. Re-normalizing.");
-            updated_weights[i] = 1.0/particles.size();
+            updated_weights[i] = 1.0/updated_weights.size();
         }
+        if(scale != NULL)
+            *scale = 0.0;
     }
 }
 
@@ -248,30 +435,173 @@ void PersonParticleFilter::update(RfidSensorModel &rfid_model,
   */
 void PersonParticleFilter::resample()
 {
-    vector<int> resampled_set = calcResampledSet();
-    vector<PersonParticle*> resampled_particles;
+    grid_valid_ = false;
+    if(kld_max_particles_ > 0)
+    {
+        resampleKLD();
+        return;
+    }
 
-    // Create new set
-    for(int i = 0; i < resampled_set.size(); i++)
+    calcResampledSet(weights_, resampled_set_);
+    int num_particles = resampled_set_.size();
+    resampled_x_.resize(num_particles);
+    resampled_y_.resize(num_particles);
+
+    // Gather new set
+    for(int i = 0; i < num_particles; i++)
     {
-        resampled_particles.push_back(new PersonParticle(*((PersonParticle *)(particles_[resampled_set[i]]))));
+        resampled_x_[i] = x_[resampled_set_[i]];
+        resampled_y_[i] = y_[resampled_set_[i]];
     }
 
-    // Free old set
-    for(int i = 0; i < particles_.size(); i++)
+    // Replace old set. The old arrays become the buffers of the next step
+    x_.swap(resampled_x_);
+    y_.swap(resampled_y_);
+    weights_.assign(num_particles, 1.0/num_particles);
+
+    prev_step_info_ = false;
+}
+
+/** Effective sample size of the particle set, 1/sum(w^2) with normalized weights
+  */
+double PersonParticleFilter::effectiveSampleSize()
+{
+    double total_weight = 0.0;
+    double sq_weight = 0.0;
+    for(int i = 0; i < weights_.size(); i++)
     {
-        delete ((PersonParticle *)(particles_[i]));
+        total_weight += weights_[i];
+        sq_weight += weights_[i]*weights_[i];
     }
-    particles_.clear();
+    if(sq_weight <= 0)
+        return 0.0;
+    return total_weight*total_weight/sq_weight;
+}
+
+/** Enable KLD-sampling. From then on, every resampling step draws particles until there are
+  enough of them to bound the KL divergence between the particle set and the belief, given the
+  number of histogram bins they fall into.
+  \param min_particles Minimum number of particles
+  \param max_particles Maximum number of particles. 0 disables KLD-sampling
+  \param bin_size Size of the histogram bins, in meters
+  \param kld_err Maximum KL divergence between the particle set and the belief
+  \param kld_z Upper standard normal quantile of the probability that the divergence is below kld_err
+  */
+void PersonParticleFilter::setKLDSampling(int min_particles, int max_particles, double bin_size, double kld_err, double kld_z)
+{
+    if(max_particles <= 0)
+    {
+        kld_max_particles_ = 0;
+        return;
+    }
+    if(map_ == NULL)
+    {
+        ROS_WARN("PersonParticleFilter:: KLD-sampling needs a map. Keeping a fixed number of particles.");
+        return;
+    }
+    if(bin_size <= 0 || kld_err <= 0)
+    {
+        ROS_ERROR("PersonParticleFilter:: Wrong KLD-sampling parameters. Keeping a fixed number of particles.");
+        return;
+    }
+
+    kld_min_particles_ = max(1, min(min_particles, max_particles));
+    kld_max_particles_ = max_particles;
+    kld_bin_size_ = bin_size;
+    kld_err_ = kld_err;
+    kld_z_ = kld_z;
+
+    kld_bins_width_ = max(1, (int)ceil(map_->info.width*map_->info.resolution/bin_size));
+    kld_bins_height_ = max(1, (int)ceil(map_->info.height*map_->info.resolution/bin_size));
+    kld_bins_.assign(kld_bins_width_*kld_bins_height_, 0);
+    kld_occupied_.clear();
+
+    kld_occupied_.reserve(max_particles);
+}
+
+/** Number of particles needed to bound the KL divergence with the belief (Fox, Eq. 13)
+  \param num_bins Number of histogram bins with particles
+  \param kld_err Maximum KL divergence
+  \param kld_z Upper standard normal quantile
+  */
+int PersonParticleFilter::kldNumParticles(int num_bins, double kld_err, double kld_z)
+{
+    if(num_bins <= 1)
+        return 0;
+
+    double a = 2.0/(9.0*(num_bins - 1));
+    double b = 1.0 - a + sqrt(a)*kld_z;
+    return (int)ceil((num_bins - 1)/(2.0*kld_err)*b*b*b);
+}
 
-    // Replace with new set
-    for(int i = 0; i < resampled_particles.size(); i++)
+/** Resample with KLD-sampling. Particles are drawn one at a time from the current set, and the
+  number of particles is recomputed whenever one falls into a new histogram bin
+  */
+void PersonParticleFilter::resampleKLD()
+{
+    int num_particles = weights_.size();
+    if(num_particles == 0)
+        return;
+
+    double total_weight = 0.0;
+    cumulative_.resize(num_particles);
+    for(int i = 0; i < num_particles; i++)
     {
-        particles_.push_back((Particle *)(resampled_particles[i]));
-        PersonParticle * part_ptr = (PersonParticle *)(particles_[i]);
-        part_ptr->weight_ = 1.0/resampled_particles.size();
+        total_weight += weights_[i];
+        cumulative_[i] = total_weight;
+    }
+    if(total_weight <= 0)
+    {
+        // Degenerate weights: draw uniformly
+        for(int i = 0; i < num_particles; i++)
+            cumulative_[i] = i + 1;
+        total_weight = num_particles;
     }
 
+    // No-ops once the buffers have grown to the largest set
+    resampled_x_.reserve(kld_max_particles_);
+    resampled_y_.reserve(kld_max_particles_);
+    resampled_x_.clear();
+    resampled_y_.clear();
+    int num_required = kld_min_particles_;
+    int n = 0;
+    while(n < kld_max_particles_ && (n < kld_min_particles_ || n < num_required))
+    {
+        double u = gsl_rng_uniform(ran_generator_)*total_weight;
+        int idx = upper_bound(cumulative_.begin(), cumulative_.end(), u) - cumulative_.begin();
+        if(idx >= num_particles)
+            idx = num_particles - 1;
+
+        double x = x_[idx];
+        double y = y_[idx];
+        resampled_x_.push_back(x);
+        resampled_y_.push_back(y);
+        n++;
+
+        // Particles outside the map count in the border bins
+        int col = floor((x - map_->info.origin.position.x)/kld_bin_size_);
+        int row = floor((y - map_->info.origin.position.y)/kld_bin_size_);
+        col = max(0, min(col, kld_bins_width_ - 1));
+        row = max(0, min(row, kld_bins_height_ - 1));
+        int bin = row*kld_bins_width_ + col;
+        if(!kld_bins_[bin])
+        {
+            kld_bins_[bin] = 1;
+            kld_occupied_.push_back(bin);
+            num_required = kldNumParticles(kld_occupied_.size(), kld_err_, kld_z_);
+        }
+    }
+
+    // Clear only the bins that were used
+    for(int i = 0; i < kld_occupied_.size(); i++)
+        kld_bins_[kld_occupied_[i]] = 0;
+    kld_occupied_.clear();
+
+    // Replace old set. The old arrays become the buffers of the next step
+    x_.swap(resampled_x_);
+    y_.swap(resampled_y_);
+    weights_.assign(n, 1.0/n);
+
     prev_step_info_ = false;
 }
 
@@ -317,13 +647,13 @@ double PersonParticleFilter::entropyParticles()
               belief zero, so entropy zero. They do not contribute to the entropy.
               */
 
-            for(int i = 0; i < particles_.size(); i++)
+            for(int i = 0; i < weights_.size(); i++)
             {
-                obs_prob = rfid_model_->applySensorModel(*last_obs_, particles_[i]);
+                obs_prob = rfid_model_->applySensorModel(*last_obs_, x_[i], y_[i]);
                 if(obs_prob > 0 && prev_weights_[i] > 0)
                 {
                     first_term += obs_prob*prev_weights_[i];
-                    second_term += log(obs_prob*prev_weights_[i])*particles_[i]->weight_;
+                    second_term += log(obs_prob*prev_weights_[i])*weights_[i];
                 }
             }
 
@@ -343,7 +673,8 @@ double PersonParticleFilter::entropyParticles()
 
 /** \brief Static version of the entropy calculation function (for performance reasons)
 \param rfid_model Sensor model to update
-\param particles Current particles' positions
+\param xs Current particles' positions
+\param ys Current particles' positions
 \param obs Last observation
 \param prev_weights Particle weights before updating
 \param current_weights Particle weights after updating
@@ -351,7 +682,8 @@ double PersonParticleFilter::entropyParticles()
 double
 PersonParticleFilter::
 entropyParticles(RfidSensorModel &rfid_model,
-                 vector<Particle*> &particles,
+                 const vector<double> &xs,
+                 const vector<double> &ys,
                  SensorData &obs,
                  const vector<double>& prev_weights,
                  const vector<double>& current_weights)
@@ -372,9 +704,9 @@ entropyParticles(RfidSensorModel &rfid_model,
       belief zero, so entropy zero. They do not contribute to the entropy.
       */
 
-    for(int i = 0; i < particles.size(); i++)
+    for(int i = 0; i < xs.size(); i++)
     {
-        obs_prob = rfid_model.applySensorModel(obs, particles[i]);
+        obs_prob = rfid_model.applySensorModel(obs, xs[i], ys[i]);
         if(obs_prob > 0 && prev_weights[i] > 0)
         {
             first_term += obs_prob*prev_weights[i];
@@ -406,9 +738,9 @@ double PersonParticleFilter::entropyGMM()
 
     if(sigma_pose_ > 0.0)
     {
-        for(int i = 0; i < particles_.size(); i++)
+        for(int i = 0; i < weights_.size(); i++)
         {
-            w = particles_[i]->weight_;
+            w = weights_[i];
             if( w > 0 )
                 entropy += w*(-log(w) + 0.5*log(pow(2*M_PI*exp(1),2)*pow(sigma_pose_,4)));
         }
@@ -451,11 +783,6 @@ void PersonParticleFilter::initFromParticles(const sensor_msgs::PointCloud &part
 {
     int num_particles = particle_set.points.size();
 
-    if(particles_.size() != num_particles)
-    {
-        particles_.resize(num_particles, 0);
-    }
-
     // Look for the channel with weights
     int weights_channel = 0;
     while(particle_set.channels[weights_channel].name != "weights")
@@ -468,14 +795,14 @@ void PersonParticleFilter::initFromParticles(const sensor_msgs::PointCloud &part
         }
     }
 
+    resize(num_particles);
+
     // Copy particles from particle set
     for(int i = 0; i < num_particles; i++)
     {
-        if(particles_[i] == 0) particles_[i] = (Particle*) (new PersonParticle());
-        PersonParticle * part_ptr = (PersonParticle *)(particles_[i]);
-        part_ptr->pose_[0] = particle_set.points[i].x;
-        part_ptr->pose_[1] = particle_set.points[i].y;
-        part_ptr->weight_ = particle_set.channels[weights_channel].values[i];
+        x_[i] = particle_set.points[i].x;
+        y_[i] = particle_set.points[i].y;
+        weights_[i] = particle_set.channels[weights_channel].values[i];
     }
 }
 
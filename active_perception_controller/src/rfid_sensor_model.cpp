@@ -9,6 +9,7 @@
 #include <active_perception_controller/person_particle_filter.h>
 #include <tf/transform_datatypes.h>
 #include <math.h>
+#include <algorithm>
 
 using namespace tf;
 /** Constructor
@@ -20,6 +21,22 @@ RfidSensorModel::RfidSensorModel(const std::string& image_path, double resolutio
     map_resolution_ = resolution;
 
     prob_map_ = cv::imread(image_path, CV_LOAD_IMAGE_GRAYSCALE);
+    yaw_bins_ = 0;
+    rotated_size_ = 0;
+    max_range_ = hypot(prob_map_.rows, prob_map_.cols)*map_resolution_/2.0;
+
+    // Probabilities of the map, indexed as [col*rows + row] with the pixel addressing of the
+    // original lookup (data + step*col + row*elemSize). Pixels out of the image have probability 0
+    prob_lut_.assign(prob_map_.cols*prob_map_.rows, 0.0f);
+    for(int col = 0; col < prob_map_.cols && col < prob_map_.rows; col++)
+    {
+        for(int row = 0; row < prob_map_.rows && row < prob_map_.cols; row++)
+        {
+            uchar value = *(prob_map_.data + prob_map_.step*col + row*prob_map_.elemSize());
+            prob_lut_[col*prob_map_.rows + row] = value/255.0f;
+        }
+    }
+    buildPyramid();
 }
 
 /** Apply the sensor model to obtain the probability of an observation for a given particle
@@ -28,54 +45,323 @@ RfidSensorModel::RfidSensorModel(const std::string& image_path, double resolutio
   */
 double RfidSensorModel::applySensorModel(SensorData &obs_data, const Particle *particle)
 {
-    RfidSensorData *rfid_data = (RfidSensorData *)&obs_data;
     PersonParticle *particle_data = (PersonParticle *)particle;
+    return applySensorModel(obs_data, particle_data->pose_[0], particle_data->pose_[1]);
+}
+
+/** Apply the sensor model to obtain the probability of an observation for a person position
+  \param obs_data Observation
+  \param x Person position
+  \param y Person position
+  */
+double RfidSensorModel::applySensorModel(SensorData &obs_data, double x, double y)
+{
+    RfidSensorData *rfid_data = (RfidSensorData *)&obs_data;
+
+    double det_prob = detectionProbability(sensorFrame(*rfid_data), x, y);
+
+    if(rfid_data->rfid_ == true)
+        return det_prob; //TODO: should be P(true positive)*det_prob + P(false positive)
+    else
+        return 1-det_prob; //TODO: should be P(true negative)*(1-det_prob) + P(false negative)
+}
+
+/** Batch version of applySensorModel, for several person positions and the same observation.
+  The transformation to the sensor frame is computed only once
+  \param obs_data Observation
+  \param xs Person positions
+  \param ys Person positions
+  \param idx Indices of the positions to use
+  \param probs Output, probability of the observation for every position in idx
+  */
+void RfidSensorModel::applySensorModel(SensorData &obs_data,
+                                       const std::vector<double>& xs,
+                                       const std::vector<double>& ys,
+                                       const std::vector<size_t>& idx,
+                                       std::vector<double>& probs)
+{
+    probs.resize(idx.size());
+    if(!idx.empty())
+        applySensorModel(obs_data, &xs[0], &ys[0], &idx[0], idx.size(), &probs[0]);
+}
+
+/** Batch version of applySensorModel on arrays
+  \param obs_data Observation
+  \param xs Person positions
+  \param ys Person positions
+  \param idx Indices of the positions to use
+  \param num Number of indices
+  \param probs Output, probability of the observation for every position in idx
+  */
+void RfidSensorModel::applySensorModel(SensorData &obs_data,
+                                       const double* xs,
+                                       const double* ys,
+                                       const size_t* idx,
+                                       size_t num,
+                                       double* probs)
+{
+    RfidSensorData *rfid_data = (RfidSensorData *)&obs_data;
+
+    if(yaw_bins_ > 0)
+    {
+        // Rotated map of the sensor yaw, looked up with the offsets in global axes
+        double rx = rfid_data->pose_.pose.position.x;
+        double ry = rfid_data->pose_.pose.position.y;
+        double bin_size = 2*M_PI/yaw_bins_;
+        int bin = (int)floor(getYaw(rfid_data->pose_.pose.orientation)/bin_size + 0.5) % yaw_bins_;
+        if(bin < 0)
+            bin += yaw_bins_;
+        const float* lut = &rotated_luts_[(size_t)bin*rotated_size_*rotated_size_];
+        double center = rotated_size_/2.0;
+
+        for(size_t k = 0; k < num; k++)
+        {
+            double i = floor((xs[idx[k]] - rx)/map_resolution_ + center);
+            double j = floor((ys[idx[k]] - ry)/map_resolution_ + center);
+            double det_prob = 0.0;
+            if(i >= 0 && j >= 0 && i < rotated_size_ && j < rotated_size_)
+                det_prob = lut[(size_t)j*rotated_size_ + (size_t)i];
+            probs[k] = rfid_data->rfid_ ? det_prob : 1-det_prob;
+        }
+        return;
+    }
+
+    SensorFrame frame = sensorFrame(*rfid_data);
+
+    for(size_t k = 0; k < num; k++)
+    {
+        double det_prob = detectionProbability(frame, xs[idx[k]], ys[idx[k]]);
+        probs[k] = rfid_data->rfid_ ? det_prob : 1-det_prob;
+    }
+}
+
+/** Upper bounds of the detection probability over discs, from the pyramid of max-pooled maps.
+  Every person position within radius of a center has a detection probability (as given by
+  the batch applySensorModel, also with yaw bins) no larger than the bound of the disc
+  \param obs_data Observation, with the pose of the sensor
+  \param xs Centers of the discs
+  \param ys Centers of the discs
+  \param num Number of discs
+  \param radius Radius of the discs
+  \param bounds Output, bound of the detection probability for every disc
+  */
+void RfidSensorModel::detectionBounds(SensorData &obs_data,
+                                      const double* xs,
+                                      const double* ys,
+                                      size_t num,
+                                      double radius,
+                                      double* bounds)
+{
+    RfidSensorData *rfid_data = (RfidSensorData *)&obs_data;
+    SensorFrame frame = sensorFrame(*rfid_data);
+
+    // The rotated maps are sampled at the centers of their cells, and at the yaw of their bin
+    if(yaw_bins_ > 0)
+        radius += map_resolution_ + (max_range_ + map_resolution_)*M_PI/yaw_bins_;
+
+    int cols = prob_map_.cols, rows = prob_map_.rows;
+    for(size_t k = 0; k < num; k++)
+    {
+        double local_x = frame.xx*xs[k] + frame.xy*ys[k] + frame.x0;
+        double local_y = frame.yx*xs[k] + frame.yy*ys[k] + frame.y0;
+
+        // Pixels that localProbability can use for a position in the disc. It truncates
+        // the coordinates, so both the floor and the ceiling are covered
+        double col_min = std::max(floor((local_x - radius)/map_resolution_ + cols/2.0), 0.0);
+        double col_max = std::min(ceil((local_x + radius)/map_resolution_ + cols/2.0), cols - 1.0);
+        double row_min = std::max(rows - 1 - ceil((local_y + radius)/map_resolution_ + rows/2.0), 0.0);
+        double row_max = std::min(rows - 1 - floor((local_y - radius)/map_resolution_ + rows/2.0), rows - 1.0);
+        if(col_min <= col_max && row_min <= row_max)
+            bounds[k] = maxProbability((int)col_min, (int)col_max, (int)row_min, (int)row_max);
+        else
+            bounds[k] = 0.0;
+    }
+}
 
-    double det_prob;
+/** Build the pyramid of max-pooled maps from the probabilities of the map */
+void RfidSensorModel::buildPyramid()
+{
+    pyramid_.assign(1, prob_lut_);
+    pyramid_cols_.assign(1, prob_map_.cols);
+    pyramid_rows_.assign(1, prob_map_.rows);
+    while(pyramid_cols_.back() > 1 || pyramid_rows_.back() > 1)
+    {
+        const std::vector<float>& fine = pyramid_.back();
+        int fine_cols = pyramid_cols_.back(), fine_rows = pyramid_rows_.back();
+        int cols = (fine_cols + 1)/2, rows = (fine_rows + 1)/2;
+        std::vector<float> coarse((size_t)cols*rows, 0.0f);
+        for(int col = 0; col < fine_cols; col++)
+        {
+            for(int row = 0; row < fine_rows; row++)
+            {
+                float& cell = coarse[(size_t)(col/2)*rows + row/2];
+                cell = std::max(cell, fine[(size_t)col*fine_rows + row]);
+            }
+        }
+        pyramid_.push_back(coarse);
+        pyramid_cols_.push_back(cols);
+        pyramid_rows_.push_back(rows);
+    }
+}
+
+/** Maximum probability over a block of pixels of the map, from the coarsest level of the
+  pyramid where the block spans at most 2 x 2 cells
+  \param col_min First column of the block
+  \param col_max Last column of the block
+  \param row_min First row of the block
+  \param row_max Last row of the block
+  */
+double RfidSensorModel::maxProbability(int col_min, int col_max, int row_min, int row_max) const
+{
+    size_t level = 0;
+    while((col_max >> level) - (col_min >> level) > 1 || (row_max >> level) - (row_min >> level) > 1)
+        level++;
 
+    const std::vector<float>& cells = pyramid_[level];
+    int rows = pyramid_rows_[level];
+    float max_prob = 0.0f;
+    for(int col = col_min >> level; col <= col_max >> level; col++)
+        for(int row = row_min >> level; row <= row_max >> level; row++)
+            max_prob = std::max(max_prob, cells[(size_t)col*rows + row]);
+    return max_prob;
+}
+
+/** Transformation from the global frame to the frame of the sensor
+  \param obs_data Observation, with the pose of the sensor
+  */
+RfidSensorModel::SensorFrame RfidSensorModel::sensorFrame(const RfidSensorData &obs_data) const
+{
     /*
       tf_from_robot -> transformation from robot to global coordinate system
       tf_to_robot -> transformation from global to robot coordinate system
       local_position = tf_to_robot*global_position
       local_position is the position of the particle in the robot coordinate system
-      From the local_position, the pixels on the image are computed and the element checked for probability
+      Only the terms for positions on the floor (z = 0) are kept
     */
 
     Transform robot_tf;
-    Vector3 rob_translation(tfScalar(rfid_data->pose_.pose.position.x),tfScalar(rfid_data->pose_.pose.position.y),tfScalar(rfid_data->pose_.pose.position.z));
-    Vector3 global_position(particle_data->pose_[0],particle_data->pose_[1],0.0);
+    Vector3 rob_translation(tfScalar(obs_data.pose_.pose.position.x),tfScalar(obs_data.pose_.pose.position.y),tfScalar(obs_data.pose_.pose.position.z));
 
     Quaternion rob_rotation;
-    quaternionMsgToTF(rfid_data->pose_.pose.orientation, rob_rotation);
+    quaternionMsgToTF(obs_data.pose_.pose.orientation, rob_rotation);
     robot_tf.setRotation(rob_rotation);
     robot_tf.setOrigin(rob_translation);
 
     Transform tf_to_robot = robot_tf.inverse();
-    Vector3 local_position = tf_to_robot(global_position);
+    const Matrix3x3& basis = tf_to_robot.getBasis();
+
+    SensorFrame frame;
+    frame.xx = basis[0].x();
+    frame.xy = basis[0].y();
+    frame.x0 = tf_to_robot.getOrigin().x();
+    frame.yx = basis[1].x();
+    frame.yy = basis[1].y();
+    frame.y0 = tf_to_robot.getOrigin().y();
+    return frame;
+}
+
+/** Probability of detecting a person position, from the probability map
+  \param frame Transformation to the frame of the sensor
+  \param x Person position
+  \param y Person position
+  */
+double RfidSensorModel::detectionProbability(const SensorFrame &frame, double x, double y) const
+{
+    double local_x = frame.xx*x + frame.xy*y + frame.x0;
+    double local_y = frame.yx*x + frame.yy*y + frame.y0;
+    return localProbability(local_x, local_y);
+}
 
+/** Probability of detecting a position in the frame of the sensor, from the probability map
+  \param local_x Position in the frame of the sensor
+  \param local_y Position in the frame of the sensor
+  */
+double RfidSensorModel::localProbability(double local_x, double local_y) const
+{
+    // From the local position, the pixels on the image are computed and the element checked for probability
     int col, row;
 
-    col = (int)(local_position.getX()/map_resolution_ + prob_map_.cols/2.0);
-    row = prob_map_.rows - 1 - (int)(local_position.getY()/map_resolution_ + prob_map_.rows/2.0);
+    col = (int)(local_x/map_resolution_ + prob_map_.cols/2.0);
+    row = prob_map_.rows - 1 - (int)(local_y/map_resolution_ + prob_map_.rows/2.0);
 
     if(col >= 0 && col < prob_map_.cols && row >= 0 && row < prob_map_.rows)
+        return prob_lut_[col*prob_map_.rows + row];
+    else
+        return 0.0;
+}
+
+/** Precompute the probability map rotated to a number of yaw bins. From then on, the batch
+  applySensorModel only uses the planar pose of the sensor, and rounds its yaw to the closest bin
+  \param num_bins Number of bins over the full turn, 0 to use the exact transformation
+  */
+void RfidSensorModel::setYawBins(int num_bins)
+{
+    yaw_bins_ = num_bins > 0 ? num_bins : 0;
+    rotated_luts_.clear();
+    if(yaw_bins_ == 0)
     {
-        uchar value = *(prob_map_.data + prob_map_.step*col + row*prob_map_.elemSize());
-        det_prob = value/255.0;
+        rotated_size_ = 0;
+        return;
     }
-    else
+
+    // Large enough for the whole map in any orientation
+    rotated_size_ = 2*(int)ceil(max_range_/map_resolution_);
+    rotated_luts_.resize((size_t)yaw_bins_*rotated_size_*rotated_size_);
+    double center = rotated_size_/2.0;
+    for(int bin = 0; bin < yaw_bins_; bin++)
     {
-        det_prob = 0.0;
+        double c = cos(bin*2*M_PI/yaw_bins_);
+        double s = sin(bin*2*M_PI/yaw_bins_);
+        float* lut = &rotated_luts_[(size_t)bin*rotated_size_*rotated_size_];
+        for(int j = 0; j < rotated_size_; j++)
+        {
+            for(int i = 0; i < rotated_size_; i++)
+            {
+                // Center of the cell, rotated to the frame of the sensor
+                double dx = (i + 0.5 - center)*map_resolution_;
+                double dy = (j + 0.5 - center)*map_resolution_;
+                lut[(size_t)j*rotated_size_ + i] = localProbability(c*dx + s*dy, -s*dx + c*dy);
+            }
+        }
     }
+}
 
-    if(rfid_data->rfid_ == true)
-        return det_prob; //TODO: should be P(true positive)*det_prob + P(false positive)
-    else
-        return 1-det_prob; //TODO: should be P(true negative)*(1-det_prob) + P(false negative)
+/** Probability map rotated to a yaw and resampled to a resolution, as a square kernel centered
+  on the sensor: the value of cell (i, j) is the detection probability of a person at an offset of
+  ((i - size/2)*resolution, (j - size/2)*resolution) from the sensor, in global axes. Correlating
+  a belief grid with the kernel gives the detection probability from every cell of the grid
+  \param yaw Yaw of the sensor
+  \param resolution Size of the cells, in meters
+  \param kernel Output, probabilities of the kernel, indexed as [j*size + i]
+  \return Width and height of the kernel, which is odd
+  */
+int RfidSensorModel::detectionKernel(double yaw, double resolution, std::vector<float>& kernel)
+{
+    int half_size = (int)ceil(max_range_/resolution);
+    int size = 2*half_size + 1;
+    double c = cos(yaw);
+    double s = sin(yaw);
+    kernel.resize((size_t)size*size);
+    for(int j = 0; j < size; j++)
+    {
+        for(int i = 0; i < size; i++)
+        {
+            double dx = (i - half_size)*resolution;
+            double dy = (j - half_size)*resolution;
+            kernel[(size_t)j*size + i] = localProbability(c*dx + s*dy, -s*dx + c*dy);
+        }
+    }
+    return size;
+}
+
+/** Number of yaw bins of the precomputed maps, 0 if there are none */
+int RfidSensorModel::getYawBins()
+{
+    return yaw_bins_;
 }
 
 /** Get the maximum range of the RFID sensor */
 double RfidSensorModel::getMaximumSensorRange()
 {
-    return hypot(prob_map_.rows, prob_map_.cols)*map_resolution_/2.0;
+    return max_range_;
 }
@@ -0,0 +1,151 @@
+"""
+Probabilistic roadmap over the free space of the static map.
+
+The roadmap only depends on the map and on the robot radius, so it is built
+once, with all its edges collision-checked, and saved to disk under a hash of
+the map. Online, the planners link the robot to the roadmap, expand it into a
+shortest-path tree and score that tree with the current belief.
+"""
+
+import hashlib
+import heapq
+import os
+
+import numpy as np
+import scipy as sp
+import scipy.spatial
+import rospy
+
+import map_cache
+from rrt_tree import RRTStarTree
+
+
+class Roadmap(object):
+    """
+    Collision-free nodes and edges, in map frame coordinates.
+    """
+    def __init__(self, nodes, edges, radius):
+        self.nodes = np.asarray(nodes, dtype=np.float64).reshape(-1, 2)
+        self.edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+        self.radius = radius
+        self._kdtree = sp.spatial.cKDTree(self.nodes)
+        lengths = np.hypot(*(self.nodes[self.edges[:,0]] - self.nodes[self.edges[:,1]]).T)
+        self._adjacency = [[] for i in xrange(len(self.nodes))]
+        for (k, (i, j)) in enumerate(self.edges):
+            self._adjacency[i].append((j, lengths[k]))
+            self._adjacency[j].append((i, lengths[k]))
+
+    @staticmethod
+    def build(checker, info, freecells, num_nodes, radius, seed=0):
+        """
+        Samples num_nodes collision-free nodes over the free cells of the map, and
+        connects every pair of nodes closer than radius with a collision-free
+        segment. The sampling is seeded, so that the roadmap of a map is always
+        the same. Fewer nodes are placed if the free space is too cluttered.
+        """
+        rng = np.random.RandomState(seed)
+        freecells = np.asarray(freecells)
+        if len(freecells) == 0:
+            raise ValueError("Cannot build a roadmap: the map has no free cells")
+        nodes = np.zeros((0, 2))
+        for attempt in xrange(10):
+            if len(nodes) >= num_nodes:
+                break
+            idx = freecells[rng.randint(0, len(freecells), 2*num_nodes)]
+            P = np.column_stack(((idx % info.width + rng.uniform(size=len(idx)))*info.resolution
+                                 + info.origin.position.x,
+                                 (idx / info.width + rng.uniform(size=len(idx)))*info.resolution
+                                 + info.origin.position.y))
+            nodes = np.vstack((nodes, P[checker.points_safe(P)]))[:num_nodes]
+        if len(nodes) == 0:
+            raise ValueError("Cannot build a roadmap: no free cell has enough clearance for the robot")
+        if len(nodes) < num_nodes:
+            rospy.logwarn("Only %d of the %d roadmap nodes could be placed in the free space. "
+                          "The smaller roadmap is cached and reused for this map.", len(nodes), num_nodes)
+
+        pairs = np.array(sorted(sp.spatial.cKDTree(nodes).query_pairs(radius)),
+                         dtype=np.int64).reshape(-1, 2)
+        safe = np.zeros(len(pairs), dtype=bool)
+        batch = 1000
+        for k in xrange(0, len(pairs), batch):
+            safe[k:k+batch] = checker.segments_safe(nodes[pairs[k:k+batch,0]],
+                                                    nodes[pairs[k:k+batch,1]])
+        return Roadmap(nodes, pairs[safe], radius)
+
+    def save(self, filename):
+        tmp = filename + '.tmp'
+        f = open(tmp, 'wb')
+        np.savez(f, nodes=self.nodes, edges=self.edges, radius=self.radius)
+        f.close()
+        os.rename(tmp, filename) # so that a partially written roadmap is never loaded
+
+    @staticmethod
+    def load(filename):
+        with np.load(filename) as data:
+            return Roadmap(data['nodes'], data['edges'], float(data['radius']))
+
+    def radius_neighbors(self, p, r):
+        """
+        Indices of the nodes within distance r of p.
+        """
+        return self._kdtree.query_ball_point(p, r)
+
+    def tree(self, root, links, max_nodes, eta, belief_seq=-1):
+        """
+        Expands the roadmap into the shortest-path tree from root, which is linked
+        to the nodes in links. The tree is limited to the max_nodes nodes that are
+        closest to the root. Vertices are added in order of path length, so parents
+        always come before their children. The weights, entropies and costs of the
+        tree still have to be scored.
+        """
+        tree = RRTStarTree(root, 0.0, eta, belief_seq)
+        dist = {}
+        heap = []
+        for i in links:
+            d = np.linalg.norm(self.nodes[i] - root)
+            heapq.heappush(heap, (d, i, 0))
+        vertex = {}
+        while len(heap) > 0 and len(tree.V) <= max_nodes:
+            (d, i, parent) = heapq.heappop(heap)
+            if vertex.has_key(i):
+                continue
+            idx = tree.add_vertex(self.nodes[i], parent, float('Inf'), 0, 0.0, d)
+            vertex[i] = idx
+            for (j, length) in self._adjacency[i]:
+                if not vertex.has_key(j) and d + length < dist.get(j, float('Inf')):
+                    dist[j] = d + length
+                    heapq.heappush(heap, (d + length, j, idx))
+        return tree
+
+
+def map_hash(navmap, *params):
+    """
+    Hash of the map data and geometry, and of any extra parameter that the
+    roadmap depends on.
+    """
+    h = hashlib.sha1()
+    info = navmap.info
+    h.update(repr((info.width, info.height, info.resolution,
+                   info.origin.position.x, info.origin.position.y) + tuple(params)))
+    h.update(np.asarray(navmap.data, dtype=np.int8).tostring())
+    return h.hexdigest()
+
+
+def load_or_build(navmap, checker, freecells, num_nodes, radius, cache_dir=None):
+    """
+    Loads the roadmap of navmap from cache_dir, or builds it and saves it there
+    if it does not exist yet. Returns (roadmap, loaded). The default cache_dir
+    is next to the map cache, under ROS_HOME.
+    Raises ValueError if the map has no room for the robot.
+    """
+    if cache_dir is None:
+        cache_dir = map_cache.default_cache_dir('roadmaps')
+    key = map_hash(navmap, checker.min_clearance, num_nodes, radius)
+    filename = os.path.join(cache_dir, 'roadmap_' + key + '.npz')
+    if os.path.exists(filename):
+        return (Roadmap.load(filename), True)
+    roadmap = Roadmap.build(checker, navmap.info, freecells, num_nodes, radius)
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+    roadmap.save(filename)
+    return (roadmap, False)
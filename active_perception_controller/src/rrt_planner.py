@@ -0,0 +1,920 @@
+"""
+Entropy-driven RRT* motion planner, shared by the motion planner nodes.
+
+The nodes only differ in how they receive the person particles (a ROS topic or
+SAM, with or without splitting the belief between cooperating robots) and in a
+few defaults. Everything else lives here: the map and collision checking, the
+utility function, the RRT* iterations and tree reuse, the roadmap, ensemble and
+anytime modes, the samplers and the detection heatmap.
+"""
+
+from math import atan2, cos, log, pi, sin, sqrt
+import os
+import threading
+import time
+
+import numpy as np
+import rospy
+import roslib
+from geometry_msgs.msg import Point32
+from geometry_msgs.msg import PoseStamped
+from geometry_msgs.msg import PoseWithCovariance
+from geometry_msgs.msg import PoseWithCovarianceStamped
+from nav_msgs.msg import OccupancyGrid
+from nav_msgs.msg import Path
+from nav_msgs.srv import GetMap
+from sensor_msgs.msg import PointCloud, ChannelFloat32
+from active_perception_controller.srv import ActivePerceptionPlan, ActivePerceptionPlanResponse
+from active_perception_controller import ap_utility
+
+from spatial_index import GridNeighbors
+from rrt_tree import RRTStarTree
+from particle_field import ParticleDistanceField, BeliefBins
+from collision import SegmentChecker
+import particle_cloud
+import roadmap
+import ensemble
+import sampling
+import heatmap
+import map_cache
+
+
+class RRTStarPlanner(object):
+    """
+    Plans the path of the robot that minimizes the expected entropy of the
+    person belief, on request of the plan service. Subclasses subscribe to the
+    particles once this constructor returns, and pass every particle set to
+    set_particles.
+    """
+    def __init__(self, robot_radius, sigma_person, sampling_strategy):
+        self._lock = threading.Lock()
+        self._lock.acquire()
+
+        self._robot_pose = PoseWithCovariance()
+
+        getmap = rospy.ServiceProxy('static_map', GetMap)
+
+        srv_available = False
+        while not srv_available:
+            try:
+                rospy.wait_for_service('static_map',2.0)
+                srv_available = True
+            except rospy.exceptions.ROSException as e:
+                rospy.logwarn(e.message)
+
+        self._navmap = getmap().map
+        width = self._navmap.info.width
+        height = self._navmap.info.height
+        # The free cells and distance transform of the map are shared with the other nodes
+        map_artifacts = map_cache.MapArtifacts(self._navmap)
+        self._freecells = map_artifacts.free_cells()
+        vol_freecells = len(self._freecells)*self._navmap.info.resolution**2
+        self._gamma_rrg = 2*sqrt(1.5*vol_freecells/pi)
+
+        self._rrt_eta = rospy.get_param("~rrt_eta", 1.0) # Notation from Karaman & Frazolli, 2011
+        self._rrt_dist_bias = rospy.get_param("~rrt_total_dist_bias", 0.01)
+        self._rrt_near_bias = rospy.get_param("~rrt_nearest_part_bias", 0.1)
+        self._rrt_entropy_bias = rospy.get_param("~rrt_entropy_bias", 10)
+        self._robot_radius_px = robot_radius / self._navmap.info.resolution
+        self._max_path_size = rospy.get_param("~max_path_size", 10)
+        self._max_rrt_iterations = rospy.get_param("~max_rrt_iterations", 200)
+        self._planning_time = rospy.get_param("~planning_time", 0.0) # wall-clock budget of a plan in seconds, 0 for none
+        self._anytime = rospy.get_param("~anytime_planning", False) # keep growing the tree between plan requests
+        self._reuse_tree = rospy.get_param("~reuse_tree", True) # re-root the previous tree instead of starting over
+        # When a reused tree is rescored, only the vertices that can see a cell of rescore_cell_size
+        # meters whose share of the belief changed by more than rescore_tolerance are evaluated again.
+        # 0 evaluates every vertex that can see any change of the belief
+        self._rescore_cell_size = rospy.get_param("~rescore_cell_size", 0.5)
+        self._rescore_tolerance = rospy.get_param("~rescore_tolerance", 0.01)
+
+        self._distmap = np.flipud(map_artifacts.distance())
+        self._segment_checker = SegmentChecker(self._navmap.info, self._distmap, self._robot_radius_px,
+                                               free=np.flipud(map_artifacts.clearance(self._robot_radius_px)))
+        self._roadmap = None
+        if rospy.get_param("~use_roadmap", False):
+            cache_dir = os.path.expanduser(rospy.get_param("~roadmap_cache_dir",
+                                                           map_cache.default_cache_dir('roadmaps')))
+            try:
+                (self._roadmap, loaded) = roadmap.load_or_build(self._navmap, self._segment_checker,
+                                                                self._freecells,
+                                                                rospy.get_param("~roadmap_nodes", 2000),
+                                                                self._rrt_eta, cache_dir)
+                rospy.loginfo("%s roadmap with %d nodes and %d edges", "Loaded" if loaded else "Built",
+                              len(self._roadmap.nodes), len(self._roadmap.edges))
+            except ValueError as e:
+                rospy.logerr("%s. Planning with RRT* instead.", e)
+
+        pkgpath = roslib.packages.get_pkg_dir('active_perception_controller')
+        utility_args = (str(pkgpath) + "/config/sensormodel.png", 0.050000, sigma_person)
+        self.utility_function = ap_utility.Utility(*utility_args)
+        # Evaluations of poses in the same cell of entropy_cache_resolution meters and
+        # entropy_cache_yaw_resolution radians, with the same prior, are only done once.
+        # 0 only reuses evaluations of the exact same position or yaw
+        self._entropy_cache = (rospy.get_param("~entropy_cache_size", 10000),
+                               rospy.get_param("~entropy_cache_resolution", 0.0),
+                               rospy.get_param("~entropy_cache_yaw_resolution", 0.0))
+        self.utility_function.setEntropyCache(*self._entropy_cache)
+        # The RFID antenna is directional: every point is evaluated at yaw_samples headings, and
+        # the best one is kept. The sensor model is precomputed rotated to sensor_yaw_bins yaws,
+        # so that a heading costs the same as a point
+        self._yaw_samples = max(1, rospy.get_param("~yaw_samples", 1))
+        self._sensor_yaw_bins = rospy.get_param("~sensor_yaw_bins", 72 if self._yaw_samples > 1 else 0)
+        self.utility_function.setSensorYawBins(self._sensor_yaw_bins)
+        # Poses that cannot detect the person with probability screening_min_detection, according
+        # to a coarse bound over bins of screening_bin_size meters, are not evaluated in full.
+        # 0 evaluates every pose
+        self._screening = (rospy.get_param("~screening_bin_size", 0.5),
+                           rospy.get_param("~screening_min_detection", 0.0))
+        self.utility_function.setScreening(*self._screening)
+        # Every evaluation stores its posterior weights. The ones that no tree vertex uses are
+        # dropped once there are more than max_stored_weights sets, and twice as many as after
+        # the previous compaction
+        self._max_stored_weights = rospy.get_param("~max_stored_weights", 10000)
+        self._num_compacted_weights = 0
+        self.current_weights = np.zeros(0)
+        self.current_particles = np.zeros((0, 2))
+        # RRT* sampling: "particles" (weighted by the belief), "free" (uniform over the free
+        # space), "mixed" (from the particles with probability sampling_particle_ratio) or
+        # "heatmap" (weighted by the expected information gain of the detection heatmap)
+        self._free_sampler = sampling.PointSampler.from_cells(self._navmap.info, self._freecells)
+        self._particle_sampler = None # built for every particle cloud
+        self._mixed_sampler = None
+        if sampling_strategy == "mixed":
+            ratio = rospy.get_param("~sampling_particle_ratio", 0.5)
+            self._mixed_sampler = sampling.MixedSampler([self.sample_from_particles, self.sample_free_uniform],
+                                                        [ratio, 1.0 - ratio])
+            self._sample_fn = self._mixed_sampler.sample
+        elif sampling_strategy == "free":
+            self._sample_fn = self.sample_free_uniform
+        elif sampling_strategy == "heatmap":
+            self._sample_fn = self.sample_from_heatmap
+        else:
+            if sampling_strategy != "particles":
+                rospy.logerr("Unknown sampling strategy '%s'. Sampling from the particles.", sampling_strategy)
+            self._sample_fn = self.sample_from_particles
+        # Heatmap of the expected detection from every cell of the map, at heatmap_yaw, computed
+        # with FFTs for every particle cloud and published. When RRT* finds no informative point,
+        # the tree takes a step towards the most informative cells of the heatmap
+        self._heatmap_filter = None
+        self._heatmap = None
+        self._heatmap_sampler = None
+        if sampling_strategy == "heatmap" or rospy.get_param("~detection_heatmap", False):
+            heatmap_resolution = rospy.get_param("~heatmap_resolution", 0.2)
+            kernel = self.utility_function.getSensorKernel(rospy.get_param("~heatmap_yaw", 0.0), heatmap_resolution)
+            self._heatmap_filter = heatmap.HeatmapFilter(self._navmap.info, kernel, heatmap_resolution,
+                                                         self._freecells)
+            self._heatmap_fallback_points = rospy.get_param("~heatmap_fallback_points", 10)
+        self._tree = None # tree kept between plans
+        self._belief_seq = 0 # incremented on every particle cloud
+        self._particle_field = ParticleDistanceField([], [])
+        self._belief_bins = BeliefBins([], [], [], self._rescore_cell_size)
+        # The ensemble workers are forked from the planner, so the state they use must be complete
+        # by now, and the planner must not have started any thread of its own yet: the threads of
+        # the utility function and of the ROS connections below are only started after the fork
+        self._ensemble = None
+        ensemble_size = rospy.get_param("~ensemble_size", 1) # number of trees grown in parallel for every plan
+        if ensemble_size > 1:
+            self._ensemble = ensemble.EnsemblePool(self, ensemble_size,
+                                                   rospy.get_param("~ensemble_max_particles", 20000),
+                                                   utility_args)
+            rospy.on_shutdown(self._ensemble.close)
+        self.utility_function.setNumThreads(rospy.get_param("~utility_threads", 0)) # 0 for one per core
+
+        self._robot_pose_sub = rospy.Subscriber("amcl_pose",
+                                                PoseWithCovarianceStamped,
+                                                self.robot_pose_cb,
+                                                queue_size=1)
+
+        self._rrt_pub = rospy.Publisher("rrt",
+                                         Path,
+                                         queue_size=1,
+                                         latch = True)
+
+        self._path_pub = rospy.Publisher("best_path",
+                                         Path,
+                                         queue_size=1,
+                                         latch = True)
+
+        self._entropy_pub = rospy.Publisher("entropy_points",
+                                         PointCloud,
+                                         queue_size=1,
+                                         latch = True)
+
+        if self._heatmap_filter is not None:
+            self._heatmap_pub = rospy.Publisher("detection_heatmap",
+                                                OccupancyGrid,
+                                                queue_size=1,
+                                                latch = True)
+        self._plan_srv = rospy.Service('plan', ActivePerceptionPlan, self._plan_srv_cb)
+        if self._anytime:
+            self._planning_thread = threading.Thread(target=self.planning_loop)
+            self._planning_thread.daemon = True
+            self._planning_thread.start()
+        self._lock.release()
+
+    def robot_pose_cb(self, msg):
+        self._robot_pose = msg.pose
+
+    def target_particle_cloud_cb(self, msg):
+        """
+        Callback of a particle cloud subscribed as raw data, so that the particles
+        are unpacked straight into arrays.
+        """
+        (x, y, weights) = particle_cloud.cloud_from_buffer(msg._buff)
+        belief = self.prepare_particles(x, y, weights)
+        self._lock.acquire()
+        self.set_particles(x, y, weights, belief)
+        self._lock.release()
+        self.publish_heatmap(belief)
+
+    def prepare_particles(self, x, y, weights):
+        """
+        Distance field, sampler, detection heatmap and belief bins of a particle set.
+        They only depend on the particles, so they can be built without holding the lock.
+        """
+        P = np.column_stack((x, y))
+        field = ParticleDistanceField(x, y)
+        sampler = sampling.PointSampler(P, weights) if len(P) > 0 else None
+        (detection_heatmap, heatmap_sampler) = self.build_heatmap(x, y, weights)
+        bins = BeliefBins(x, y, weights, self._rescore_cell_size)
+        return (field, sampler, detection_heatmap, heatmap_sampler, bins)
+
+    def set_particles(self, x, y, weights, belief):
+        """
+        Makes x, y, weights the current particle set, with belief as returned by
+        prepare_particles for it. Must be called with the lock held.
+        """
+        self.utility_function.setParticles(x, y, weights)
+        if self._ensemble is not None:
+            self._ensemble.set_particles(x, y, weights)
+        self.current_weights = weights
+        self.current_particles = np.column_stack((x, y))
+        (self._particle_field, self._particle_sampler, self._heatmap, self._heatmap_sampler,
+         self._belief_bins) = belief
+        self._belief_seq += 1
+
+    def publish_heatmap(self, belief):
+        detection_heatmap = belief[2]
+        if detection_heatmap is not None:
+            self._heatmap_pub.publish(detection_heatmap.to_msg())
+
+    def _plan_srv_cb(self, msg):
+        path = self.plan()
+        res = ActivePerceptionPlanResponse()
+        res.path = path
+        return res
+
+    def plan(self):
+        self._lock.acquire()
+        if self._roadmap is not None:
+            path = self.roadmap_plan()
+        elif self._ensemble is not None and self._ensemble.ready:
+            path = self.ensemble_plan()
+        elif self._anytime:
+            path = self.anytime_plan()
+        else:
+            path = self.rrtstar(self._sample_fn)
+        self._lock.release()
+        return path
+
+    def rrt(self):
+        """
+        Basic RRT Algorithm
+        """
+        probot = np.array([self._robot_pose.pose.position.x,self._robot_pose.pose.position.y])
+        V = [probot]
+        E = {}
+        nbrs = GridNeighbors(self._rrt_eta)
+        nbrs.insert(probot)
+        t1 = time.time()
+        rrt_iter = 0
+        while rrt_iter < self._max_rrt_iterations:
+            prand = self.sample_free_uniform()
+            (dist, idx) = nbrs.kneighbors(prand)
+            if dist < self._rrt_eta:
+                pnew = prand
+            else:
+                pnew = self.steer(V[idx], prand)
+            if self.segment_safe(V[idx],pnew) is True:
+                if E.has_key(idx):
+                    E[idx].append(len(V))
+                else:
+                    E[idx] = [len(V)]
+                V.append(pnew)
+                nbrs.insert(pnew)
+            rrt_iter += 1
+        print 'total time: ', time.time()-t1
+        self.publish_rrt(V,E)
+
+    def informative(self, tree):
+        """
+        Whether the entropies of the tree differ by more than the arithmetic noise,
+        so that some of its vertices are worth going to.
+        """
+        return tree.ent_max - tree.ent_min > 1e-6
+
+    def rewire_changes_entropy(self, entropy_near, entropy_new):
+        """
+        Whether a vertex rewired below a new vertex with entropy entropy_new must
+        be evaluated again, rather than keeping its entropy entropy_near.
+        """
+        return np.abs(entropy_near - entropy_new) > 1e-6
+
+    def new_tree(self):
+        """
+        Creates an RRT* tree rooted at the robot
+        """
+        probot = np.array([self._robot_pose.pose.position.x,self._robot_pose.pose.position.y])
+        (ent, post) = self.exp_entropy([probot], [0])
+        return RRTStarTree(probot, ent[0], self._rrt_eta, self._belief_seq, self._belief_bins)
+
+    def current_tree(self):
+        """
+        Returns the tree kept from the previous plans, re-rooted at the robot. A new
+        tree is started if there is none, or if the robot cannot be linked to it.
+        """
+        tree = None
+        if self._tree is not None and self._reuse_tree:
+            tree = self.reroot_tree(self._tree)
+        if tree is None:
+            tree = self.new_tree()
+        self._tree = tree
+        return tree
+
+    def reroot_tree(self, tree):
+        """
+        Re-roots the tree at the robot, keeping the subtree of the vertex closest
+        to it and pruning the branches that are no longer reachable. Returns None
+        if that vertex is too far from the robot, or not in line of sight.
+        """
+        probot = np.array([self._robot_pose.pose.position.x,self._robot_pose.pose.position.y])
+        (dist, idx) = tree.nbrs.kneighbors(probot)
+        if dist > self._rrt_eta or not self.segment_safe(probot, tree.V[idx]):
+            return None
+        tree = tree.reroot(probot, idx)
+        self.rescore_tree(tree)
+        return tree
+
+    def rescore_tree(self, tree):
+        """
+        Recomputes the root entropy, distances and costs of a re-rooted tree.
+
+        If the particles have changed since the tree was scored, the weight ids of
+        the tree are stale. The vertices that can see a cell where the belief has
+        changed by more than rescore_tolerance, since their entropy was computed,
+        are evaluated again, one tree level at a time. The other vertices that can
+        see a particle keep their entropy, and their weights are left pending
+        until a child needs them as prior (see vertex_weights). The vertices that
+        cannot see any particle inherit the entropy and weights of their parents.
+        """
+        self.compact_weights(tree)
+        V = tree.V
+        parents = tree.parents
+        particle_dist = self._particle_field.distances(V)
+        # The root is a new pose, with the current belief as prior
+        (ent, post) = self.exp_entropy([V[0]], [0])
+        tree.Ent[0] = ent[0]
+        tree.W[0] = 0
+        tree.vertex_belief[0] = self._belief_bins
+        if tree.belief_seq != self._belief_seq:
+            max_range = self.utility_function.getMaximumSensorRange()
+            stale = self.stale_vertices(tree, max_range)
+            tree.belief = self._belief_bins
+            tree.belief_seq = self._belief_seq
+            depth = tree.depth
+            levels = {}
+            for i in xrange(1, len(V)):
+                if levels.has_key(depth[i]):
+                    levels[depth[i]].append(i)
+                else:
+                    levels[depth[i]] = [i]
+            for d in sorted(levels.keys()):
+                visible = []
+                for i in levels[d]:
+                    if d == float('Inf'): # cut off from the root by a cycle, see RRTStarTree.rewire
+                        tree.W[i] = 0
+                    elif particle_dist[i] >= max_range:
+                        tree.Ent[i] = tree.Ent[parents[i]]
+                        tree.W[i] = tree.W[parents[i]]
+                        tree.vertex_belief[i] = tree.belief
+                    elif stale[i]:
+                        visible.append(i)
+                    else:
+                        tree.W[i] = None
+                if len(visible) > 0:
+                    priors = [self.vertex_weights(tree, parents[i]) for i in visible]
+                    (ent, post) = self.exp_entropy([V[i] for i in visible], priors)
+                    for k in xrange(len(visible)):
+                        i = visible[k]
+                        tree.W[i] = priors[k]
+                        tree.vertex_belief[i] = tree.belief
+                        if ent[k] != 0: # otherwise the utility function failed
+                            tree.Ent[i] = ent[k]
+                            tree.W[i] = post[k]
+                        else:
+                            tree.Ent[i] = tree.Ent[parents[i]]
+
+        for i in xrange(1, len(V)):
+            p_idx = parents[i]
+            tree.Dist[i] = tree.Dist[p_idx] + np.linalg.norm(V[i] - V[p_idx])
+            tree.C[i] = (self._rrt_near_bias*particle_dist[i] +
+                         self._rrt_dist_bias * tree.Dist[i] +
+                         self._rrt_entropy_bias * tree.Ent[i])
+        tree.update_scores()
+        tree.informative_point_found = self.informative(tree)
+
+    def stale_vertices(self, tree, max_range):
+        """
+        Whether each vertex of the tree can see a cell where the belief has changed
+        by more than rescore_tolerance since its entropy was computed.
+        """
+        stale = np.zeros(len(tree.V), dtype=bool)
+        groups = {}
+        for (i, bins) in enumerate(tree.vertex_belief):
+            groups.setdefault(id(bins), (bins, []))[1].append(i)
+        for (bins, idx) in groups.values():
+            if bins is None:
+                stale[idx] = True
+            else:
+                stale[idx] = self._belief_bins.changed_near(bins, [tree.V[i] for i in idx],
+                                                            max_range, self._rescore_tolerance)
+        return stale
+
+    def vertex_weights(self, tree, idx):
+        """
+        Id of the posterior weights of vertex idx. If rescore_tree left them
+        pending, they are computed first, along with those of its pending
+        ancestors, from the current belief. The entropies are kept.
+        """
+        pending = []
+        i = idx
+        while tree.W[i] is None:
+            pending.append(i)
+            i = tree.parents[i]
+        if len(pending) > 0:
+            max_range = self.utility_function.getMaximumSensorRange()
+            for i in reversed(pending):
+                tree.W[i] = tree.W[tree.parents[i]]
+                if self._particle_field.distance(tree.V[i]) < max_range:
+                    (ent, post) = self.exp_entropy([tree.V[i]], [tree.W[i]])
+                    if ent[0] != 0: # otherwise the utility function failed
+                        tree.W[i] = post[0]
+        return tree.W[idx]
+
+    def rrtstar(self, sample_fn):
+        """
+        RRT* Algorithm
+        """
+        tree = self.current_tree()
+        self.grow_tree(tree, sample_fn, self._planning_time)
+        return self.publish_plan(tree)
+
+    def anytime_plan(self):
+        """
+        Returns the best path of the tree grown in the background. The tree is only
+        grown here, for at most planning_time seconds, if it has not found an
+        informative point yet. Unless it is reused, it is discarded afterwards, so
+        that the next one is rooted at the new robot pose.
+        """
+        tree = self._tree
+        if tree is None or tree.belief_seq != self._belief_seq:
+            tree = self.current_tree()
+        if not tree.informative_point_found:
+            self.grow_tree(tree, self._sample_fn, self._planning_time)
+        if not self._reuse_tree:
+            self._tree = None
+        return self.publish_plan(tree)
+
+    def roadmap_plan(self):
+        """
+        Plans over the precomputed roadmap. Linking the robot to the nearby roadmap
+        nodes is the only collision check left. The roadmap is then expanded from
+        the robot into a shortest-path tree, which is scored with the current belief.
+        """
+        probot = np.array([self._robot_pose.pose.position.x,self._robot_pose.pose.position.y])
+        near = self._roadmap.radius_neighbors(probot, self._roadmap.radius)
+        safe = self._segment_checker.segments_safe(self._roadmap.nodes[near], probot)
+        links = [near[k] for k in xrange(len(near)) if safe[k]]
+        if len(links) == 0:
+            rospy.logwarn("Could not link the robot to the roadmap. Planning with RRT* instead.")
+            return self.rrtstar(self._sample_fn)
+        tree = self._roadmap.tree(probot, links, self._max_rrt_iterations, self._rrt_eta)
+        self.rescore_tree(tree)
+        return self.publish_plan(tree)
+
+    def ensemble_plan(self):
+        """
+        Grows ensemble_size independent trees in parallel, with different seeds, and
+        returns the lowest-cost path among them.
+        """
+        probot = np.array([self._robot_pose.pose.position.x,self._robot_pose.pose.position.y])
+        trees = self._ensemble.grow_trees(probot)
+        costs = [tree.C[tree.best] for tree in trees]
+        rospy.logdebug("Ensemble costs: %s", costs)
+        return self.publish_plan(trees[int(np.argmin(costs))])
+
+    def planning_loop(self):
+        """
+        Grows the tree in the background, in anytime mode. The lock is released
+        after every iteration, so that particle updates and plan requests are not
+        delayed by more than one iteration. The tree is re-rooted at the robot
+        whenever the particles change.
+        """
+        while not rospy.is_shutdown():
+            self._lock.acquire()
+            grown = False
+            if len(self.current_particles) > 0:
+                if self._tree is None or self._tree.belief_seq != self._belief_seq:
+                    self.current_tree()
+                if not self._tree.done:
+                    self.rrtstar_iteration(self._tree, self._sample_fn)
+                    grown = True
+            self._lock.release()
+            if grown:
+                time.sleep(0) # let the waiting callbacks take the lock
+            else:
+                time.sleep(0.05)
+
+    def grow_tree(self, tree, sample_fn, time_budget):
+        """
+        Runs RRT* iterations until the tree is done, or until time_budget seconds
+        have elapsed. A budget of 0 means no time limit.
+        """
+        t1 = time.time()
+        while not tree.done:
+            if time_budget > 0 and time.time() - t1 > time_budget:
+                if not tree.informative_point_found:
+                    rospy.logwarn("Could not find an informative goal point in %.2f s.", time_budget)
+                break
+            self.rrtstar_iteration(tree, sample_fn)
+        if not tree.informative_point_found and self._heatmap is not None:
+            self.heatmap_fallback(tree)
+        rospy.logdebug("Grew the tree to %d vertices in %.3f s", len(tree.V), time.time()-t1)
+
+    def heatmap_fallback(self, tree):
+        """
+        Fallback for a tree without informative points: tries the most informative
+        cells of the detection heatmap, best first and at least rrt_eta apart, and
+        adds to the tree the first safe step from its nearest vertex towards one of
+        them. Returns whether a vertex was added.
+        """
+        for p in self._heatmap.best_points(self._heatmap_fallback_points, self._rrt_eta):
+            (dist, idx) = tree.nbrs.kneighbors(p)
+            pnew = p if dist < self._rrt_eta else self.steer(tree.V[idx], p)
+            if not self.segment_safe(tree.V[idx], pnew):
+                continue
+            (ent, post) = self.exp_entropy([pnew], [self.vertex_weights(tree, idx)])
+            if ent[0] == 0: # the utility function failed
+                continue
+            dist = np.linalg.norm(pnew - tree.V[idx])
+            c = (self._rrt_near_bias*self._particle_field.distance(pnew) +
+                 self._rrt_dist_bias * (tree.Dist[idx] + dist) +
+                 self._rrt_entropy_bias * ent[0])
+            tree.add_vertex(pnew, idx, c, post[0], ent[0], tree.Dist[idx] + dist)
+            tree.informative_point_found = self.informative(tree)
+            return True
+        rospy.logwarn("Could not link the detection heatmap to the tree.")
+        return False
+
+    def publish_plan(self, tree):
+        """
+        Builds the best path of the tree, which is only done once planning is over,
+        and publishes it along with the tree.
+        """
+        path = self.get_best_path(tree.parents, tree.V, tree.C)
+        self.publish_rrt(tree.V, tree.E)
+
+        self._path_pub.publish(path)
+
+        self.publish_entropy_info(tree.V, tree.Ent)
+        stats = self.utility_function.getEntropyCacheStats()
+        rospy.logdebug("Entropy cache: %d hits, %d misses (%.1f%%), %d entries",
+                       stats['hits'], stats['misses'], 100*stats['hit_rate'], stats['size'])
+        rospy.logdebug("Screening: %d poses discarded", self.utility_function.getNumScreened())
+        return path
+
+    def rrtstar_iteration(self, tree, sample_fn):
+        """
+        One RRT* iteration: samples a new point, connects it to the tree and
+        rewires its neighbourhood
+        """
+        self.compact_weights(tree)
+        V = tree.V
+        parents = tree.parents
+        W = tree.W
+        Ent = tree.Ent
+        Dist = tree.Dist
+        C = tree.C
+        nbrs = tree.nbrs
+        gamma_rrg = self._gamma_rrg
+        max_range = self.utility_function.getMaximumSensorRange()
+
+        """
+        Sampling new point
+        """
+        prand = sample_fn()
+        (dist, pnearest_idx) = nbrs.kneighbors(prand)
+        pnearest = V[pnearest_idx]
+
+        """
+        Turning new point into reachable point
+        """
+        if dist < self._rrt_eta:
+            pnew = prand
+        else:
+            pnew = self.steer(pnearest, prand)
+        """
+        Checking if segment is valid and updating graph
+        """
+        if self.segment_safe(V[pnearest_idx],pnew) is True:
+
+            r = np.min([gamma_rrg*sqrt(log(len(V))/float(len(V))),self._rrt_eta])
+            Pnear_idx = nbrs.radius_neighbors(pnew, r)
+            pmin_idx = pnearest_idx
+            w_post = self.vertex_weights(tree, pnearest_idx)
+            entropy = 0
+
+            # The distances to the particles from pnew and from its near vertices, in one query
+            particle_dist = self._particle_field.distances([pnew] + [V[p_idx] for p_idx in Pnear_idx])
+            dist_nearest_particle = particle_dist[0]
+            Particle_dist = dict(zip(Pnear_idx, particle_dist[1:]))
+
+            if dist_nearest_particle < max_range: #if at least one particle is visible
+                (ent, post) = self.exp_entropy([pnew], [w_post])
+                entropy = ent[0]
+                if entropy != 0:
+                    w_post = post[0]
+
+            if entropy == 0: # utility function failed or no particle is visible
+                entropy = Ent[pmin_idx]
+
+            dist = np.linalg.norm(pnearest-pnew)
+            cmin = (self._rrt_near_bias*dist_nearest_particle +
+                    self._rrt_dist_bias * (Dist[pnearest_idx] + dist) +
+                    self._rrt_entropy_bias * entropy)
+
+            Ent_near = dict([(p_idx, Ent[p_idx]) for p_idx in Pnear_idx])
+            # if there is anything to gain in terms of information
+            eval_idx = [p_idx for p_idx in Pnear_idx if np.abs(Ent[p_idx] - entropy) < 1e-6]
+            if len(eval_idx) > 0:
+                (ent, post) = self.exp_entropy([pnew]*len(eval_idx),
+                                               [self.vertex_weights(tree, p_idx) for p_idx in eval_idx])
+                Ent_near.update(zip(eval_idx, ent))
+
+            # The segments from the near vertices to pnew are checked once, for both
+            # the parent selection and the rewiring
+            Safe = dict(zip(Pnear_idx,
+                            self._segment_checker.segments_safe([V[p_idx] for p_idx in Pnear_idx], pnew)))
+
+            for p_idx in Pnear_idx:
+                p = V[p_idx]
+                entropy_near = Ent_near[p_idx]
+
+                dist_nearest_particle = Particle_dist[p_idx]
+
+                c = (self._rrt_near_bias*dist_nearest_particle +
+                     self._rrt_dist_bias * (Dist[p_idx] + np.linalg.norm(p-pnew)) +
+                     self._rrt_entropy_bias * entropy_near)
+                if Safe[p_idx] and c < cmin:
+                    cmin = c
+                    pmin_idx = p_idx
+
+            pnew_idx = tree.add_vertex(pnew, pmin_idx, cmin, w_post, entropy, Dist[pmin_idx] + dist)
+            """
+            Re-wire the tree
+            """
+            # Every rewiring candidate is evaluated at pnew with the weights of pnew,
+            # so the utility function only needs to be called once
+            rewire_entropy = None
+            rewire_weights = None
+            for p_idx in Pnear_idx:
+                if parents.has_key(p_idx):
+                    p = V[p_idx]
+                    if self.rewire_changes_entropy(Ent[p_idx], entropy): # if there is anything to gain in terms of information
+                        if rewire_entropy is None:
+                            (ent, post) = self.exp_entropy([pnew], [W[pnew_idx]])
+                            rewire_entropy = ent[0]
+                            rewire_weights = post[0]
+                        entropy_near = rewire_entropy
+                        w_near = rewire_weights
+                    else:
+                        entropy_near = Ent[p_idx]
+                        w_near = W[pnew_idx]
+                    dist = np.linalg.norm(p-pnew)
+                    dist_nearest_particle = Particle_dist[p_idx]
+
+                    c = (self._rrt_near_bias*dist_nearest_particle +
+                         self._rrt_dist_bias * (Dist[-1] + dist) +
+                         self._rrt_entropy_bias * entropy_near)
+                    if Safe[p_idx] and c < C[p_idx]:
+                        rospy.logdebug("Rewired %d to %d", p_idx, pnew_idx)
+                        tree.rewire(p_idx, pnew_idx, c, w_near, entropy_near, Dist[-1] + dist)
+        if self.informative(tree): # just to compensate arithmetic noise
+            tree.informative_point_found = True
+
+        # The best vertex and its depth are kept up to date by the tree, so the
+        # path itself is only built when the plan is published
+        if tree.informative_point_found and tree.best_path_size() > self._max_path_size:
+            tree.done = True
+
+        tree.iterations += 1
+
+        if tree.iterations > self._max_rrt_iterations:
+            tree.done = True
+            if not tree.informative_point_found:
+                rospy.logwarn("Could not find an informative goal point in %d iterations! Aborting.", self._max_rrt_iterations)
+
+    def compact_weights(self, tree):
+        """
+        Drops the stored weights that no live tree uses, if the store has grown
+        enough since the last time. The live trees are the given one and the tree
+        kept between plans, which the anytime thread may still be growing, and
+        their weight ids are renumbered. A tree scored with previous particles
+        holds no ids of the store, and is left as it is. Pending weights stay
+        pending.
+        """
+        num_weights = self.utility_function.getNumWeights()
+        if num_weights <= max(self._max_stored_weights, 2*self._num_compacted_weights):
+            return
+        trees = [tree]
+        if self._tree is not None and self._tree is not tree:
+            trees.append(self._tree)
+        trees = [t for t in trees if t.belief_seq == self._belief_seq]
+        live_ids = []
+        for t in trees:
+            live_ids.extend([w for w in t.W if w is not None])
+        new_ids = iter(self.utility_function.compactWeights(np.asarray(live_ids, dtype=np.int64)).tolist())
+        for t in trees:
+            t.W[:] = [None if w is None else new_ids.next() for w in t.W]
+        self._num_compacted_weights = self.utility_function.getNumWeights()
+        rospy.logdebug("Compacted the weight store from %d to %d sets", num_weights, self._num_compacted_weights)
+
+    def exp_entropy(self, points, weight_ids):
+        """
+        Expected entropy after taking a measurement from each of the points, using
+        the stored weights weight_ids as prior. Returns the entropies and the ids
+        of the posterior weights, evaluated in a single call to the utility function.
+        With yaw_samples > 1, every point takes its best heading.
+        """
+        P = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        ids = np.asarray(weight_ids, dtype=np.int64)
+        if self._yaw_samples == 1:
+            return self.utility_function.computeExpEntropyBatch(P[:,0], P[:,1], np.zeros(len(P)), ids)
+
+        # All the headings of all the points in one call, keeping the best heading of every point
+        K = self._yaw_samples
+        yaws = np.arange(K)*(2*pi/K)
+        (ent, post) = self.utility_function.computeExpEntropyBatch(np.repeat(P[:,0], K), np.repeat(P[:,1], K),
+                                                                   np.tile(yaws, len(P)), np.repeat(ids, K))
+        ent = np.asarray(ent).reshape(-1, K)
+        post = np.asarray(post).reshape(-1, K)
+        best = np.argmin(ent, axis=1)
+        rows = np.arange(len(P))
+        return (ent[rows, best], post[rows, best])
+
+    def publish_rrt(self, V,E):
+        pt = Path()
+        pt.header.frame_id = '/map'
+        path = []
+        vis = set()
+        self.gen_path(0, 0, V, E, path, vis)
+        for p in path:
+            pose = PoseStamped()
+            pose.header.frame_id = '/map'
+            pose.pose.position.x = p[0]
+            pose.pose.position.y = p[1]
+            pt.poses.append(pose)
+            last_pose = pose
+        self._rrt_pub.publish(pt)
+
+    def get_best_path(self, parents, V, C):
+        pt = Path()
+        pt.header.frame_id = '/map'
+        m = np.argmin(C)
+        at_root = False
+        c = 0
+
+        last_pose = PoseStamped()
+
+        while not at_root and c < len(C):
+            pose = PoseStamped()
+            pose.header.frame_id = '/map'
+            # pose.header.seq = c
+            pose.header.stamp = rospy.Time.now()
+            p = V[m]
+            pose.pose.position.x = p[0]
+            pose.pose.position.y = p[1]
+            th = atan2(pose.pose.position.y - last_pose.pose.position.y,
+                       pose.pose.position.x - last_pose.pose.position.x)
+            pose.pose.orientation.x = 0
+            pose.pose.orientation.y = 0
+            pose.pose.orientation.z = 0 #sin(th/2.0) #0
+            pose.pose.orientation.w = 1 #cos(th/2.0) #1
+            pt.poses.append(pose)
+
+            if m == 0:
+                at_root = True
+            else:
+                m = parents[m]
+            c += 1
+        if not at_root:
+            rospy.logerr("Could not find RRT root! Exiting at node %d",m)
+            #pdb.set_trace()
+
+        pt.poses.reverse() # fundamental, since poses were added from the end to the beginning
+        return pt
+
+    def publish_entropy_info(self, V, Ent):
+        pc = PointCloud()
+        ch = ChannelFloat32()
+        ch.name = 'weights'
+        ch.values = Ent
+        for v in V:
+            g = Point32()
+            g.x = v[0]
+            g.y = v[1]
+            pc.points.append(g)
+        pc.channels.append(ch)
+        pc.header.frame_id = "/map"
+        self._entropy_pub.publish(pc)
+
+    def gen_path(self, ix, p_ix, V, E, path, vis ):
+        path.append(V[ix])
+        vis.add(ix)
+        if E.has_key(ix):
+            for c in E[ix]:
+                if c not in vis:
+                    self.gen_path(c, ix, V, E, path, vis )
+        path.append(V[p_ix])
+
+    def steer(self, org, dst):
+        alpha = atan2(dst[1]-org[1],
+                      dst[0]-org[0])
+        new = org + self._rrt_eta*np.array([cos(alpha),sin(alpha)])
+        return new
+
+    def segment_safe(self, org, dst):
+        return self._segment_checker.segment_safe(org, dst)
+
+    def directed_search(self, org_idx, dst_idx):
+        alpha = atan2(dst_idx[1]-org_idx[1],
+                      dst_idx[0]-org_idx[0])
+        ca = cos(alpha)
+        sa = sin(alpha)
+        idx = org_idx
+        ridx = idx
+        while not np.all(ridx == dst_idx):
+            idx = idx + np.array([ca, sa])
+            ridx = np.floor(idx)
+            linear_idx = int(((self._navmap.info.height-ridx[1]-1)*self._navmap.info.width
+                              + ridx[0]))
+            if self._navmap.data[linear_idx] != 0:
+                return False
+        return True
+
+    def greedy_cardinal_search(self, org_idx, dst_idx, prev_idx = None):
+        if np.all(org_idx == dst_idx):
+            return True
+
+        dir = np.mat('1 0; -1 0; 0 1; 0 -1; 1 1; -1 -1; 1 -1; -1 1')
+
+        next = org_idx + dir
+        norms = np.linalg.norm(next - dst_idx, 2, 1)
+        best_idx = np.asarray(next[np.argmin(norms),:]).flatten(1)
+        best_linear_idx = ((self._navmap.info.height-best_idx[1]-1)*self._navmap.info.width
+                           + best_idx[0])
+        if self._navmap.data[best_linear_idx] == 0:
+            return self.greedy_cardinal_search(best_idx, dst_idx, org_idx)
+        else:
+            return False
+
+    def sample_free_uniform(self):
+        return self._free_sampler.sample()
+
+    def sample_from_particles(self):
+        return self._particle_sampler.sample()
+
+    def sample_from_heatmap(self):
+        if self._heatmap_sampler is None: # no informative cell
+            return self.sample_from_particles()
+        return self._heatmap_sampler.sample()
+
+    def build_heatmap(self, x, y, weights):
+        """
+        Detection heatmap of a particle set and its sampler, (None, None) if the
+        heatmap is disabled.
+        """
+        if self._heatmap_filter is None:
+            return (None, None)
+        detection_heatmap = self._heatmap_filter.heatmap(x, y, weights)
+        return (detection_heatmap, detection_heatmap.sampler())
+
+    def reset_samplers(self):
+        """
+        Discards the points drawn in advance by the samplers. Must be called after
+        reseeding np.random, so that the next points depend on the new seed.
+        """
+        for sampler in [self._free_sampler, self._particle_sampler, self._mixed_sampler,
+                        self._heatmap_sampler]:
+            if sampler is not None:
+                sampler.reset()
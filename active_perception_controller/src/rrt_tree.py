@@ -0,0 +1,162 @@
+"""
+State of an RRT* tree, kept by the motion planners between iterations so that
+the tree can be grown incrementally: within a time budget, in the background
+between plan requests, or across consecutive plans.
+"""
+
+import numpy as np
+
+from spatial_index import GridNeighbors
+
+
+class RRTStarTree(object):
+    """
+    Vertices, edges and per-vertex data of an RRT* tree rooted at the robot.
+    The lists are indexed by vertex, in insertion order.
+    """
+    def __init__(self, root, root_entropy, eta, belief_seq=0, belief=None):
+        self.V = [root]
+        self.E = {}
+        self.parents = {}
+        self.W = [0] # ids of the weights stored in the utility function. 0 is the current belief
+        self.Ent = [root_entropy]
+        self.belief = belief # binned particle set that new entropies are computed for
+        self.vertex_belief = [belief] # binned particle set that the entropy of each vertex was computed for
+        self.Dist = [0.0]
+        self.C = [float('Inf')]
+        self.eta = eta
+        self.nbrs = GridNeighbors(eta)
+        self.nbrs.insert(root)
+        self.depth = [0]
+
+        # Tracked as the tree grows, so that the best path only has to be built once
+        self.best = 0 # vertex with the lowest cost
+        self.ent_min = root_entropy
+        self.ent_max = root_entropy
+
+        self.belief_seq = belief_seq # particle cloud that the entropies were computed for
+        self.informative_point_found = False
+        self.done = False
+        self.iterations = 0
+
+    def add_vertex(self, p, parent, cost, weights, entropy, dist):
+        """
+        Appends p as a child of parent, and returns its index.
+        """
+        idx = len(self.V)
+        if self.E.has_key(parent):
+            self.E[parent].add(idx)
+        else:
+            self.E[parent] = set([idx])
+        self.parents[idx] = parent
+        self.V.append(p)
+        self.nbrs.insert(p)
+        self.C.append(cost)
+        self.W.append(weights)
+        self.Ent.append(entropy)
+        self.vertex_belief.append(self.belief)
+        self.Dist.append(dist)
+        self.depth.append(self.depth[parent] + 1)
+        self._update_best(idx)
+        return idx
+
+    def rewire(self, idx, parent, cost, weights, entropy, dist):
+        """
+        Moves vertex idx under parent, with its new cost, weights, entropy and
+        distance. The depths of its subtree are updated accordingly.
+        """
+        self.E[self.parents[idx]].remove(idx)
+        self.parents[idx] = parent
+        if self.E.has_key(parent):
+            self.E[parent].add(idx)
+        else:
+            self.E[parent] = set([idx])
+        self.C[idx] = cost
+        self.W[idx] = weights
+        self.Ent[idx] = entropy
+        self.vertex_belief[idx] = self.belief
+        self.Dist[idx] = dist
+        self._update_depths(idx)
+        self._update_best(idx)
+
+    def _update_depths(self, idx):
+        # The costs are not additive along paths, so rewiring can hang a vertex
+        # below its own subtree. The vertices of such a cycle have no path to the
+        # root, and their depth is infinite
+        order = self.subtree(idx)
+        if self.parents[idx] in order:
+            for i in order:
+                self.depth[i] = float('Inf')
+        else:
+            for i in order:
+                self.depth[i] = self.depth[self.parents[i]] + 1
+
+    def _update_best(self, idx):
+        # Costs only decrease on rewiring, so the minimum can be kept incrementally.
+        # Ties go to the lowest index, as with np.argmin
+        c = self.C[idx]
+        if c < self.C[self.best] or (c == self.C[self.best] and idx < self.best):
+            self.best = idx
+        self.ent_min = min(self.ent_min, self.Ent[idx])
+        self.ent_max = max(self.ent_max, self.Ent[idx])
+
+    def update_scores(self):
+        """
+        Recomputes the best vertex and the entropy range after the costs and
+        entropies have been changed in bulk.
+        """
+        self.best = int(np.argmin(self.C))
+        self.ent_min = min(self.Ent)
+        self.ent_max = max(self.Ent)
+
+    def best_path_size(self):
+        """
+        Number of poses of the path from the best vertex to the root. If that
+        vertex is cut off from the root by a cycle, the path is walked until it
+        has as many poses as the tree has vertices.
+        """
+        return min(self.depth[self.best] + 1, len(self.V))
+
+    def subtree(self, idx):
+        """
+        Returns the vertices of the subtree of idx, in breadth-first order.
+        Rewiring can close cycles in the tree, so every vertex is only visited once.
+        """
+        order = [idx]
+        visited = set(order)
+        k = 0
+        while k < len(order):
+            if self.E.has_key(order[k]):
+                for i in sorted(self.E[order[k]]):
+                    if i not in visited:
+                        visited.add(i)
+                        order.append(i)
+            k += 1
+        return order
+
+    def reroot(self, root, keep_idx):
+        """
+        Returns a new tree rooted at root, with the subtree of vertex keep_idx
+        linked to it. All the other branches are pruned. The vertices are
+        re-indexed in breadth-first order, so parents always come before their
+        children. Weights and entropies are copied as they are. The root has the
+        current belief as weights, like a new tree, but its entropy, and the
+        distances and costs, must be recomputed by the planner.
+        """
+        tree = RRTStarTree(root, 0.0, self.eta, self.belief_seq, self.belief)
+        tree.vertex_belief[0] = None
+        order = self.subtree(keep_idx)
+        new_idx = {}
+        if np.linalg.norm(root - self.V[keep_idx]) < 1e-6:
+            # The robot has not moved. keep_idx becomes the root itself
+            new_idx[keep_idx] = 0
+            order = order[1:]
+        for i in order:
+            if i == keep_idx:
+                parent = 0
+            else:
+                parent = new_idx[self.parents[i]]
+            new_idx[i] = tree.add_vertex(self.V[i], parent, float('Inf'),
+                                         self.W[i], self.Ent[i], 0.0)
+            tree.vertex_belief[new_idx[i]] = self.vertex_belief[i]
+        return tree
@@ -0,0 +1,134 @@
+"""
+Point samplers for the RRT* planners.
+
+The samplers are built once per particle cloud or map, and draw their points in
+vectorised blocks, which are then handed out one at a time. Weighted sets use
+an alias table, so every draw is O(1) whatever the number of points.
+"""
+
+import numpy as np
+
+
+class AliasTable(object):
+    """
+    Draws indices with probability proportional to a set of weights (Vose's
+    alias method). Building the table is O(n), every draw is O(1).
+    """
+    def __init__(self, weights):
+        w = np.asarray(weights, dtype=np.float64).ravel()
+        n = len(w)
+        if n == 0:
+            raise ValueError("Cannot build an alias table without weights")
+        total = np.sum(w)
+        if not (total > 0 and np.isfinite(total)):
+            w = np.ones(n) # degenerate weights: uniform
+            total = float(n)
+
+        scaled = (w*(n/total)).tolist()
+        prob = [1.0]*n
+        alias = range(n)
+        small = [i for i in xrange(n) if scaled[i] < 1.0]
+        large = [i for i in xrange(n) if scaled[i] >= 1.0]
+        while len(small) > 0 and len(large) > 0:
+            s = small.pop()
+            l = large.pop()
+            prob[s] = scaled[s]
+            alias[s] = l
+            scaled[l] += scaled[s] - 1.0
+            if scaled[l] < 1.0:
+                small.append(l)
+            else:
+                large.append(l)
+        # Whatever is left only differs from 1 by rounding errors, and keeps prob 1
+        self.prob = np.array(prob)
+        self.alias = np.array(alias, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.prob)
+
+    def draw(self, size):
+        """
+        Draws size indices.
+        """
+        idx = np.random.randint(0, len(self.prob), size)
+        keep = np.random.uniform(size=size) < self.prob[idx]
+        return np.where(keep, idx, self.alias[idx])
+
+
+class PointSampler(object):
+    """
+    Draws points from a fixed set, uniformly or in proportion to their weights.
+    """
+    def __init__(self, points, weights=None, block_size=1024):
+        self._points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        if len(self._points) == 0:
+            raise ValueError("Cannot sample from an empty set of points")
+        self._table = None
+        if weights is not None:
+            self._table = AliasTable(weights)
+        self._block_size = block_size
+        self.reset()
+
+    @staticmethod
+    def from_cells(info, cells, block_size=1024):
+        """
+        Uniform sampler over map cells. info is the MapMetaData of the map, and
+        cells are indices into its data. The points are the cell corners.
+        """
+        cells = np.asarray(cells, dtype=np.int64)
+        points = np.column_stack(((cells % info.width)*info.resolution + info.origin.position.x,
+                                  (cells // info.width)*info.resolution + info.origin.position.y))
+        return PointSampler(points, None, block_size)
+
+    def reset(self):
+        """
+        Discards the points drawn in advance. Needed after reseeding np.random.
+        """
+        self._block = self._points[:0]
+        self._next = 0
+
+    def draw(self, size):
+        """
+        Draws size points at once, as an array of size x 2.
+        """
+        if self._table is None:
+            idx = np.random.randint(0, len(self._points), size)
+        else:
+            idx = self._table.draw(size)
+        return self._points[idx]
+
+    def sample(self):
+        if self._next >= len(self._block):
+            self._block = self.draw(self._block_size)
+            self._next = 0
+        p = self._block[self._next]
+        self._next += 1
+        return p
+
+
+class MixedSampler(object):
+    """
+    Draws every point from one of several sample functions, chosen at random with
+    fixed probabilities. The functions are called when needed, so they may
+    sample from sets that change over time.
+    """
+    def __init__(self, sample_fns, probs, block_size=1024):
+        self._sample_fns = list(sample_fns)
+        self._table = AliasTable(probs)
+        self._block_size = block_size
+        self.reset()
+
+    def reset(self):
+        """
+        Discards the choices drawn in advance. Needed after reseeding np.random.
+        """
+        self._choices = []
+        self._next = 0
+
+    def sample(self):
+        if self._next >= len(self._choices):
+            self._choices = self._table.draw(self._block_size).tolist()
+            self._next = 0
+        k = self._choices[self._next]
+        self._next += 1
+        return self._sample_fns[k]()
@@ -0,0 +1,132 @@
+"""
+Incremental spatial index used by the RRT/RRT* motion planners.
+
+The tree grows one vertex at a time, so instead of refitting a kd-tree after
+every insertion the vertices are hashed into square buckets. Insertion is
+amortised O(1) and queries only visit the buckets around the query point.
+"""
+
+from math import floor
+
+import numpy as np
+
+
+class GridNeighbors(object):
+    """
+    Nearest and radius-neighbour queries over a growing set of 2D points.
+    Point indices are assigned in insertion order, so they match the vertex
+    list kept by the planner.
+    """
+    def __init__(self, cell_size, capacity=256):
+        self._cell = float(cell_size)
+        self._buckets = {}
+        self._points = np.empty((capacity, 2))
+        self._n = 0
+        self._bounds = None # (imin, imax, jmin, jmax) over occupied buckets
+
+    def __len__(self):
+        return self._n
+
+    def points(self):
+        return self._points[:self._n]
+
+    def _key(self, p):
+        return (int(floor(p[0]/self._cell)), int(floor(p[1]/self._cell)))
+
+    def insert(self, p):
+        """
+        Adds a point to the index and returns its index.
+        """
+        if self._n == len(self._points):
+            grown = np.empty((2*len(self._points), 2))
+            grown[:self._n] = self._points[:self._n]
+            self._points = grown
+        idx = self._n
+        self._points[idx, 0] = p[0]
+        self._points[idx, 1] = p[1]
+        self._n += 1
+
+        key = self._key(p)
+        if self._buckets.has_key(key):
+            self._buckets[key].append(idx)
+        else:
+            self._buckets[key] = [idx]
+
+        if self._bounds is None:
+            self._bounds = (key[0], key[0], key[1], key[1])
+        else:
+            (imin, imax, jmin, jmax) = self._bounds
+            self._bounds = (min(imin, key[0]), max(imax, key[0]),
+                            min(jmin, key[1]), max(jmax, key[1]))
+        return idx
+
+    def _ring(self, ci, cj, k):
+        if k == 0:
+            return [(ci, cj)]
+        cells = []
+        for i in xrange(ci-k, ci+k+1):
+            cells.append((i, cj-k))
+            cells.append((i, cj+k))
+        for j in xrange(cj-k+1, cj+k):
+            cells.append((ci-k, j))
+            cells.append((ci+k, j))
+        return cells
+
+    def _closest(self, p, candidates):
+        c = np.asarray(candidates)
+        d = np.hypot(self._points[c, 0] - p[0], self._points[c, 1] - p[1])
+        m = np.argmin(d)
+        return (d[m], c[m])
+
+    def kneighbors(self, p):
+        """
+        Returns (distance, index) of the indexed point closest to p.
+        """
+        if self._n == 0:
+            return (float('Inf'), -1)
+        (ci, cj) = self._key(p)
+        (imin, imax, jmin, jmax) = self._bounds
+        max_ring = max(ci - imin, imax - ci, cj - jmin, jmax - cj)
+
+        best = (float('Inf'), -1)
+        visited = 0
+        k = 0
+        while k <= max_ring:
+            cells = self._ring(ci, cj, k)
+            visited += len(cells)
+            if visited > self._n:
+                # The query is far from the tree; a linear scan is cheaper
+                # than sweeping empty buckets.
+                return self._closest(p, np.arange(self._n))
+            candidates = []
+            for key in cells:
+                if self._buckets.has_key(key):
+                    candidates.extend(self._buckets[key])
+            if len(candidates) > 0:
+                d = self._closest(p, candidates)
+                if d[0] < best[0]:
+                    best = d
+            # Anything beyond ring k is at least k cells away from p
+            if best[0] <= k*self._cell:
+                break
+            k += 1
+        return best
+
+    def radius_neighbors(self, p, r):
+        """
+        Returns the indices of all the points within distance r of p.
+        """
+        if self._n == 0:
+            return []
+        (imin, jmin) = self._key((p[0] - r, p[1] - r))
+        (imax, jmax) = self._key((p[0] + r, p[1] + r))
+        candidates = []
+        for i in xrange(imin, imax+1):
+            for j in xrange(jmin, jmax+1):
+                if self._buckets.has_key((i, j)):
+                    candidates.extend(self._buckets[(i, j)])
+        if len(candidates) == 0:
+            return []
+        c = np.asarray(candidates)
+        d = np.hypot(self._points[c, 0] - p[0], self._points[c, 1] - p[1])
+        return c[d <= r].tolist()
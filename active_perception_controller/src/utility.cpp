@@ -2,6 +2,66 @@
 #include <active_perception_controller/person_particle_filter.h>
 #include <tf/transform_datatypes.h>
 #include <ros/serialization.h>
+#include <map>
+
+/** Contiguous view of a Python array-like object through the buffer protocol.
+    The object is converted with numpy.ascontiguousarray, which does not copy when
+    it already is a contiguous array of the requested type.
+*/
+template <typename T>
+class ArrayView
+{
+public:
+    ArrayView(const object& obj, const char* dtype)
+    {
+        array_ = import("numpy").attr("ascontiguousarray")(obj, dtype);
+        if(PyObject_GetBuffer(array_.ptr(), &view_, PyBUF_C_CONTIGUOUS) != 0)
+            throw_error_already_set();
+    }
+    ~ArrayView()
+    {
+        PyBuffer_Release(&view_);
+    }
+    const T* data() const { return (const T*) view_.buf; }
+    size_t size() const { return view_.len/sizeof(T); }
+    const T& operator[](size_t i) const { return data()[i]; }
+private:
+    object array_;
+    Py_buffer view_;
+};
+
+/** Writable view of a new numpy array of doubles
+*/
+class OutputArray
+{
+public:
+    OutputArray(const object& shape)
+    {
+        array_ = import("numpy").attr("zeros")(shape, "float64");
+        if(PyObject_GetBuffer(array_.ptr(), &view_, PyBUF_C_CONTIGUOUS | PyBUF_WRITABLE) != 0)
+            throw_error_already_set();
+    }
+    ~OutputArray()
+    {
+        PyBuffer_Release(&view_);
+    }
+    double* data() { return (double*) view_.buf; }
+    object array() { return array_; }
+private:
+    object array_;
+    Py_buffer view_;
+};
+
+/** Releases the GIL for the lifetime of the object. No Python object can be used meanwhile.
+*/
+class ScopedGILRelease
+{
+public:
+    ScopedGILRelease() { state_ = PyEval_SaveThread(); }
+    ~ScopedGILRelease() { PyEval_RestoreThread(state_); }
+private:
+    PyThreadState* state_;
+};
 
 /**
  * \brief Constructor
@@ -11,9 +71,23 @@
  */
 Utility::Utility(std::string prob_image_path,
                  float resolution, double sigma_pose) :
-sensor_model_(new RfidSensorModel(prob_image_path, resolution))
+sensor_model_(new RfidSensorModel(prob_image_path, resolution)),
+prior_id_(-1),
+screening_bin_size_(0.0),
+screening_min_detection_(0.0),
+num_screened_(0)
 {
     sigma_pose_ = sigma_pose;
+    weights_.addDense(vector<double>());
+}
+
+/** \brief Resize the particle set
+ * \param num_particles Number of particles
+ */
+void Utility::resizeParticles(size_t num_particles)
+{
+    particles_x_.resize(num_particles);
+    particles_y_.resize(num_particles);
 }
 
 /** \brief Setting values for the particles
@@ -22,23 +96,13 @@ sensor_model_(new RfidSensorModel(prob_image_path, resolution))
 void Utility::setPersonParticles(const std::string& serialized_particles)
 {
     sensor_msgs::PointCloud pc;
-    /*This is taken from the ROS python_bindings_tutorial*/
-    size_t serial_size = serialized_particles.size();
-    boost::shared_array<uint8_t> buffer(new uint8_t[serial_size]);
-    for (size_t i = 0; i < serial_size; ++i)
-    {
-        buffer[i] = serialized_particles[i];
-    }
-    ros::serialization::IStream stream(buffer.get(), serial_size);
+    // The stream is only read, so it can use the string buffer directly
+    uint8_t* buffer = (uint8_t*)(serialized_particles.data());
+    ros::serialization::IStream stream(buffer, serialized_particles.size());
     ros::serialization::Serializer<sensor_msgs::PointCloud>::read(stream, pc);
 
     size_t num_particles = pc.points.size();
 
-    if(person_particles_.size() != num_particles)
-    {
-        person_particles_.resize(num_particles, 0);
-    }
-
     // Look for the channel with weights
     int weights_channel = 0;
     while(pc.channels[weights_channel].name != "weights")
@@ -51,20 +115,184 @@ void Utility::setPersonParticles(const std::string& serialized_particles)
         }
     }
 
+    resizeParticles(num_particles);
+
     // Copy particles from particle set
     for(int i = 0; i < num_particles; i++)
     {
-        if(person_particles_[i] != 0)
-            free(person_particles_[i]);
+        particles_x_[i] = pc.points[i].x;
+        particles_y_[i] = pc.points[i].y;
+    }
+    buildParticleGrid();
+    buildParticleBins();
+
+    resetWeights(vector<double>(pc.channels[weights_channel].values.begin(),
+                                pc.channels[weights_channel].values.end()));
+}
+
+/** \brief Setting values for the particles from arrays (e.g. NumPy arrays).
+ * The arrays are read through the buffer protocol, without intermediate copies.
+ * \param xs Particle positions (array of N)
+ * \param ys Particle positions (array of N)
+ * \param weights Particle weights (array of N)
+ */
+void Utility::setParticles(object xs, object ys, object weights)
+{
+    ArrayView<double> x(xs, "float64");
+    ArrayView<double> y(ys, "float64");
+    ArrayView<double> w(weights, "float64");
+
+    size_t num_particles = x.size();
+    if(y.size() != num_particles || w.size() != num_particles)
+    {
+        PyErr_SetString(PyExc_ValueError, "setParticles: all the arrays must have the same length");
+        throw_error_already_set();
+    }
+
+    particles_x_.assign(x.data(), x.data() + num_particles);
+    particles_y_.assign(y.data(), y.data() + num_particles);
+    buildParticleGrid();
+    buildParticleBins();
+
+    resetWeights(vector<double>(w.data(), w.data() + num_particles));
+}
 
-        person_particles_[i] = (Particle*) (new PersonParticle());
-        PersonParticle * part_ptr = (PersonParticle *)(person_particles_[i]);
-        part_ptr->pose_[0] = pc.points[i].x;
-        part_ptr->pose_[1] = pc.points[i].y;
-        part_ptr->weight_ = pc.channels[weights_channel].values[i];
+/** \brief Rebuild the bucket index of the particles, used to find the particles within the
+ * sensor range of every evaluated pose.
+ */
+void Utility::buildParticleGrid()
+{
+    if(sensor_model_)
+        grid_.build(particles_x_, particles_y_, getMaximumSensorRange());
+    else
+        grid_.clear();
+}
+
+/** \brief Rebuild the coarse bins of the particles, used to screen the evaluated poses.
+ * There are no bins while the screening is disabled.
+ */
+void Utility::buildParticleBins()
+{
+    size_t num_particles = particles_x_.size();
+    bin_of_.clear();
+    if(num_particles == 0 || screening_min_detection_ <= 0 || screening_bin_size_ <= 0)
+        return;
+
+    double max_x = particles_x_[0], max_y = particles_y_[0];
+    bins_min_x_ = particles_x_[0];
+    bins_min_y_ = particles_y_[0];
+    for(size_t i = 1; i < num_particles; i++)
+    {
+        bins_min_x_ = std::min(bins_min_x_, particles_x_[i]);
+        max_x = std::max(max_x, particles_x_[i]);
+        bins_min_y_ = std::min(bins_min_y_, particles_y_[i]);
+        max_y = std::max(max_y, particles_y_[i]);
+    }
+
+    // No more bins than particles, so that binning a weight vector is cheaper than an evaluation
+    bins_size_ = screening_bin_size_;
+    while(((max_x - bins_min_x_)/bins_size_ + 1)*((max_y - bins_min_y_)/bins_size_ + 1) > num_particles)
+        bins_size_ *= 2;
+    bins_cols_ = (int)floor((max_x - bins_min_x_)/bins_size_) + 1;
+    bins_rows_ = (int)floor((max_y - bins_min_y_)/bins_size_) + 1;
+
+    bin_of_.resize(num_particles);
+    for(size_t i = 0; i < num_particles; i++)
+    {
+        int col = std::min((int)((particles_x_[i] - bins_min_x_)/bins_size_), bins_cols_ - 1);
+        int row = std::min((int)((particles_y_[i] - bins_min_y_)/bins_size_), bins_rows_ - 1);
+        bin_of_[i] = (size_t)row*bins_cols_ + col;
     }
 }
 
+/** \brief Sum of the particle weights in every bin.
+ * \param weights Particle weights
+ * \param bin_weights Output, weight of every bin
+ */
+void Utility::binWeights(const vector<double>& weights, vector<double>& bin_weights) const
+{
+    bin_weights.assign((size_t)bins_cols_*bins_rows_, 0.0);
+    for(size_t i = 0; i < bin_of_.size(); i++)
+        bin_weights[bin_of_[i]] += weights[i];
+}
+
+/** \brief Upper bound of the probability of detecting the person from a pose, with the
+ * maximum detection probability over every bin of particles in range.
+ * \param px Robot pose
+ * \param py Robot pose
+ * \param yaw Robot yaw
+ * \param bin_weights Weight of every bin, from binWeights
+ */
+double Utility::detectionBound(float px, float py, float yaw, const vector<double>& bin_weights)
+{
+    double bin_radius = bins_size_*M_SQRT1_2;
+    double range = getMaximumSensorRange() + bin_radius;
+    double col_min = std::max(floor((px - range - bins_min_x_)/bins_size_), 0.0);
+    double col_max = std::min(floor((px + range - bins_min_x_)/bins_size_), bins_cols_ - 1.0);
+    double row_min = std::max(floor((py - range - bins_min_y_)/bins_size_), 0.0);
+    double row_max = std::min(floor((py + range - bins_min_y_)/bins_size_), bins_rows_ - 1.0);
+    if(!(col_min <= col_max && row_min <= row_max))
+        return 0.0;
+
+    bound_xs_.clear();
+    bound_ys_.clear();
+    bound_weights_.clear();
+    for(int row = (int)row_min; row <= (int)row_max; row++)
+    {
+        for(int col = (int)col_min; col <= (int)col_max; col++)
+        {
+            double weight = bin_weights[(size_t)row*bins_cols_ + col];
+            if(weight <= 0)
+                continue;
+            bound_xs_.push_back(bins_min_x_ + (col + 0.5)*bins_size_);
+            bound_ys_.push_back(bins_min_y_ + (row + 0.5)*bins_size_);
+            bound_weights_.push_back(weight);
+        }
+    }
+    if(bound_weights_.empty())
+        return 0.0;
+
+    RfidSensorData rfid_obs;
+    rfid_obs.rfid_ = true;
+    rfid_obs.pose_.pose.position.x = px;
+    rfid_obs.pose_.pose.position.y = py;
+    rfid_obs.pose_.pose.orientation = tf::createQuaternionMsgFromRollPitchYaw(0.0, 0.0, yaw);
+    bound_probs_.resize(bound_weights_.size());
+    sensor_model_->detectionBounds(rfid_obs, &bound_xs_[0], &bound_ys_[0], bound_xs_.size(),
+                                   bin_radius, &bound_probs_[0]);
+
+    double bound = 0.0;
+    for(size_t k = 0; k < bound_weights_.size(); k++)
+        bound += bound_weights_[k]*bound_probs_[k];
+    return bound;
+}
+
+/** \brief Clear the stored weights, which refer to the previous particle set,
+ * and store the weights of the current set with id 0.
+ * \param weights Current particle weights
+ */
+void Utility::resetWeights(const vector<double>& weights)
+{
+    weights_.clear();
+    weights_.addDense(weights);
+    prior_id_ = -1;
+    cache_.clear(); // the cached posterior ids refer to the cleared weights
+}
+
+/** \brief Get a stored weight vector. The last one retrieved is cached, since consecutive
+ * evaluations usually share their prior.
+ * \param weight_id Id of the weights
+ */
+const vector<double>& Utility::getPrior(int weight_id)
+{
+    if(weight_id != prior_id_)
+    {
+        weights_.getWeights(weight_id, prior_);
+        prior_id_ = weight_id;
+    }
+    return prior_;
+}
+
 /**  This function computes the expected entropy for a future robot pose.
     Given the current belief over the person position, it is computed the expected entropy
     by moving the robot to a future pose and taking a measurement there.
@@ -80,16 +308,376 @@ double Utility::computeExpEntropy(float px,
                                 float yaw,
                                 vector<double>& prev_weights,
                                 vector<double>& updated_weights)
+{
+    vector<size_t> updated_idx;
+    double scale, entropy;
+    prev_weights.resize(particles_x_.size(),0);
+    // The weight vectors are owned by Python, so they are only used while holding the GIL
+    vector<double> prior(prev_weights), posterior;
+    {
+        ScopedGILRelease no_gil;
+        entropy = expEntropy(px, py, yaw, prior, posterior, updated_idx, scale);
+    }
+    updated_weights.swap(posterior);
+    return entropy;
+}
+
+/** Batch version of computeExpEntropy. All the poses are evaluated in a single call, without the GIL,
+  spread over the worker threads.
+  \param xs Future robot poses to evaluate (array of N)
+  \param ys Future robot poses to evaluate (array of N)
+  \param yaws Future robot yaws to evaluate (array of N)
+  \param parent_weight_ids Ids of the stored weights to use as prior for each pose (array of N)
+  \return (entropies, posterior_ids) Arrays of N expected entropies and N ids of the updated weights
+  for each pose. The updated weights are stored as deltas over their prior.
+*/
+tuple Utility::computeExpEntropyBatch(object xs,
+                                      object ys,
+                                      object yaws,
+                                      object parent_weight_ids)
+{
+    ArrayView<double> x(xs, "float64");
+    ArrayView<double> y(ys, "float64");
+    ArrayView<double> yaw(yaws, "float64");
+    ArrayView<int64_t> ids(parent_weight_ids, "int64");
+
+    size_t num_poses = x.size();
+    if(y.size() != num_poses || yaw.size() != num_poses || ids.size() != num_poses)
+    {
+        PyErr_SetString(PyExc_ValueError, "computeExpEntropyBatch: all the arrays must have the same length");
+        throw_error_already_set();
+    }
+    for(size_t i = 0; i < num_poses; i++)
+    {
+        if(!weights_.isValid(ids[i]))
+        {
+            PyErr_SetString(PyExc_IndexError, "computeExpEntropyBatch: unknown weight id");
+            throw_error_already_set();
+        }
+    }
+
+    // Poses already evaluated with the same prior are taken from the cache, and repeated poses
+    // of the batch are only evaluated once. The rest are evaluated by the workers
+    OutputArray entropies(make_tuple(num_poses));
+    OutputArray posteriors(make_tuple(num_poses));
+    vector<long> source(num_poses, -1);
+    vector<EntropyCache::Key> keys(num_poses);
+    map<EntropyCache::Key, size_t> batch_keys;
+    vector<size_t> evaluated;
+    for(size_t i = 0; i < num_poses; i++)
+    {
+        keys[i] = cache_.makeKey(x[i], y[i], yaw[i], ids[i]);
+        int posterior_id;
+        if(cache_.find(keys[i], entropies.data()[i], posterior_id))
+        {
+            posteriors.data()[i] = posterior_id;
+            continue;
+        }
+        map<EntropyCache::Key, size_t>::iterator it = batch_keys.find(keys[i]);
+        if(it != batch_keys.end())
+        {
+            source[i] = it->second;
+            continue;
+        }
+        batch_keys[keys[i]] = i;
+        evaluated.push_back(i);
+    }
+
+    // The weight store is not thread-safe, so the priors are retrieved beforehand
+    map<int64_t, vector<double> > priors;
+    for(size_t k = 0; k < evaluated.size(); k++)
+    {
+        size_t i = evaluated[k];
+        if(priors.find(ids[i]) == priors.end())
+            weights_.getWeights(ids[i], priors[ids[i]]);
+    }
+
+    // Poses that can only detect the person with a probability below screening_min_detection_,
+    // according to the bound over the bins, keep their prior weights and its entropy
+    if(screening_min_detection_ > 0 && !bin_of_.empty())
+    {
+        map<int64_t, vector<double> > bin_weights;
+        map<int64_t, double> prior_entropies;
+        vector<size_t> unscreened;
+        for(size_t k = 0; k < evaluated.size(); k++)
+        {
+            size_t i = evaluated[k];
+            if(bin_weights.find(ids[i]) == bin_weights.end())
+                binWeights(priors[ids[i]], bin_weights[ids[i]]);
+            if(detectionBound(x[i], y[i], yaw[i], bin_weights[ids[i]]) >= screening_min_detection_)
+            {
+                unscreened.push_back(i);
+                continue;
+            }
+            if(prior_entropies.find(ids[i]) == prior_entropies.end())
+                prior_entropies[ids[i]] = PersonParticleFilter::entropyGMM(priors[ids[i]], sigma_pose_);
+            entropies.data()[i] = prior_entropies[ids[i]];
+            posteriors.data()[i] = ids[i];
+            cache_.insert(keys[i], entropies.data()[i], ids[i]);
+            num_screened_++;
+        }
+        evaluated.swap(unscreened);
+    }
+
+    vector<BatchPose> poses(evaluated.size());
+    for(size_t k = 0; k < evaluated.size(); k++)
+    {
+        size_t i = evaluated[k];
+        poses[k].x = x[i];
+        poses[k].y = y[i];
+        poses[k].yaw = yaw[i];
+        poses[k].prior = &priors[ids[i]];
+    }
+
+    {
+        ScopedGILRelease no_gil;
+        pool_.run(poses.size(), boost::bind(&Utility::evaluatePose, this, _1, _2, &poses));
+    }
+
+    // The posteriors are stored in order, so their ids do not depend on the scheduling
+    vector<double> updated_values;
+    for(size_t k = 0; k < evaluated.size(); k++)
+    {
+        size_t i = evaluated[k];
+        const BatchPose& pose = poses[k];
+        entropies.data()[i] = pose.entropy;
+        if(pose.scale > 0)
+        {
+            updated_values.resize(pose.updated_idx.size());
+            for(size_t j = 0; j < pose.updated_idx.size(); j++)
+                updated_values[j] = pose.updated_weights[pose.updated_idx[j]];
+            posteriors.data()[i] = weights_.addDelta(ids[i], pose.scale, pose.updated_idx, updated_values);
+        }
+        else
+            posteriors.data()[i] = weights_.addDense(pose.updated_weights);
+        cache_.insert(keys[i], pose.entropy, posteriors.data()[i]);
+    }
+    for(size_t i = 0; i < num_poses; i++)
+    {
+        if(source[i] >= 0)
+        {
+            entropies.data()[i] = entropies.data()[source[i]];
+            posteriors.data()[i] = posteriors.data()[source[i]];
+        }
+    }
+
+    return make_tuple(entropies.array(), posteriors.array().attr("astype")("int64"));
+}
+
+/** Evaluate one pose of a batch. Run by the worker threads, without the GIL
+  \param task Index of the pose
+  \param worker Index of the worker thread
+  \param poses Poses of the batch
+*/
+void Utility::evaluatePose(size_t task, size_t worker, vector<BatchPose>* poses)
+{
+    BatchPose& pose = (*poses)[task];
+    pose.entropy = expEntropy(pose.x, pose.y, pose.yaw, *pose.prior,
+                              pose.updated_weights, pose.updated_idx, pose.scale);
+}
+
+/** Store a weight vector so that it can be used as prior in computeExpEntropyBatch
+  \param weights Particle weights (array of num_particles)
+  \return Id of the stored weights
+*/
+int Utility::addWeights(object weights)
+{
+    ArrayView<double> w(weights, "float64");
+    if(w.size() != particles_x_.size())
+    {
+        PyErr_SetString(PyExc_ValueError, "addWeights: there must be one weight per particle");
+        throw_error_already_set();
+    }
+    return weights_.addDense(vector<double>(w.data(), w.data() + w.size()));
+}
+
+/** Drop the stored weights that are no longer used, so that the store stays bounded while the
+  particles do not change. The current particle weights (id 0), the given weights and the weights of
+  the cached evaluations are kept, and renumbered: every id held by the caller must be replaced
+  \param live_weight_ids Ids of the weights in use (array of N)
+  \return Array of N new ids of those weights
+*/
+object Utility::compactWeights(object live_weight_ids)
+{
+    ArrayView<int64_t> ids(live_weight_ids, "int64");
+    vector<int> keep(1, 0);
+    for(size_t i = 0; i < ids.size(); i++)
+    {
+        if(!weights_.isValid(ids[i]))
+        {
+            PyErr_SetString(PyExc_IndexError, "compactWeights: unknown weight id");
+            throw_error_already_set();
+        }
+        keep.push_back(ids[i]);
+    }
+    cache_.getWeightIds(keep);
+
+    vector<int> new_ids;
+    weights_.compact(keep, new_ids);
+    cache_.remapWeightIds(new_ids);
+    if(prior_id_ >= 0)
+        prior_id_ = new_ids[prior_id_];
+
+    OutputArray out(make_tuple(ids.size()));
+    for(size_t i = 0; i < ids.size(); i++)
+        out.data()[i] = new_ids[ids[i]];
+    return out.array().attr("astype")("int64");
+}
+
+/** Get a copy of stored weights
+  \param weight_id Id of the weights
+*/
+object Utility::getWeights(int weight_id)
+{
+    if(!weights_.isValid(weight_id))
+    {
+        PyErr_SetString(PyExc_IndexError, "getWeights: unknown weight id");
+        throw_error_already_set();
+    }
+    const vector<double>& w = getPrior(weight_id);
+    OutputArray out(make_tuple(w.size()));
+    std::copy(w.begin(), w.end(), out.data());
+    return out.array();
+}
+
+/** Number of stored weight vectors */
+int Utility::getNumWeights()
+{
+    return weights_.size();
+}
+
+/** Set the number of threads used by the batch evaluations
+  \param num_threads Number of threads, including the calling one. 0 for one per core
+*/
+void Utility::setNumThreads(int num_threads)
+{
+    pool_.resize(num_threads > 0 ? num_threads : 0);
+}
+
+/** Number of threads used by the batch evaluations */
+int Utility::getNumThreads()
+{
+    return pool_.size();
+}
+
+/** Configure the cache of the batch evaluations. Poses in the same grid cell, evaluated with
+  the same prior, share their results: the entropy and the id of the posterior weights
+  \param capacity Maximum number of cached evaluations. 0 disables the cache
+  \param resolution Grid size for the positions, in meters. 0 for exact positions only
+  \param yaw_resolution Grid size for the yaws, in radians. 0 for exact yaws only
+*/
+void Utility::setEntropyCache(int capacity, double resolution, double yaw_resolution)
+{
+    cache_.configure(capacity > 0 ? capacity : 0, resolution, yaw_resolution);
+    cache_.resetStats();
+}
+
+/** Statistics of the evaluation cache
+  \return Dictionary with the number of hits and misses, the hit rate, the size and the capacity
+*/
+dict Utility::getEntropyCacheStats()
+{
+    dict stats;
+    unsigned long lookups = cache_.hits() + cache_.misses();
+    stats["hits"] = cache_.hits();
+    stats["misses"] = cache_.misses();
+    stats["hit_rate"] = lookups > 0 ? double(cache_.hits())/lookups : 0.0;
+    stats["size"] = cache_.size();
+    stats["capacity"] = cache_.capacity();
+    return stats;
+}
+
+/** Precompute the sensor model rotated to a number of yaw bins, so that evaluating a pose costs
+  the same whatever its yaw. The cached evaluations are dropped, since they used the previous model
+  \param num_bins Number of bins over the full turn, 0 to transform every particle exactly
+*/
+void Utility::setSensorYawBins(int num_bins)
+{
+    if(sensor_model_)
+        sensor_model_->setYawBins(num_bins);
+    cache_.clear();
+}
+
+/** Number of yaw bins of the sensor model, 0 if it is not precomputed */
+int Utility::getSensorYawBins()
+{
+    return sensor_model_ ? sensor_model_->getYawBins() : 0;
+}
+
+/** Screen the poses of the batch evaluations with a coarse bound: the particles are grouped in bins,
+  and the detection probability of every bin is bounded with the pyramid of the sensor model. The poses
+  whose bound is below min_detection are not evaluated, and keep their prior weights and entropy.
+  The cached evaluations are dropped, since they were not screened
+  \param bin_size Size of the particle bins, in meters. Larger bins are cheaper and looser
+  \param min_detection Minimum probability of detecting the person for a full evaluation. 0 disables the screening
+*/
+void Utility::setScreening(double bin_size, double min_detection)
+{
+    screening_bin_size_ = bin_size > 0 ? bin_size : 0.0;
+    screening_min_detection_ = min_detection > 0 ? min_detection : 0.0;
+    num_screened_ = 0;
+    buildParticleBins();
+    cache_.clear();
+}
+
+/** Number of poses discarded by the screening since it was configured */
+unsigned long Utility::getNumScreened()
+{
+    return num_screened_;
+}
+
+/** Sensor model rotated to a yaw and resampled to a resolution, as a kernel to correlate with
+  a belief grid. See RfidSensorModel::detectionKernel
+  \param yaw Yaw of the sensor
+  \param resolution Size of the cells, in meters
+  \return Array of size x size detection probabilities, indexed as [y offset, x offset]
+*/
+object Utility::getSensorKernel(double yaw, double resolution)
+{
+    if(!sensor_model_)
+    {
+        PyErr_SetString(PyExc_RuntimeError, "getSensorKernel: there is no sensor model");
+        throw_error_already_set();
+    }
+    if(resolution <= 0)
+    {
+        PyErr_SetString(PyExc_ValueError, "getSensorKernel: the resolution must be positive");
+        throw_error_already_set();
+    }
+    vector<float> kernel;
+    int size = sensor_model_->detectionKernel(yaw, resolution, kernel);
+    OutputArray out(make_tuple(size, size));
+    std::copy(kernel.begin(), kernel.end(), out.data());
+    return out.array();
+}
+
+/** Number of weight values held by the store, over all the vectors */
+int Utility::getNumStoredWeightValues()
+{
+    return weights_.getNumStoredValues();
+}
+
+/** Implementation of the expected entropy computation.
+    Parameters as in computeExpEntropy, prev_weights must have one weight per particle.
+    The updated weights are also given as a delta over prev_weights: the weights of the particles
+    in updated_idx change, and the rest are multiplied by scale (0 if that does not hold).
+*/
+double Utility::expEntropy(float px,
+                           float py,
+                           float yaw,
+                           const vector<double>& prev_weights,
+                           vector<double>& updated_weights,
+                           vector<size_t>& use_particle_idx,
+                           double& scale)
 {
     geometry_msgs::PoseWithCovariance robot_pose;
     robot_pose.pose.position.x = px;
     robot_pose.pose.position.y = py;
     robot_pose.pose.orientation = tf::createQuaternionMsgFromRollPitchYaw(0.0, 0.0, yaw);
-    prev_weights.resize(person_particles_.size(),0);
-    updated_weights.resize(person_particles_.size(),0);
-    vector<double> det_weights(person_particles_.size(),0);
-    vector<size_t> use_particle_idx;
-    vector<double> ndet_weights(person_particles_.size(),0);
+    updated_weights.resize(particles_x_.size(),0);
+    vector<double> det_weights(particles_x_.size(),0);
+    // The weights of the particles in range are overwritten by the update
+    vector<double> ndet_weights(prev_weights.begin(), prev_weights.begin() + particles_x_.size());
 
     double prob_det = 0.0, prob_ndet;
     RfidSensorData rfid_obs;
@@ -100,19 +688,15 @@ double Utility::computeExpEntropy(float px,
        p(z=no) = 1 - p(z=yes)
     */
 
-    for(int i = 0; i < person_particles_.size(); i++)
+    // Only the particles within the sensor range can be detected. Their detection probabilities
+    // are computed in one batch, and used for both observations
+    grid_.query(px, py, getMaximumSensorRange(), use_particle_idx);
+    vector<double> det_probs, ndet_probs(use_particle_idx.size());
+    sensor_model_->applySensorModel(rfid_obs, particles_x_, particles_y_, use_particle_idx, det_probs);
+    for(size_t k = 0; k < use_particle_idx.size(); k++)
     {
-        PersonParticle *part_ptr = (PersonParticle*) person_particles_[i];
-        if(hypot(part_ptr->pose_[0] - px, part_ptr->pose_[1] - py) <= getMaximumSensorRange())
-        {
-            prob_det += prev_weights[i]*sensor_model_->applySensorModel(rfid_obs, (Particle*) part_ptr);
-            use_particle_idx.push_back(i);
-        }
-        else
-        {
-            ndet_weights[i] = prev_weights[i];
-            det_weights[i] = 0;
-        }
+        prob_det += prev_weights[use_particle_idx[k]]*det_probs[k];
+        ndet_probs[k] = 1-det_probs[k];
     }
 
     prob_ndet = 1.0 - prob_det;
@@ -122,16 +706,15 @@ double Utility::computeExpEntropy(float px,
     */
     double entropy_det, entropy_ndet;
 
-    PersonParticleFilter::update(*(sensor_model_.get()),
-                                 person_particles_,
-                                 rfid_obs,
+    PersonParticleFilter::update(det_probs,
                                  prev_weights,
                                  det_weights,
                                  use_particle_idx);
 
 /*
     entropy_det = PersonParticleFilter::entropyParticles(*(sensor_model_.get()),
-                                                         person_particles_,
+                                                         particles_x_,
+                                 particles_y_,
                                                          rfid_obs,
                                                          prev_weights,
                                                          det_weights);
@@ -145,16 +728,16 @@ double Utility::computeExpEntropy(float px,
     */
     rfid_obs.rfid_ = false;
 
-    PersonParticleFilter::update(*(sensor_model_.get()),
-                                 person_particles_,
-                                 rfid_obs,
+    PersonParticleFilter::update(ndet_probs,
                                  prev_weights,
                                  ndet_weights,
-                                 use_particle_idx);
+                                 use_particle_idx,
+                                 &scale);
 
 /*
     entropy_ndet = PersonParticleFilter::entropyParticles(*(sensor_model_.get()),
-                                                          person_particles_,
+                                                          particles_x_,
+                                 particles_y_,
                                                           rfid_obs,
                                                           prev_weights,
                                                           ndet_weights);
@@ -163,7 +746,7 @@ double Utility::computeExpEntropy(float px,
     entropy_ndet = PersonParticleFilter::entropyGMM(ndet_weights, sigma_pose_);
 
     /* Expected_H' = H'(z=yes)*p(z=yes) + H'(z=no)*p(z=no) */
-    ROS_INFO_STREAM("pdet: " << prob_det << " entropy det " << entropy_det << " prob_ndet: " << prob_ndet << " entropy ndet " << entropy_ndet);
+    ROS_DEBUG_STREAM("pdet: " << prob_det << " entropy det " << entropy_det << " prob_ndet: " << prob_ndet << " entropy ndet " << entropy_ndet);
 
     for(size_t i = 0; i < updated_weights.size(); i++)
     {
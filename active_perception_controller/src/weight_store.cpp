@@ -0,0 +1,178 @@
+#include <active_perception_controller/weight_store.h>
+#include <algorithm>
+
+/** Constructor
+  \param max_depth Maximum number of chained deltas. Deeper sets are stored densely.
+  */
+WeightStore::WeightStore(int max_depth) :
+num_particles_(0),
+num_values_(0),
+max_depth_(max_depth)
+{
+}
+
+/** Remove all the weight sets */
+void WeightStore::clear()
+{
+    sets_.clear();
+    num_particles_ = 0;
+    num_values_ = 0;
+}
+
+/** Store a full weight vector
+  \param weights Particle weights
+  \return Id of the new set
+  */
+int WeightStore::addDense(const std::vector<double>& weights)
+{
+    if(sets_.empty())
+        num_particles_ = weights.size();
+
+    WeightSet set;
+    set.parent_ = -1;
+    set.depth_ = 0;
+    set.scale_ = 1.0;
+    set.values_ = weights;
+    sets_.push_back(set);
+    num_values_ += weights.size();
+    return sets_.size() - 1;
+}
+
+/** Store a weight vector as a delta over a parent set
+  \param parent_id Id of the parent set
+  \param scale Scale factor applied to the parent weights
+  \param indices Particles whose weights are given explicitly
+  \param values Weights of those particles
+  \return Id of the new set
+  */
+int WeightStore::addDelta(int parent_id,
+                          double scale,
+                          const std::vector<size_t>& indices,
+                          const std::vector<double>& values)
+{
+    const WeightSet& parent = sets_[parent_id];
+
+    if(parent.depth_ + 1 > max_depth_ || 2*indices.size() > num_particles_)
+    {
+        // Not worth a delta. Store it densely to keep retrieval bounded
+        std::vector<double> weights;
+        getWeights(parent_id, weights);
+        for(size_t i = 0; i < weights.size(); i++)
+            weights[i] *= scale;
+        for(size_t i = 0; i < indices.size(); i++)
+            weights[indices[i]] = values[i];
+        return addDense(weights);
+    }
+
+    WeightSet set;
+    set.parent_ = parent_id;
+    set.depth_ = parent.depth_ + 1;
+    set.scale_ = scale;
+    set.indices_.assign(indices.begin(), indices.end());
+    set.values_ = values;
+    sets_.push_back(set);
+    num_values_ += values.size();
+    return sets_.size() - 1;
+}
+
+/** Retrieve a full weight vector. The chain of deltas is walked from the requested set up to
+  its dense ancestor, so each weight is only written once.
+  \param weight_id Id of the set
+  \param weights Particle weights
+  */
+void WeightStore::getWeights(int weight_id, std::vector<double>& weights) const
+{
+    weights.resize(num_particles_);
+    assigned_.assign(num_particles_, 0);
+
+    double scale = 1.0;
+    int id = weight_id;
+    while(sets_[id].parent_ >= 0)
+    {
+        const WeightSet& set = sets_[id];
+        for(size_t i = 0; i < set.indices_.size(); i++)
+        {
+            unsigned int idx = set.indices_[i];
+            if(!assigned_[idx])
+            {
+                weights[idx] = scale*set.values_[i];
+                assigned_[idx] = 1;
+            }
+        }
+        scale *= set.scale_;
+        id = set.parent_;
+    }
+
+    const std::vector<double>& dense = sets_[id].values_;
+    for(size_t i = 0; i < num_particles_; i++)
+    {
+        if(!assigned_[i])
+            weights[i] = scale*dense[i];
+    }
+}
+
+/** Drop all the sets but the given ones and the parents they need. The kept sets are renumbered
+  in the same order, so the parents still come before their children
+  \param keep_ids Ids of the sets to keep. Invalid ids are ignored
+  \param new_ids Output, new id of every previous set, -1 for the dropped ones
+  */
+void WeightStore::compact(const std::vector<int>& keep_ids, std::vector<int>& new_ids)
+{
+    std::vector<char> live(sets_.size(), 0);
+    for(size_t k = 0; k < keep_ids.size(); k++)
+    {
+        for(int id = keep_ids[k]; isValid(id) && !live[id]; id = sets_[id].parent_)
+            live[id] = 1;
+    }
+
+    new_ids.assign(sets_.size(), -1);
+    size_t num_kept = 0;
+    num_values_ = 0;
+    for(size_t id = 0; id < sets_.size(); id++)
+    {
+        if(!live[id])
+            continue;
+        WeightSet& set = sets_[num_kept];
+        if(num_kept != id)
+            set.swap(sets_[id]);
+        if(set.parent_ >= 0)
+            set.parent_ = new_ids[set.parent_];
+        num_values_ += set.values_.size();
+        new_ids[id] = num_kept++;
+    }
+    sets_.resize(num_kept);
+}
+
+/** Exchange the contents of two sets, without copying their weights */
+void WeightStore::WeightSet::swap(WeightSet& other)
+{
+    std::swap(parent_, other.parent_);
+    std::swap(depth_, other.depth_);
+    std::swap(scale_, other.scale_);
+    indices_.swap(other.indices_);
+    values_.swap(other.values_);
+}
+
+/** Check whether a set exists */
+bool WeightStore::isValid(int weight_id) const
+{
+    return weight_id >= 0 && weight_id < (int)sets_.size();
+}
+
+/** Number of stored sets */
+int WeightStore::size() const
+{
+    return sets_.size();
+}
+
+/** Length of the weight vectors */
+size_t WeightStore::getNumParticles() const
+{
+    return num_particles_;
+}
+
+/** Total number of stored weights, over all the sets */
+size_t WeightStore::getNumStoredValues() const
+{
+    return num_values_;
+}
@@ -0,0 +1,135 @@
+#include <active_perception_controller/worker_pool.h>
+
+/** Constructor
+  \param num_workers Number of workers, including the thread that calls run()
+  */
+WorkerPool::WorkerPool(size_t num_workers) :
+num_tasks_(0),
+next_task_(0),
+pending_tasks_(0),
+generation_(0),
+num_workers_(0),
+stop_(false)
+{
+    resize(num_workers);
+}
+
+/** Destructor. Waits for the worker threads to finish */
+WorkerPool::~WorkerPool()
+{
+    stop();
+}
+
+/** Change the number of workers
+  \param num_workers Number of workers, including the thread that calls run(). 0 means one per core
+  */
+void WorkerPool::resize(size_t num_workers)
+{
+    if(num_workers == 0)
+        num_workers = hardwareConcurrency();
+    if(num_workers == num_workers_)
+        return;
+
+    stop();
+    stop_ = false;
+    num_workers_ = num_workers;
+    for(size_t i = 1; i < num_workers_; i++)
+        threads_.push_back(boost::shared_ptr<boost::thread>(
+                               new boost::thread(boost::bind(&WorkerPool::workerLoop, this, i))));
+}
+
+/** Number of workers, including the thread that calls run() */
+size_t WorkerPool::size() const
+{
+    return num_workers_;
+}
+
+/** Run a job and wait until all its tasks are finished
+  \param num_tasks Number of tasks
+  \param job Function called once per task, with the task index and the index of the worker running it
+  (0 for the calling thread, so per-worker scratch data can be indexed by it)
+  */
+void WorkerPool::run(size_t num_tasks, const Job& job)
+{
+    if(num_workers_ <= 1 || num_tasks <= 1)
+    {
+        for(size_t i = 0; i < num_tasks; i++)
+            job(i, 0);
+        return;
+    }
+
+    {
+        boost::mutex::scoped_lock lock(mutex_);
+        job_ = job;
+        num_tasks_ = num_tasks;
+        next_task_ = 0;
+        pending_tasks_ = num_tasks;
+        generation_++;
+    }
+    job_ready_.notify_all();
+
+    work(0);
+
+    boost::mutex::scoped_lock lock(mutex_);
+    while(pending_tasks_ > 0)
+        job_done_.wait(lock);
+}
+
+/** Number of cores, at least 1 */
+size_t WorkerPool::hardwareConcurrency()
+{
+    size_t n = boost::thread::hardware_concurrency();
+    return n > 0 ? n : 1;
+}
+
+/** Main loop of the worker threads: wait for a job and work on it */
+void WorkerPool::workerLoop(size_t worker)
+{
+    unsigned long last_generation = 0;
+    while(true)
+    {
+        {
+            boost::mutex::scoped_lock lock(mutex_);
+            while(!stop_ && generation_ == last_generation)
+                job_ready_.wait(lock);
+            if(stop_)
+                return;
+            last_generation = generation_;
+        }
+        work(worker);
+    }
+}
+
+/** Take tasks of the current job until there are none left */
+void WorkerPool::work(size_t worker)
+{
+    while(true)
+    {
+        size_t task;
+        {
+            boost::mutex::scoped_lock lock(mutex_);
+            if(next_task_ >= num_tasks_)
+                return;
+            task = next_task_++;
+        }
+
+        job_(task, worker);
+
+        boost::mutex::scoped_lock lock(mutex_);
+        if(--pending_tasks_ == 0)
+            job_done_.notify_all();
+    }
+}
+
+/** Stop and join the worker threads */
+void WorkerPool::stop()
+{
+    {
+        boost::mutex::scoped_lock lock(mutex_);
+        stop_ = true;
+    }
+    job_ready_.notify_all();
+    for(size_t i = 0; i < threads_.size(); i++)
+        threads_[i]->join();
+    threads_.clear();
+}
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import unittest
+
+import numpy as np
+import scipy as sp
+import scipy.ndimage
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from collision import SegmentChecker
+
+
+class _Info(object):
+    def __init__(self, width, height, resolution, x, y):
+        class Position(object):
+            pass
+        class Origin(object):
+            position = Position()
+        self.width = width
+        self.height = height
+        self.resolution = resolution
+        self.origin = Origin()
+        self.origin.position.x = x
+        self.origin.position.y = y
+
+
+class TestSegmentChecker(unittest.TestCase):
+    def setUp(self):
+        # 10 x 5 m map with 0.5 m cells, from (-1, -2). The map data starts at the origin:
+        # a wall at x in [4, 4.5) from the bottom up to y = 1.5, and a block at the origin
+        self.info = _Info(20, 10, 0.5, -1.0, -2.0)
+        data = np.zeros((10, 20), dtype=np.int8)
+        data[:7, 10] = 100
+        data[0, 0] = 100
+        self.distmap = np.flipud(sp.ndimage.distance_transform_edt(data == 0))
+        self.checker = SegmentChecker(self.info, self.distmap, 1.0)
+
+    def test_points(self):
+        free = self.checker.points_safe([(-0.9, -1.9), # in the block at the origin
+                                         (4.2, 0.0),   # in the wall
+                                         (4.2, 2.7),   # above the wall
+                                         (1.0, 1.0),   # free
+                                         (20.0, 0.0)]) # out of the map
+        np.testing.assert_array_equal(free, [False, False, True, True, False])
+
+    def test_segments(self):
+        org = [(1.0, 0.0), (1.0, 2.7), (1.0, 0.0), (1.0, 0.0)]
+        dst = [(7.0, 0.0), (7.0, 2.7), (1.0, 2.5), (12.0, 0.0)]
+        np.testing.assert_array_equal(self.checker.segments_safe(org, dst), [False, True, True, False])
+        self.assertFalse(self.checker.segment_safe((1.0, 0.0), (7.0, 0.0)))
+        self.assertTrue(self.checker.segment_safe((1.0, 2.7), (7.0, 2.7)))
+
+    def test_clearance(self):
+        # The cells next to the wall are free, but closer than a robot radius of two cells
+        checker = SegmentChecker(self.info, self.distmap, 2.0)
+        np.testing.assert_array_equal(self.checker.points_safe([(3.7, 0.0), (3.2, 0.0)]), [True, True])
+        np.testing.assert_array_equal(checker.points_safe([(3.7, 0.0), (3.2, 0.0)]), [False, True])
+        self.assertTrue(self.checker.segment_safe((1.0, 0.0), (3.7, 0.0)))
+        self.assertFalse(checker.segment_safe((1.0, 0.0), (3.7, 0.0)))
+
+    def test_shared_origin(self):
+        dst = [(7.0, 0.0), (1.0, 2.5), (3.0, 0.0)]
+        np.testing.assert_array_equal(self.checker.segments_safe((1.0, 0.0), dst), [False, True, True])
+        self.assertEqual(len(self.checker.segments_safe(np.zeros((0, 2)), np.zeros((0, 2)))), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+#include <active_perception_controller/entropy_cache.h>
+#include <gtest/gtest.h>
+#include <cmath>
+
+static bool lookup(EntropyCache& cache, double x, double y, double yaw, int prior_id,
+                   double& entropy, int& posterior_id)
+{
+    return cache.find(cache.makeKey(x, y, yaw, prior_id), entropy, posterior_id);
+}
+
+TEST(EntropyCache, hitsWithinACell)
+{
+    EntropyCache cache(10, 0.5, 0.0);
+    cache.insert(cache.makeKey(1.1, 2.2, 0.3, 4), 1.5, 7);
+
+    double entropy;
+    int posterior_id;
+    ASSERT_TRUE(lookup(cache, 1.4, 2.01, 0.3, 4, entropy, posterior_id));
+    EXPECT_EQ(1.5, entropy);
+    EXPECT_EQ(7, posterior_id);
+    // Another cell, another prior or another yaw
+    EXPECT_FALSE(lookup(cache, 1.6, 2.2, 0.3, 4, entropy, posterior_id));
+    EXPECT_FALSE(lookup(cache, 1.1, 2.2, 0.3, 5, entropy, posterior_id));
+    EXPECT_FALSE(lookup(cache, 1.1, 2.2, 0.31, 4, entropy, posterior_id));
+    EXPECT_EQ(1u, cache.hits());
+    EXPECT_EQ(3u, cache.misses());
+}
+
+TEST(EntropyCache, yawBins)
+{
+    // 2*pi/0.5 is rounded to 13 bins
+    EXPECT_DOUBLE_EQ(2*M_PI/13, EntropyCache(10, 0.0, 0.5).yawResolution());
+
+    EntropyCache cache(10, 0.0, M_PI/6);
+    double width = cache.yawResolution();
+    EXPECT_DOUBLE_EQ(M_PI/6, width);
+    // The bins are centered on multiples of their width, and wrap around the full turn
+    EntropyCache::Key zero = cache.makeKey(1.0, 1.0, 0.0, 0);
+    EntropyCache::Key near_zero = cache.makeKey(1.0, 1.0, -0.4*width, 0);
+    EntropyCache::Key turn = cache.makeKey(1.0, 1.0, 2*M_PI + 0.4*width, 0);
+    EntropyCache::Key next = cache.makeKey(1.0, 1.0, 0.6*width, 0);
+    EXPECT_FALSE(zero < near_zero || near_zero < zero);
+    EXPECT_FALSE(zero < turn || turn < zero);
+    EXPECT_TRUE(zero < next || next < zero);
+    // With an even number of bins, pi is the center of a bin
+    EntropyCache::Key below_pi = cache.makeKey(1.0, 1.0, M_PI - 0.1*width, 0);
+    EntropyCache::Key above_pi = cache.makeKey(1.0, 1.0, -M_PI + 0.1*width, 0);
+    EXPECT_FALSE(below_pi < above_pi || above_pi < below_pi);
+}
+
+TEST(EntropyCache, leastRecentlyUsedEviction)
+{
+    EntropyCache cache(2, 0.0, 0.0);
+    double entropy;
+    int posterior_id;
+    cache.insert(cache.makeKey(0.0, 0.0, 0.0, 0), 1.0, 1);
+    cache.insert(cache.makeKey(1.0, 0.0, 0.0, 0), 2.0, 2);
+    // Using the first entry makes the second one the least recently used
+    EXPECT_TRUE(lookup(cache, 0.0, 0.0, 0.0, 0, entropy, posterior_id));
+    cache.insert(cache.makeKey(2.0, 0.0, 0.0, 0), 3.0, 3);
+    EXPECT_EQ(2u, cache.size());
+    EXPECT_TRUE(lookup(cache, 0.0, 0.0, 0.0, 0, entropy, posterior_id));
+    EXPECT_FALSE(lookup(cache, 1.0, 0.0, 0.0, 0, entropy, posterior_id));
+    EXPECT_TRUE(lookup(cache, 2.0, 0.0, 0.0, 0, entropy, posterior_id));
+    EXPECT_EQ(3, posterior_id);
+}
+
+TEST(EntropyCache, disabled)
+{
+    EntropyCache cache(0, 0.0, 0.0);
+    double entropy;
+    int posterior_id;
+    cache.insert(cache.makeKey(0.0, 0.0, 0.0, 0), 1.0, 1);
+    EXPECT_EQ(0u, cache.size());
+    EXPECT_FALSE(lookup(cache, 0.0, 0.0, 0.0, 0, entropy, posterior_id));
+    EXPECT_EQ(0u, cache.misses());
+}
+
+TEST(EntropyCache, remapWeightIds)
+{
+    EntropyCache cache(10, 0.0, 0.0);
+    cache.insert(cache.makeKey(0.0, 0.0, 0.0, 0), 1.0, 3);
+    cache.insert(cache.makeKey(1.0, 0.0, 0.0, 3), 2.0, 4);
+    cache.insert(cache.makeKey(2.0, 0.0, 0.0, 0), 3.0, 5);
+
+    std::vector<int> ids;
+    cache.getWeightIds(ids);
+    EXPECT_EQ(6u, ids.size());
+
+    // 4 is dropped, 3 and 5 move down
+    int remap[] = {0, -1, -1, 1, -1, 2};
+    cache.remapWeightIds(std::vector<int>(remap, remap + 6));
+    EXPECT_EQ(2u, cache.size());
+
+    double entropy;
+    int posterior_id;
+    ASSERT_TRUE(lookup(cache, 0.0, 0.0, 0.0, 0, entropy, posterior_id));
+    EXPECT_EQ(1, posterior_id);
+    ASSERT_TRUE(lookup(cache, 2.0, 0.0, 0.0, 0, entropy, posterior_id));
+    EXPECT_EQ(2, posterior_id);
+    EXPECT_FALSE(lookup(cache, 1.0, 0.0, 0.0, 1, entropy, posterior_id));
+}
+
+int main(int argc, char **argv)
+{
+    testing::InitGoogleTest(&argc, argv);
+    return RUN_ALL_TESTS();
+}
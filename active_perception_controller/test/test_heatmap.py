@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from heatmap import HeatmapFilter
+
+
+class _Info(object):
+    def __init__(self, width, height, resolution, x, y):
+        class Struct(object):
+            pass
+        self.width = width
+        self.height = height
+        self.resolution = resolution
+        self.origin = Struct()
+        self.origin.position = Struct()
+        self.origin.position.x = x
+        self.origin.position.y = y
+
+
+def binary_entropy(p):
+    return -p*np.log(p) - (1 - p)*np.log(1 - p) if 0 < p < 1 else 0.0
+
+
+class TestHeatmap(unittest.TestCase):
+    def setUp(self):
+        # 4 x 3 m map with 0.5 m cells, from (-1, 1). The heatmap has the same cells
+        self.info = _Info(8, 6, 0.5, -1.0, 1.0)
+        # Asymmetric kernel, so that any flip of the correlation shows up
+        rng = np.random.RandomState(0)
+        self.kernel = rng.uniform(0.05, 0.95, (5, 5))
+        self.occupied = [9, 20]
+        self.filter = HeatmapFilter(self.info, self.kernel, 0.5,
+                                    [c for c in xrange(48) if c not in self.occupied])
+        self.x = np.array([-0.9, -0.7, 1.3, 2.8, 10.0])
+        self.y = np.array([1.1, 1.2, 2.2, 3.9, 2.0])
+        self.w = np.array([1.0, 2.0, 3.0, 2.0, 5.0])
+
+    def brute_force(self):
+        # The particle out of the map is ignored
+        belief = np.zeros((6, 8))
+        for (x, y, w) in zip(self.x[:4], self.y[:4], self.w[:4]):
+            belief[int((y - 1.0)/0.5), int((x + 1.0)/0.5)] += w
+        belief /= np.sum(belief)
+        detection = np.zeros((6, 8))
+        gain = np.zeros((6, 8))
+        for (r, c) in np.ndindex(6, 8):
+            cond = 0.0
+            for (i, j) in zip(*np.nonzero(belief)):
+                (di, dj) = (i - r + 2, j - c + 2)
+                if 0 <= di < 5 and 0 <= dj < 5:
+                    detection[r, c] += belief[i, j]*self.kernel[di, dj]
+                    cond += belief[i, j]*binary_entropy(self.kernel[di, dj])
+            gain[r, c] = max(binary_entropy(detection[r, c]) - cond, 0.0)
+        return (belief, detection, gain)
+
+    def test_matches_brute_force(self):
+        heatmap = self.filter.heatmap(self.x, self.y, self.w)
+        (belief, detection, gain) = self.brute_force()
+        np.testing.assert_allclose(heatmap.belief, belief, atol=1e-12)
+        np.testing.assert_allclose(heatmap.detection, detection, atol=1e-9)
+        np.testing.assert_allclose(heatmap.gain, gain, atol=1e-9)
+        b = belief[belief > 0]
+        self.assertAlmostEqual(heatmap.belief_entropy, -np.sum(b*np.log(b)))
+        np.testing.assert_allclose(heatmap.expected_entropy, heatmap.belief_entropy - gain, atol=1e-9)
+
+    def test_best_points(self):
+        heatmap = self.filter.heatmap(self.x, self.y, self.w)
+        gain = heatmap.gain.ravel().copy()
+        gain[self.occupied] = 0.0
+        best = heatmap.best_points(3)
+        for (k, cell) in enumerate(np.argsort(-gain, kind='mergesort')[:3]):
+            np.testing.assert_allclose(best[k], ((cell % 8 + 0.5)*0.5 - 1.0, (cell // 8 + 0.5)*0.5 + 1.0))
+        spaced = heatmap.best_points(3, 1.2)
+        for i in xrange(len(spaced)):
+            for j in xrange(i):
+                self.assertGreaterEqual(np.linalg.norm(spaced[i] - spaced[j]), 1.2)
+        np.testing.assert_allclose(spaced[0], best[0])
+
+    def test_sampler(self):
+        np.random.seed(0)
+        heatmap = self.filter.heatmap(self.x, self.y, self.w)
+        points = heatmap.sampler().draw(1000)
+        cells = np.floor((points[:,1] - 1.0)/0.5).astype(int)*8 + np.floor((points[:,0] + 1.0)/0.5).astype(int)
+        self.assertFalse(np.any(np.in1d(cells, self.occupied)))
+        self.assertTrue(np.all(heatmap.gain.ravel()[cells] > 0))
+
+    def test_no_particles(self):
+        heatmap = self.filter.heatmap([10.0], [10.0], [1.0])
+        self.assertEqual(np.sum(heatmap.gain), 0.0)
+        self.assertEqual(heatmap.sampler(), None)
+        self.assertEqual(len(heatmap.best_points(5)), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,143 @@
+#include <active_perception_controller/person_particle_filter.h>
+#include <gtest/gtest.h>
+#include <cmath>
+#include <set>
+
+/** Filter over a map, without a sensor model. The map is not loaded, so no cache file is written */
+class KLDFilter : public PersonParticleFilter
+{
+public:
+    KLDFilter(const nav_msgs::OccupancyGrid* map) : PersonParticleFilter(0)
+    {
+        map_ = map;
+    }
+
+    using PersonParticleFilter::kldNumParticles;
+
+    /** Number of bins of bin_size meters that hold a particle */
+    int numBins(double bin_size)
+    {
+        std::set<std::pair<int,int> > bins;
+        for(size_t i = 0; i < getX().size(); i++)
+            bins.insert(std::make_pair((int)floor((getX()[i] - map_->info.origin.position.x)/bin_size),
+                                       (int)floor((getY()[i] - map_->info.origin.position.y)/bin_size)));
+        return bins.size();
+    }
+};
+
+class KLDSamplingTest : public ::testing::Test
+{
+protected:
+    KLDSamplingTest()
+    {
+        // 20 x 20 m map, from (-10, -10)
+        map_.info.width = 200;
+        map_.info.height = 200;
+        map_.info.resolution = 0.1;
+        map_.info.origin.position.x = -10.0;
+        map_.info.origin.position.y = -10.0;
+        map_.data.assign(200*200, 0);
+    }
+
+    /** Particle set with points at the given positions and weights */
+    void setParticles(KLDFilter& filter, const std::vector<double>& xs, const std::vector<double>& ys,
+                      const std::vector<double>& weights)
+    {
+        sensor_msgs::PointCloud cloud;
+        cloud.points.resize(xs.size());
+        cloud.channels.resize(1);
+        cloud.channels[0].name = "weights";
+        for(size_t i = 0; i < xs.size(); i++)
+        {
+            cloud.points[i].x = xs[i];
+            cloud.points[i].y = ys[i];
+            cloud.channels[0].values.push_back(weights[i]);
+        }
+        filter.initFromParticles(cloud);
+    }
+
+    nav_msgs::OccupancyGrid map_;
+};
+
+TEST_F(KLDSamplingTest, numParticles)
+{
+    EXPECT_EQ(0, KLDFilter::kldNumParticles(1, 0.01, 2.33));
+    // chi-square quantile over 2*err (Fox, Eq. 12): the 0.99 quantile with 100 degrees of freedom is 135.807
+    EXPECT_NEAR(135.807/0.02, KLDFilter::kldNumParticles(101, 0.01, 2.326348), 0.005*135.807/0.02);
+    for(int k = 2; k < 1000; k++)
+        EXPECT_LT(KLDFilter::kldNumParticles(k, 0.01, 2.33), KLDFilter::kldNumParticles(k + 1, 0.01, 2.33));
+}
+
+TEST_F(KLDSamplingTest, concentratedBelief)
+{
+    KLDFilter filter(&map_);
+    filter.setKLDSampling(100, 5000, 0.5, 0.01, 2.33);
+    // All the weight is on one particle, so all the new particles fall into one bin
+    std::vector<double> xs(1000, 0.0), ys(1000, 0.0), weights(1000, 0.0);
+    xs[10] = 2.2;
+    ys[10] = -3.1;
+    weights[10] = 1.0;
+    setParticles(filter, xs, ys, weights);
+    filter.resample();
+
+    ASSERT_EQ(100, filter.getNumParticles());
+    for(int i = 0; i < 100; i++)
+    {
+        EXPECT_FLOAT_EQ(2.2, filter.getX()[i]);
+        EXPECT_FLOAT_EQ(-3.1, filter.getY()[i]);
+        EXPECT_DOUBLE_EQ(0.01, filter.getWeights()[i]);
+    }
+}
+
+TEST_F(KLDSamplingTest, numParticlesFollowsTheBins)
+{
+    // Equal clusters in 1 to 40 separate bins
+    for(int clusters = 1; clusters <= 40; clusters++)
+    {
+        KLDFilter filter(&map_);
+        filter.setKLDSampling(50, 20000, 0.5, 0.05, 2.33);
+        std::vector<double> xs, ys, weights;
+        for(int i = 0; i < 4000; i++)
+        {
+            int c = i % clusters;
+            xs.push_back(-9.75 + (c % 8)*2.0);
+            ys.push_back(-9.75 + (c / 8)*2.0);
+            weights.push_back(1.0);
+        }
+        setParticles(filter, xs, ys, weights);
+        filter.resample();
+
+        int n = filter.getNumParticles();
+        int bins = filter.numBins(0.5);
+        EXPECT_LE(bins, clusters);
+        EXPECT_EQ(std::max(50, KLDFilter::kldNumParticles(bins, 0.05, 2.33)), n) << clusters << " clusters";
+    }
+}
+
+TEST_F(KLDSamplingTest, maxParticles)
+{
+    KLDFilter filter(&map_);
+    filter.setKLDSampling(100, 2000, 0.5, 0.01, 2.33);
+    // Uniform over the whole map, which needs more particles than the maximum
+    std::vector<double> xs, ys, weights(5000, 1.0);
+    for(int i = 0; i < 5000; i++)
+    {
+        xs.push_back(-10.0 + 20.0*(i % 71)/71.0);
+        ys.push_back(-10.0 + 20.0*(i / 71)/71.0);
+    }
+    setParticles(filter, xs, ys, weights);
+    filter.resample();
+    EXPECT_EQ(2000, filter.getNumParticles());
+
+    // Degenerate weights are drawn uniformly
+    setParticles(filter, xs, ys, std::vector<double>(5000, 0.0));
+    filter.resample();
+    EXPECT_EQ(2000, filter.getNumParticles());
+    EXPECT_GT(filter.numBins(0.5), 1000);
+}
+
+int main(int argc, char **argv)
+{
+    testing::InitGoogleTest(&argc, argv);
+    return RUN_ALL_TESTS();
+}
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+import map_cache
+
+
+class _Map(object):
+    def __init__(self, data):
+        class Struct(object):
+            pass
+        data = np.asarray(data, dtype=np.int8)
+        self.info = Struct()
+        self.info.height, self.info.width = data.shape
+        self.data = data.ravel().tolist()
+
+
+class TestMapCache(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.navmap = _Map([[0, 0, 0, 0],
+                            [0, 100, 0, -1],
+                            [0, 0, 0, 0]])
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_default_cache_dir(self):
+        ros_home = os.environ.get('ROS_HOME')
+        os.environ['ROS_HOME'] = '/tmp/ros_home'
+        try:
+            self.assertEqual(map_cache.default_cache_dir(), '/tmp/ros_home/active_perception_controller/maps')
+            self.assertEqual(map_cache.default_cache_dir('roadmaps'),
+                             '/tmp/ros_home/active_perception_controller/roadmaps')
+        finally:
+            if ros_home is None:
+                del os.environ['ROS_HOME']
+            else:
+                os.environ['ROS_HOME'] = ros_home
+
+    def test_key(self):
+        key = map_cache.map_key(self.navmap)
+        self.assertTrue(key.endswith('_4x3'))
+        # CRC32 of the 12 cells, as computed by MapCache::key
+        self.assertEqual(map_cache.map_key(_Map(np.zeros((3, 4)))), '7bd5c66f_4x3')
+        self.assertNotEqual(map_cache.MapArtifacts(_Map(np.zeros((3, 4)))).key, key)
+
+    def test_artifacts(self):
+        artifacts = map_cache.MapArtifacts(self.navmap, self.dir)
+        free = artifacts.free_cells()
+        np.testing.assert_array_equal(free, [0, 1, 2, 3, 4, 6, 8, 9, 10, 11])
+        self.assertEqual(free.dtype, np.int32)
+        dist = artifacts.distance()
+        self.assertEqual(dist.shape, (3, 4))
+        self.assertEqual(dist[1, 1], 0.0)
+        self.assertEqual(dist[0, 1], 1.0)
+        self.assertAlmostEqual(dist[0, 0], np.sqrt(2.0), places=6)
+        np.testing.assert_array_equal(artifacts.clearance(1.0),
+                                      np.asarray(self.navmap.data).reshape(3, 4) == 0)
+        # Another node maps the same files, read-only
+        again = map_cache.MapArtifacts(self.navmap, self.dir)
+        for (a, b) in ((again.free_cells(), free), (again.distance(), dist)):
+            self.assertTrue(isinstance(a, np.memmap))
+            self.assertFalse(a.flags.writeable)
+            np.testing.assert_array_equal(a, b)
+        self.assertEqual(len(os.listdir(self.dir)), 3)
+
+    def test_empty_artifact(self):
+        navmap = _Map(100*np.ones((3, 4)))
+        self.assertEqual(len(map_cache.MapArtifacts(navmap, self.dir).free_cells()), 0)
+        filename = os.path.join(self.dir, os.listdir(self.dir)[0])
+        self.assertEqual(os.path.getsize(filename), 8)
+        # Read back from the file, without computing it again
+        os.utime(filename, (0, 0))
+        free = map_cache.MapArtifacts(navmap, self.dir).free_cells()
+        self.assertEqual((len(free), free.dtype), (0, np.int32))
+        self.assertEqual(os.path.getmtime(filename), 0)
+
+    def test_invalid_files_are_replaced(self):
+        artifacts = map_cache.MapArtifacts(self.navmap, self.dir)
+        expected = artifacts.distance().copy()
+        filename = os.path.join(self.dir, os.listdir(self.dir)[0])
+        # A file without the element count, and one with the wrong number of elements
+        for data in (expected, np.zeros(5, dtype=np.float32)):
+            with open(filename, 'wb') as f:
+                if data.size == 5:
+                    np.array([5], dtype='<u8').tofile(f)
+                data.tofile(f)
+            np.testing.assert_array_equal(map_cache.MapArtifacts(self.navmap, self.dir).distance(), expected)
+            self.assertEqual(os.path.getsize(filename), 8 + 4*12)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+
+import os
+import struct
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+import particle_cloud
+
+
+def _string(s):
+    return struct.pack('<I', len(s)) + s
+
+
+def serialized_cloud(points, channels):
+    """
+    sensor_msgs/PointCloud serialized as rospy does, from (x, y, z) points and
+    (name, values) channels.
+    """
+    buff = struct.pack('<III', 7, 100, 200) + _string('/map')
+    buff += struct.pack('<I', len(points)) + ''.join(struct.pack('<fff', *p) for p in points)
+    buff += struct.pack('<I', len(channels))
+    for (name, values) in channels:
+        buff += _string(name) + struct.pack('<I', len(values)) + struct.pack('<%df' % len(values), *values)
+    return buff
+
+
+class _Msg(object):
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class TestParticleCloud(unittest.TestCase):
+    points = [(1.5, 2.5, 0.0), (-3.0, 0.25, 0.0), (0.0, -1.0, 1.0)]
+    weights = [0.25, 0.5, 0.25]
+
+    def test_from_buffer(self):
+        buff = serialized_cloud(self.points, [('ids', [1.0]), ('weights', self.weights)])
+        (x, y, w) = particle_cloud.cloud_from_buffer(buff)
+        np.testing.assert_array_equal(x, [1.5, -3.0, 0.0])
+        np.testing.assert_array_equal(y, [2.5, 0.25, -1.0])
+        np.testing.assert_array_equal(w, self.weights)
+        for a in (x, y, w):
+            self.assertEqual(a.dtype, np.float64)
+            self.assertTrue(a.flags.c_contiguous)
+
+    def test_from_buffer_without_weights(self):
+        buff = serialized_cloud(self.points, [('ids', [1.0, 2.0, 3.0])])
+        self.assertRaises(ValueError, particle_cloud.cloud_from_buffer, buff)
+        buff = serialized_cloud(self.points, [('weights', [1.0])])
+        self.assertRaises(ValueError, particle_cloud.cloud_from_buffer, buff)
+
+    def test_empty_buffer(self):
+        (x, y, w) = particle_cloud.cloud_from_buffer(serialized_cloud([], [('weights', [])]))
+        self.assertEqual((len(x), len(y), len(w)), (0, 0, 0))
+
+    def test_from_msg(self):
+        msg = _Msg(points=[_Msg(x=p[0], y=p[1], z=p[2]) for p in self.points],
+                   channels=[_Msg(name='weights', values=self.weights)])
+        (x, y, w) = particle_cloud.cloud_from_msg(msg)
+        np.testing.assert_array_equal(x, [1.5, -3.0, 0.0])
+        np.testing.assert_array_equal(y, [2.5, 0.25, -1.0])
+        np.testing.assert_array_equal(w, self.weights)
+        msg.channels = []
+        self.assertRaises(ValueError, particle_cloud.cloud_from_msg, msg)
+
+
+if __name__ == '__main__':
+    unittest.main()
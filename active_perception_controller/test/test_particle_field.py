@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from particle_field import ParticleDistanceField, BeliefBins
+
+
+class TestParticleDistanceField(unittest.TestCase):
+    def test_matches_brute_force(self):
+        rng = np.random.RandomState(0)
+        (x, y) = rng.uniform(-5, 5, (2, 300))
+        field = ParticleDistanceField(x, y)
+        queries = rng.uniform(-20, 20, (50, 2))
+        expected = [np.hypot(x - q[0], y - q[1]).min() for q in queries]
+        np.testing.assert_allclose(field.distances(queries), expected)
+        for (q, d) in zip(queries, expected):
+            self.assertAlmostEqual(field.distance(q), d)
+
+    def test_no_particles(self):
+        field = ParticleDistanceField([], [])
+        self.assertEqual(field.distance((1.0, 2.0)), float('Inf'))
+        np.testing.assert_array_equal(field.distances([(1.0, 2.0), (3.0, 4.0)]), [float('Inf')]*2)
+
+
+class TestBeliefBins(unittest.TestCase):
+    def test_mass_is_normalized_per_cell(self):
+        bins = BeliefBins([0.1, 0.2, 1.5, -0.5], [0.1, 0.3, 0.1, -0.5], [1.0, 1.0, 2.0, 4.0], 1.0)
+        self.assertEqual(len(bins.keys), 3)
+        self.assertAlmostEqual(np.sum(bins.mass), 1.0)
+        np.testing.assert_allclose(sorted(bins.mass), [0.25, 0.25, 0.5])
+
+    def test_resampled_cloud_does_not_change(self):
+        rng = np.random.RandomState(0)
+        (x, y) = rng.uniform(0, 4, (2, 2000))
+        before = BeliefBins(x, y, np.ones(2000), 1.0)
+        # Same particles, in another order, with the weight of each cell preserved
+        order = rng.permutation(2000)
+        after = BeliefBins(x[order], y[order], np.ones(2000), 1.0)
+        self.assertEqual(len(after.changed_cells(before, 0.0)), 0)
+        self.assertFalse(np.any(after.changed_near(before, [(2.0, 2.0)], 3.0, 0.0)))
+
+    def test_changed_near(self):
+        before = BeliefBins([0.5, 10.5], [0.5, 0.5], [1.0, 1.0], 1.0)
+        # Half of the belief moves from (10.5, 0.5) to (20.5, 0.5)
+        after = BeliefBins([0.5, 20.5], [0.5, 0.5], [1.0, 1.0], 1.0)
+        np.testing.assert_allclose(sorted(map(tuple, after.changed_cells(before, 0.1))),
+                                   [(10.5, 0.5), (20.5, 0.5)])
+        near = after.changed_near(before, [(0.5, 0.5), (10.5, 3.0), (15.5, 0.5), (20.5, -1.0)], 2.0, 0.1)
+        np.testing.assert_array_equal(near, [False, True, False, True])
+        # Below the tolerance nothing has changed
+        self.assertFalse(np.any(after.changed_near(before, [(10.5, 0.5)], 2.0, 0.6)))
+
+
+if __name__ == '__main__':
+    unittest.main()
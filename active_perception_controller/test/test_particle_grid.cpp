@@ -0,0 +1,82 @@
+#include <active_perception_controller/particle_grid.h>
+#include <gtest/gtest.h>
+#include <cmath>
+#include <cstdlib>
+
+/** Particles within a disc, over all of them, as the grid replaces */
+static std::vector<size_t> bruteForce(const std::vector<double>& xs, const std::vector<double>& ys,
+                                      double cx, double cy, double radius)
+{
+    std::vector<size_t> result;
+    for(size_t i = 0; i < xs.size(); i++)
+    {
+        if(hypot(xs[i] - cx, ys[i] - cy) <= radius)
+            result.push_back(i);
+    }
+    return result;
+}
+
+static double uniform(double min, double max)
+{
+    return min + (max - min)*rand()/(double)RAND_MAX;
+}
+
+TEST(ParticleGrid, matchesBruteForce)
+{
+    srand(0);
+    std::vector<double> xs, ys;
+    for(int i = 0; i < 2000; i++)
+    {
+        // A dense cluster and a few particles far away, which make the cells grow
+        bool far = i % 100 == 0;
+        xs.push_back(far ? uniform(-500, 500) : uniform(-5, 5));
+        ys.push_back(far ? uniform(-500, 500) : uniform(-5, 5));
+    }
+    // Particles exactly on the boundary of a query
+    xs.push_back(3.0);
+    ys.push_back(0.0);
+
+    ParticleGrid grid;
+    grid.build(xs, ys, 1.0);
+    std::vector<size_t> result;
+    for(int k = 0; k < 500; k++)
+    {
+        double cx = uniform(-10, 10), cy = uniform(-10, 10), radius = uniform(0, 4);
+        grid.query(cx, cy, radius, result);
+        EXPECT_EQ(bruteForce(xs, ys, cx, cy, radius), result);
+    }
+    grid.query(0.0, 0.0, 3.0, result);
+    EXPECT_EQ(bruteForce(xs, ys, 0.0, 0.0, 3.0), result);
+    grid.query(1e12, -1e12, 1.0, result);
+    EXPECT_TRUE(result.empty());
+    grid.query(0.0, 0.0, 1e4, result);
+    EXPECT_EQ(xs.size(), result.size());
+}
+
+TEST(ParticleGrid, rebuild)
+{
+    std::vector<double> xs(3, 1.0), ys(3, 1.0);
+    ParticleGrid grid;
+    grid.build(xs, ys, 0.5);
+    std::vector<size_t> result;
+    grid.query(1.0, 1.0, 0.0, result);
+    EXPECT_EQ(3u, result.size());
+
+    xs[1] = 10.0;
+    grid.build(xs, ys, 0.5);
+    grid.query(1.0, 1.0, 1.0, result);
+    ASSERT_EQ(2u, result.size());
+    EXPECT_EQ(0u, result[0]);
+    EXPECT_EQ(2u, result[1]);
+
+    grid.build(std::vector<double>(), std::vector<double>(), 0.5);
+    EXPECT_TRUE(grid.empty());
+    grid.query(1.0, 1.0, 100.0, result);
+    EXPECT_TRUE(result.empty());
+}
+
+int main(int argc, char **argv)
+{
+    testing::InitGoogleTest(&argc, argv);
+    return RUN_ALL_TESTS();
+}
@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+import scipy as sp
+import scipy.ndimage
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from collision import SegmentChecker
+import roadmap
+
+
+class _Map(object):
+    """
+    10 x 10 m map with 0.25 m cells, with a wall across the middle that has a
+    gap on the right.
+    """
+    def __init__(self):
+        class Struct(object):
+            pass
+        self.info = Struct()
+        self.info.width = 40
+        self.info.height = 40
+        self.info.resolution = 0.25
+        self.info.origin = Struct()
+        self.info.origin.position = Struct()
+        self.info.origin.position.x = 0.0
+        self.info.origin.position.y = 0.0
+        data = np.zeros((40, 40), dtype=np.int8)
+        data[19:21, :30] = 100
+        self.data = data.ravel().tolist()
+        self.free = data == 0
+
+
+class TestRoadmap(unittest.TestCase):
+    def setUp(self):
+        self.navmap = _Map()
+        self.distmap = np.flipud(sp.ndimage.distance_transform_edt(self.navmap.free))
+        self.checker = SegmentChecker(self.navmap.info, self.distmap, 1.0)
+        self.freecells = np.flatnonzero(self.navmap.free.ravel())
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def build(self):
+        return roadmap.Roadmap.build(self.checker, self.navmap.info, self.freecells, 200, 1.5)
+
+    def test_build(self):
+        rm = self.build()
+        self.assertEqual(len(rm.nodes), 200)
+        self.assertTrue(np.all(self.checker.points_safe(rm.nodes)))
+        (i, j) = rm.edges.T
+        self.assertTrue(np.all(np.hypot(*(rm.nodes[i] - rm.nodes[j]).T) <= 1.5))
+        self.assertTrue(np.all(self.checker.segments_safe(rm.nodes[i], rm.nodes[j])))
+        # The roadmap of a map is always the same
+        np.testing.assert_array_equal(self.build().edges, rm.edges)
+
+    def test_no_free_space(self):
+        self.assertRaises(ValueError, roadmap.Roadmap.build, self.checker, self.navmap.info, [], 200, 1.5)
+        blocked = SegmentChecker(self.navmap.info, np.zeros((40, 40)), 1.0)
+        self.assertRaises(ValueError, roadmap.Roadmap.build, blocked, self.navmap.info,
+                          self.freecells, 200, 1.5)
+
+    def test_save_and_load(self):
+        rm = self.build()
+        filename = os.path.join(self.dir, 'roadmap.npz')
+        rm.save(filename)
+        loaded = roadmap.Roadmap.load(filename)
+        np.testing.assert_array_equal(loaded.nodes, rm.nodes)
+        np.testing.assert_array_equal(loaded.edges, rm.edges)
+        self.assertEqual(loaded.radius, rm.radius)
+        self.assertEqual(os.listdir(self.dir), ['roadmap.npz'])
+
+    def test_load_or_build(self):
+        (rm, loaded) = roadmap.load_or_build(self.navmap, self.checker, self.freecells, 200, 1.5, self.dir)
+        self.assertFalse(loaded)
+        (cached, loaded) = roadmap.load_or_build(self.navmap, self.checker, self.freecells, 200, 1.5, self.dir)
+        self.assertTrue(loaded)
+        np.testing.assert_array_equal(cached.edges, rm.edges)
+        # Another robot radius needs another roadmap
+        other = SegmentChecker(self.navmap.info, self.distmap, 2.0)
+        (rm, loaded) = roadmap.load_or_build(self.navmap, other, self.freecells, 200, 1.5, self.dir)
+        self.assertFalse(loaded)
+        self.assertEqual(len(os.listdir(self.dir)), 2)
+
+    def test_shortest_path_tree(self):
+        rm = self.build()
+        root = np.array([1.0, 1.0])
+        links = rm.radius_neighbors(root, 1.5)
+        tree = rm.tree(root, links, 1000, 1.0)
+        self.assertEqual(tree.belief_seq, -1)
+        # Parents come before their children, and the distances are path lengths
+        for i in xrange(1, len(tree.V)):
+            p = tree.parents[i]
+            self.assertLess(p, i)
+            self.assertAlmostEqual(tree.Dist[i], tree.Dist[p] + np.linalg.norm(tree.V[i] - tree.V[p]))
+        # The other side of the wall is only reached through the gap, at x >= 7.5
+        top = [i for i in xrange(len(tree.V)) if tree.V[i][1] > 5.5 and tree.V[i][0] < 3.0]
+        self.assertTrue(len(top) > 0)
+        for i in top:
+            self.assertGreater(tree.Dist[i], (7.5 - 1.0) + (7.5 - 3.0))
+        self.assertEqual(len(rm.tree(root, links, 10, 1.0).V), 11)
+
+
+if __name__ == '__main__':
+    unittest.main()
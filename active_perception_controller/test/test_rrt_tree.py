@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from rrt_tree import RRTStarTree
+
+
+class TestRRTStarTree(unittest.TestCase):
+    def setUp(self):
+        #   0 - 1 - 2 - 3
+        #        \
+        #         4 - 5
+        self.tree = RRTStarTree(np.array([0.0, 0.0]), 2.0, 1.0)
+        for (p, parent, cost, w, ent) in [((1.0, 0.0), 0, 5.0, 1, 1.5),
+                                          ((2.0, 0.0), 1, 4.0, 2, 1.2),
+                                          ((3.0, 0.0), 2, 3.0, 3, 1.1),
+                                          ((1.0, 1.0), 1, 6.0, 4, 1.8),
+                                          ((1.0, 2.0), 4, 7.0, 5, 1.9)]:
+            self.tree.add_vertex(np.array(p), parent, cost, w, ent, 1.0)
+
+    def test_add_vertex(self):
+        t = self.tree
+        self.assertEqual(t.depth, [0, 1, 2, 3, 2, 3])
+        self.assertEqual(t.E[1], set([2, 4]))
+        self.assertEqual(t.best, 3)
+        self.assertEqual((t.ent_min, t.ent_max), (1.1, 2.0))
+        self.assertEqual(t.best_path_size(), 4)
+        self.assertEqual(t.nbrs.kneighbors((2.9, 0.2))[1], 3)
+
+    def test_rewire(self):
+        t = self.tree
+        # 4 moves below 3, with its subtree
+        t.rewire(4, 3, 2.0, 6, 0.9, 1.0)
+        self.assertEqual(t.parents[4], 3)
+        self.assertEqual(t.E[1], set([2]))
+        self.assertEqual(t.E[3], set([4]))
+        self.assertEqual(t.depth, [0, 1, 2, 3, 4, 5])
+        self.assertEqual((t.best, t.W[4], t.ent_min), (4, 6, 0.9))
+        self.assertEqual(t.subtree(1), [1, 2, 3, 4, 5])
+
+    def test_rewire_into_own_subtree(self):
+        t = self.tree
+        # The costs are not additive, so 4 can be rewired below its own child 5
+        t.rewire(4, 5, 1.0, 6, 1.0, 1.0)
+        self.assertEqual(t.subtree(4), [4, 5])
+        self.assertEqual(t.depth[4], float('Inf'))
+        self.assertEqual(t.depth[5], float('Inf'))
+        self.assertEqual(t.depth[:4], [0, 1, 2, 3])
+        self.assertEqual(t.best, 4)
+        self.assertEqual(t.best_path_size(), len(t.V))
+
+    def test_reroot(self):
+        t = self.tree.reroot(np.array([1.0, 0.5]), 1)
+        # The subtree of 1 hangs from the new root, in breadth-first order
+        np.testing.assert_array_equal(t.V, [(1.0, 0.5), (1.0, 0.0), (2.0, 0.0), (1.0, 1.0),
+                                            (3.0, 0.0), (1.0, 2.0)])
+        self.assertEqual([t.parents[i] for i in xrange(1, 6)], [0, 1, 1, 2, 3])
+        self.assertEqual(t.W, [0, 1, 2, 4, 3, 5])
+        self.assertEqual(t.Ent[1:], [1.5, 1.2, 1.8, 1.1, 1.9])
+        self.assertEqual(t.depth, [0, 1, 2, 2, 3, 3])
+        self.assertEqual(t.C, [float('Inf')]*6)
+
+    def test_reroot_in_place(self):
+        # The robot has not moved from vertex 2, which becomes the root
+        t = self.tree.reroot(np.array([2.0, 0.0]), 2)
+        np.testing.assert_array_equal(t.V, [(2.0, 0.0), (3.0, 0.0)])
+        self.assertEqual(t.parents, {1: 0})
+        self.assertEqual(t.W, [0, 3])
+
+    def test_vertex_belief(self):
+        # Every vertex remembers the belief that its entropy was computed for
+        old = object()
+        t = RRTStarTree(np.array([0.0, 0.0]), 2.0, 1.0, 1, old)
+        t.add_vertex(np.array([1.0, 0.0]), 0, 1.0, 1, 1.0, 1.0)
+        t.add_vertex(np.array([2.0, 0.0]), 1, 1.0, 2, 1.0, 1.0)
+        new = object()
+        t.belief = new
+        t.add_vertex(np.array([3.0, 0.0]), 2, 1.0, 3, 1.0, 1.0)
+        t.rewire(2, 0, 1.0, 4, 1.0, 1.0)
+        self.assertEqual(t.vertex_belief, [old, old, new, new])
+        # The root of a rerooted tree is always evaluated again
+        r = t.reroot(np.array([0.5, 0.0]), 0)
+        self.assertEqual(r.belief, new)
+        self.assertEqual(r.vertex_belief, [None, old, old, new, new])
+
+
+if __name__ == '__main__':
+    unittest.main()
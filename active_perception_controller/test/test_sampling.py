@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from sampling import AliasTable, PointSampler, MixedSampler
+
+
+class _Info(object):
+    class _Origin(object):
+        class _Position(object):
+            x = -1.0
+            y = 2.0
+        position = _Position()
+    width = 4
+    resolution = 0.5
+    origin = _Origin()
+
+
+def table_probabilities(table):
+    """
+    Exact probability of drawing every index from an alias table.
+    """
+    n = len(table)
+    p = table.prob/n
+    np.add.at(p, table.alias, (1.0 - table.prob)/n)
+    return p
+
+
+class TestAliasTable(unittest.TestCase):
+    def test_exact_probabilities(self):
+        rng = np.random.RandomState(0)
+        for n in (1, 2, 7, 100):
+            w = rng.uniform(0, 10, n)
+            w[rng.uniform(size=n) < 0.3] = 0.0
+            if not np.any(w > 0):
+                w[0] = 1.0
+            np.testing.assert_allclose(table_probabilities(AliasTable(w)), w/np.sum(w), atol=1e-12)
+
+    def test_draw(self):
+        np.random.seed(0)
+        w = np.array([1.0, 0.0, 3.0, 6.0])
+        idx = AliasTable(w).draw(100000)
+        freq = np.bincount(idx, minlength=4)/100000.0
+        self.assertEqual(freq[1], 0.0)
+        np.testing.assert_allclose(freq, w/np.sum(w), atol=0.01)
+
+    def test_degenerate_weights(self):
+        for w in ([0.0, 0.0], [1.0, float('nan')], [float('Inf'), 1.0]):
+            np.testing.assert_allclose(table_probabilities(AliasTable(w)), [0.5, 0.5])
+        self.assertRaises(ValueError, AliasTable, [])
+
+
+class TestPointSampler(unittest.TestCase):
+    def test_weighted(self):
+        np.random.seed(0)
+        sampler = PointSampler([(0.0, 0.0), (1.0, 1.0), (2.0, 2.0)], [0.0, 1.0, 3.0], block_size=16)
+        points = np.array([sampler.sample() for i in xrange(1000)])
+        self.assertFalse(np.any(points[:,0] == 0.0))
+        self.assertAlmostEqual(np.mean(points[:,0] == 2.0), 0.75, delta=0.05)
+
+    def test_reset_after_reseeding(self):
+        sampler = PointSampler(np.arange(20.0).reshape(10, 2), block_size=8)
+        np.random.seed(3)
+        sampler.reset()
+        first = [sampler.sample() for i in xrange(20)]
+        sampler.sample()
+        np.random.seed(3)
+        sampler.reset()
+        np.testing.assert_array_equal([sampler.sample() for i in xrange(20)], first)
+
+    def test_from_cells(self):
+        np.random.seed(0)
+        sampler = PointSampler.from_cells(_Info, [1, 6])
+        points = set(map(tuple, sampler.draw(100)))
+        self.assertEqual(points, set([(-0.5, 2.0), (0.0, 2.5)]))
+
+    def test_empty(self):
+        self.assertRaises(ValueError, PointSampler, np.zeros((0, 2)))
+
+
+class TestMixedSampler(unittest.TestCase):
+    def test_choice(self):
+        np.random.seed(0)
+        sampler = MixedSampler([lambda: 'a', lambda: 'b'], [0.25, 0.75], block_size=10)
+        draws = [sampler.sample() for i in xrange(4000)]
+        self.assertAlmostEqual(draws.count('a')/4000.0, 0.25, delta=0.03)
+        sampler = MixedSampler([lambda: 'a', lambda: 'b'], [1.0, 0.0])
+        self.assertEqual(set(sampler.sample() for i in xrange(100)), set(['a']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from spatial_index import GridNeighbors
+
+
+class TestGridNeighbors(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.points = rng.uniform(-10, 10, (500, 2))
+        # Small capacity, so that the point array has to grow
+        self.index = GridNeighbors(1.0, capacity=4)
+        for p in self.points:
+            self.index.insert(p)
+
+    def test_insertion_order(self):
+        self.assertEqual(len(self.index), len(self.points))
+        np.testing.assert_array_equal(self.index.points(), self.points)
+
+    def test_nearest_matches_brute_force(self):
+        rng = np.random.RandomState(1)
+        # Queries inside the points, and far from them
+        queries = np.vstack((rng.uniform(-10, 10, (100, 2)), rng.uniform(-100, 100, (100, 2))))
+        for q in queries:
+            d = np.hypot(*(self.points - q).T)
+            (dist, idx) = self.index.kneighbors(q)
+            self.assertAlmostEqual(dist, d.min())
+            self.assertEqual(d[idx], d.min())
+
+    def test_radius_matches_brute_force(self):
+        rng = np.random.RandomState(2)
+        for q in rng.uniform(-12, 12, (100, 2)):
+            for r in (0.0, 0.3, 1.0, 2.5):
+                d = np.hypot(*(self.points - q).T)
+                self.assertEqual(sorted(self.index.radius_neighbors(q, r)),
+                                 np.flatnonzero(d <= r).tolist())
+
+    def test_empty(self):
+        index = GridNeighbors(1.0)
+        self.assertEqual(index.kneighbors((0.0, 0.0)), (float('Inf'), -1))
+        self.assertEqual(index.radius_neighbors((0.0, 0.0), 10.0), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
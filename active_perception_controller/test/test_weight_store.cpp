@@ -0,0 +1,133 @@
+#include <active_perception_controller/weight_store.h>
+#include <gtest/gtest.h>
+
+/** Weights of a delta, computed directly from the weights of its parent */
+static std::vector<double> applyDelta(const std::vector<double>& parent,
+                                      double scale,
+                                      const std::vector<size_t>& indices,
+                                      const std::vector<double>& values)
+{
+    std::vector<double> weights(parent);
+    for(size_t i = 0; i < weights.size(); i++)
+        weights[i] *= scale;
+    for(size_t i = 0; i < indices.size(); i++)
+        weights[indices[i]] = values[i];
+    return weights;
+}
+
+static void expectWeights(const WeightStore& store, int id, const std::vector<double>& expected)
+{
+    std::vector<double> weights;
+    store.getWeights(id, weights);
+    ASSERT_EQ(expected.size(), weights.size());
+    for(size_t i = 0; i < expected.size(); i++)
+        EXPECT_DOUBLE_EQ(expected[i], weights[i]) << "weight " << i << " of set " << id;
+}
+
+class WeightStoreTest : public ::testing::Test
+{
+protected:
+    WeightStoreTest() : store_(3)
+    {
+        for(int i = 0; i < 10; i++)
+            dense_.push_back(0.1*(i + 1));
+        store_.addDense(dense_);
+    }
+
+    WeightStore store_;
+    std::vector<double> dense_;
+};
+
+TEST_F(WeightStoreTest, denseAndDelta)
+{
+    std::vector<size_t> indices(2);
+    indices[0] = 3;
+    indices[1] = 7;
+    std::vector<double> values(2, 0.5);
+    int id = store_.addDelta(0, 2.0, indices, values);
+    EXPECT_EQ(1, id);
+    EXPECT_EQ(2, store_.size());
+    EXPECT_EQ(10u, store_.getNumParticles());
+    EXPECT_EQ(12u, store_.getNumStoredValues());
+    expectWeights(store_, 0, dense_);
+    expectWeights(store_, 1, applyDelta(dense_, 2.0, indices, values));
+}
+
+TEST_F(WeightStoreTest, chainsOfDeltas)
+{
+    // Every delta overrides a particle of its parent, and the chain is longer than max_depth
+    std::vector<double> expected = dense_;
+    int id = 0;
+    for(int k = 0; k < 6; k++)
+    {
+        std::vector<size_t> indices(1, k % 4);
+        std::vector<double> values(1, k + 1.0);
+        size_t stored = store_.getNumStoredValues();
+        id = store_.addDelta(id, 0.5, indices, values);
+        expected = applyDelta(expected, 0.5, indices, values);
+        expectWeights(store_, id, expected);
+        // The fourth set would be the fourth delta in a row, so it is stored densely
+        EXPECT_EQ(stored + (k == 3 ? 10 : 1), store_.getNumStoredValues());
+    }
+}
+
+TEST_F(WeightStoreTest, largeDeltaIsDense)
+{
+    std::vector<size_t> indices;
+    std::vector<double> values;
+    for(size_t i = 0; i < 6; i++)
+    {
+        indices.push_back(i);
+        values.push_back(1.0);
+    }
+    int id = store_.addDelta(0, 3.0, indices, values);
+    EXPECT_EQ(20u, store_.getNumStoredValues());
+    expectWeights(store_, id, applyDelta(dense_, 3.0, indices, values));
+}
+
+TEST_F(WeightStoreTest, compact)
+{
+    // 0 <- 1 <- 2, 0 <- 3, 0 <- 4
+    std::vector<std::vector<double> > expected(1, dense_);
+    int parents[] = {0, 1, 0, 0};
+    for(int k = 0; k < 4; k++)
+    {
+        std::vector<size_t> indices(1, k);
+        std::vector<double> values(1, 5.0 + k);
+        store_.addDelta(parents[k], 1.5, indices, values);
+        expected.push_back(applyDelta(expected[parents[k]], 1.5, indices, values));
+    }
+
+    // 2 keeps its parent 1, and the invalid ids are ignored
+    std::vector<int> keep, new_ids;
+    keep.push_back(4);
+    keep.push_back(2);
+    keep.push_back(-1);
+    keep.push_back(17);
+    store_.compact(keep, new_ids);
+
+    ASSERT_EQ(5u, new_ids.size());
+    EXPECT_EQ(0, new_ids[0]);
+    EXPECT_EQ(1, new_ids[1]);
+    EXPECT_EQ(2, new_ids[2]);
+    EXPECT_EQ(-1, new_ids[3]);
+    EXPECT_EQ(3, new_ids[4]);
+    EXPECT_EQ(4, store_.size());
+    EXPECT_EQ(13u, store_.getNumStoredValues());
+    for(int id = 0; id < 5; id++)
+    {
+        if(new_ids[id] >= 0)
+            expectWeights(store_, new_ids[id], expected[id]);
+    }
+    EXPECT_FALSE(store_.isValid(4));
+
+    store_.clear();
+    EXPECT_EQ(0, store_.size());
+    EXPECT_EQ(0u, store_.getNumStoredValues());
+}
+
+int main(int argc, char **argv)
+{
+    testing::InitGoogleTest(&argc, argv);
+    return RUN_ALL_TESTS();
+}